@@ -35,6 +35,7 @@ class SchedulingPolicy(BaseSchedulingPolicy):
         self.stomp_params = stomp_params
         self.servers      = servers
         self.n_servers    = len(servers)
+        self.idle_servers = stomp_stats['Idle Servers']
     
     
     def assign_task_to_server(self, sim_time, tasks):
@@ -44,16 +45,15 @@ class SchedulingPolicy(BaseSchedulingPolicy):
             return None    
         
         # Determine task's best scheduling option (target server)
-        target_server_type = tasks[0].mean_service_time_list[0][0]
+        target_server_type = tasks.head().mean_service_time_list[0][0]
                 
         # Look for an available server to process the task
-        for server in self.servers:
-    
-            if (server.type == target_server_type and not server.busy):
+        server = self.idle_servers.first_idle(target_server_type)
+        if (server is not None):
 
-                # Pop task in queue's head and assign it to server
-                server.assign_task(sim_time, tasks.pop(0))
-                return server
+            # Pop task in queue's head and assign it to server
+            server.assign_task(sim_time, tasks.pop(0))
+            return server
                 
         return None
 
@@ -39,6 +39,7 @@ class SchedulingPolicy(BaseSchedulingPolicy):
         self.stomp_params = stomp_params
         self.servers      = servers
         self.n_servers    = len(servers)
+        self.idle_servers = stomp_stats['Idle Servers']
 
 
     def assign_task_to_server(self, sim_time, tasks):
@@ -48,21 +49,48 @@ class SchedulingPolicy(BaseSchedulingPolicy):
             return None    
         
         # Look for an available server to process the task
-        for target_server in tasks[0].mean_service_time_list:
+        for target_server in tasks.head().mean_service_time_list:
             
             target_server_type = target_server[0]
             
-            for server in self.servers:
-        
-                if (server.type == target_server_type and not server.busy):
+            server = self.idle_servers.first_idle(target_server_type)
+            if (server is not None):
     
-                    # Pop task in queue's head and assign it to server
-                    server.assign_task(sim_time, tasks.pop(0))
-                    return server
+                # Pop task in queue's head and assign it to server
+                server.assign_task(sim_time, tasks.pop(0))
+                return server
                 
         return None
 
 
+    def assign_tasks_to_servers(self, sim_time, tasks):
+
+        # Same decisions as repeated calls to assign_task_to_server: the tasks
+        # at the head of the queue are assigned in order, each one to the
+        # available server (lowest id first) of its fastest server type that
+        # still has one, until a task finds no available server
+        assignments = []
+        idle        = {}   # Per server type: its available servers not picked yet
+        for task in tasks:
+            server = None
+            for target_server in task.mean_service_time_list:
+
+                target_server_type = target_server[0]
+                if (self.idle_servers.num_idle(target_server_type) == 0):
+                    continue
+                if not target_server_type in idle:
+                    idle[target_server_type] = [candidate for candidate in self.servers if (candidate.type == target_server_type and not candidate.busy)]
+                if (idle[target_server_type]):
+                    server = idle[target_server_type].pop(0)
+                    break
+
+            if (server is None):
+                break
+            assignments.append((task, server))
+
+        return assignments
+
+
     def remove_task_from_server(self, sim_time, server):
         pass
 
@@ -39,6 +39,7 @@ class SchedulingPolicy(BaseSchedulingPolicy):
         self.stomp_params = stomp_params
         self.servers      = servers
         self.n_servers    = len(servers)
+        self.kernel       = stomp_stats['Completion Kernel']
 
 
     def assign_task_to_server(self, sim_time, tasks):
@@ -47,36 +48,20 @@ class SchedulingPolicy(BaseSchedulingPolicy):
             # There aren't tasks to serve
             return None    
         
-        task = tasks[0]
-        logging.debug('[%10ld] Scheduling task %s' % (sim_time, task.type))
+        task = tasks.head()
+        if (self.debug_trace.active and self.debug_trace.task(task.id)):
+            logging.debug('[%10ld] Scheduling task %s' % (sim_time, task.type))
         
-        # Compute execution times for each target server, factoring in
-        # the remaining execution time of tasks already running.
-        target_servers = []
-        for server in self.servers:
-            
-            if (server.type in task.mean_service_time_dict):
-                
-                mean_service_time   = task.mean_service_time_dict[server.type]
-                if (server.busy):
-                    remaining_time  = server.curr_job_end_time_estimated - sim_time
-                else:
-                    remaining_time  = 0
-                actual_service_time = mean_service_time + remaining_time
-                
-                target_servers.append(actual_service_time)
-            
-            else:
-                target_servers.append(float("inf"))
-        
-        # Look for the server with smaller actual_service_time
+        # Look for the server with the earliest estimated completion time
+        # (mean service time plus remaining execution time of the task already
+        # running, computed for all the servers at once by the NumPy kernel)
         # and check if it's available
-        server_idx = target_servers.index(min(target_servers))
+        [(actual_service_time, server)] = self.kernel.best_servers([task], sim_time)
 
-        if (not self.servers[server_idx].busy):
+        if (server is not None and not server.busy):
             # Pop task in queue's head and assign it to server
-            self.servers[server_idx].assign_task(sim_time, tasks.pop(0))
-            return self.servers[server_idx]
+            server.assign_task(sim_time, tasks.pop(0))
+            return server
         else:
             return None
 
@@ -50,64 +50,57 @@ class SchedulingPolicy(BaseSchedulingPolicy):
         self.stomp_params = stomp_params
         self.servers      = servers
         self.n_servers    = len(servers)
+        self.backlog      = stomp_stats['Server Backlog']
         self.stats                            = {}
         self.stats['Task Issue Posn'] = numpy.zeros(self.num_bins, dtype=int)  # N-bin histogram
 
 
     def assign_task_to_server(self, sim_time, tasks):
 
+        server = self.lookahead(sim_time, tasks)
+        # The reservations only hold for this scheduling decision
+        self.backlog.clear_reservations()
+        return server
+
+
+    def lookahead(self, sim_time, tasks):
+
         if (len(tasks) == 0):
             # There aren't tasks to serve
             return None    
 
         tidx = 0;
         for task in tasks:
-            #task = tasks[0]
-            logging.debug('[%10ld] Attempting to scheduling task %2d : %s' % (sim_time, tidx, task.type))
-        
-            # Compute execution times for each target server, factoring in
-            # the remaining execution time of tasks already running.
-            target_servers = []
-            for server in self.servers:
-            
-                logging.debug('[%10ld] Checking server %s' % (sim_time, server.type))
-                if (server.type in task.mean_service_time_dict):
-                
-                    mean_service_time   = task.mean_service_time_dict[server.type]
-                    if (server.busy):
-                        remaining_time  = server.curr_job_end_time_estimated - sim_time
-                        for stask in tasks:
-                            if(stask == task):
-                                break
-                            if (self.servers.index(server) == stask.possible_server_idx):
-                                remaining_time  += stask.mean_service_time_dict[server.type]
-                    else:
-                        remaining_time  = 0
-                    actual_service_time = mean_service_time + remaining_time
-                
-                    logging.debug('[%10ld] Server %s : mst %d ast %d ' % (sim_time, server.type, mean_service_time, actual_service_time))
-                    target_servers.append(actual_service_time)
-                else:
-                    target_servers.append(float("inf"))
+            if (self.debug_trace.active and self.debug_trace.task(task.id)):
+                logging.debug('[%10ld] Attempting to scheduling task %2d : %s' % (sim_time, tidx, task.type))
         
-            # Look for the server with smaller actual_service_time
-            # and check if it's available
-            server_idx = target_servers.index(min(target_servers))
-
-            if (not self.servers[server_idx].busy):
-                # Pop task in queue's head and assign it to server
-                ttask = tasks.pop(tidx);
-                logging.debug('[%10ld] Scheduling task %2d %s to server %2d %s' % (sim_time, tidx, ttask.type, server_idx, self.servers[server_idx].type))
+            # Look for the server with the earliest estimated completion time,
+            # factoring in the remaining execution time of tasks already running
+            # and of the preceding tasks reserved on it, and check if it's
+            # available
+            (actual_service_time, server) = self.backlog.earliest_completion(task.descriptor, sim_time)
+            if (server is not None and self.debug_trace.active and self.debug_trace.task(task.id)):
+                logging.debug('[%10ld] Server %2d %s : ast %d ' % (sim_time, server.id, server.type, actual_service_time))
+
+            if (server is not None and not server.busy):
+                # Remove task from the queue and assign it to server
+                ttask = tasks.remove(task);
+                if (self.debug_trace.active and self.debug_trace.task(ttask.id)):
+                    logging.debug('[%10ld] Scheduling task %2d %s to server %2d %s' % (sim_time, tidx, ttask.type, server.id, server.type))
                 
-                self.servers[server_idx].assign_task(sim_time, ttask)
+                server.assign_task(sim_time, ttask)
                 bin = int(tidx / self.bin_size)        
                 if (bin >= len(self.stats['Task Issue Posn'])):
                     bin = len(self.stats['Task Issue Posn']) - 1
-                logging.debug('[          ] Set BIN from %d / %d to %d vs %d = %d' % (tidx, self.bin_size, int(tidx / self.bin_size), len(self.stats['Task Issue Posn']), bin))
+                if (self.debug_trace.active and self.debug_trace.task(ttask.id)):
+                    logging.debug('[          ] Set BIN from %d / %d to %d vs %d = %d' % (tidx, self.bin_size, int(tidx / self.bin_size), len(self.stats['Task Issue Posn']), bin))
                 self.stats['Task Issue Posn'][bin] += 1
-                return self.servers[server_idx]
-            else:
-                task.possible_server_idx = server_idx
+                return server
+            elif (server is not None):
+                # The task waits for this server: the following tasks see it
+                # busy for this task's mean service time longer
+                task.possible_server_idx = server.id
+                self.backlog.reserve(server, task.descriptor)
             tidx += 1  # Increment task idx
             if (tidx >= max_task_depth_to_check):
                 break
@@ -117,6 +110,11 @@ class SchedulingPolicy(BaseSchedulingPolicy):
         pass
 
 
+    def final_stats(self, sim_time):
+        return {'Task Issue Posn': {'Bin Size': self.bin_size,
+                                    'Issues':   self.stats['Task Issue Posn'].tolist()}}
+
+
     def output_final_stats(self, sim_time):
         logging.info('   Task Issue Position: %s' % (', '.join(map(str,self.stats['Task Issue Posn']))))
         idx = 0;
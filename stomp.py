@@ -21,46 +21,1087 @@
 from __future__ import division
 from abc import ABCMeta, abstractmethod
 import numpy
+import math
 import pprint
 import sys
 import operator
 import logging
 import datetime
+import time
+import heapq
+import zlib
+import os
+import json
+import struct
+import csv
+import shutil
+import tempfile
+from collections import OrderedDict
+from array import array
+
+
+###############################################################################
+# This class provides the random variates used by the simulation (task types, #
+# inter-arrival times and service times), all rounded to integer time units.  #
+# Each distribution is identified by a key (e.g. the task and server types).  #
+#                                                                             #
+# In 'buffered' mode, samples are drawn in large vectorized blocks per        #
+# distribution, and the blocks are refilled lazily. Each distribution draws   #
+# from its own random stream, seeded from the simulation seed and the key, so #
+# results are seed-stable: they do not depend on the block size or on the     #
+# order in which the different distributions are sampled.                     #
+# In 'legacy' mode, every sample is a separate draw from a single stream,     #
+# seeded as earlier STOMP versions seeded the global numpy random state, so   #
+# it reproduces their results. Each simulation has its own sampler and never  #
+# uses the global random state, so simulations (e.g. replications) can run    #
+# side by side in the same process.                                           #
+#                                                                             #
+# With 'common_random_numbers', the service time of a task on a server is the #
+# a-priori service time drawn for it (per server type) when the task arrives, #
+# instead of a new draw when it is assigned: every random number then depends #
+# only on the task id (and server type), not on the order in which a policy   #
+# assigns the tasks, so different policies see exactly the same tasks. The    #
+# a-priori service times are then drawn from the same (positive) distribution #
+# as the service times drawn on assignment, see apriori_service(). With       #
+# 'antithetic', every stream returns the antithetic variates of its normal    #
+# stream (see AntitheticStream), for antithetic pairs of simulations.         #
+###############################################################################
+class RandomSampler:
+
+    def __init__(self, seed, block_size=4096, legacy=False, common_random_numbers=False, antithetic=False):
+
+        self.seed          = seed
+        self.block_size    = block_size
+        self.legacy        = legacy
+        self.crn           = common_random_numbers
+        self.antithetic    = antithetic
+        self.legacy_stream = self.new_stream(seed) if (legacy) else None
+        self.streams       = {}   # Per distribution key: numpy RandomState
+        self.buffers       = {}   # Per distribution (key and parameters): [samples, next sample index]
+
+
+    def stream(self, key):
+
+        if not key in self.streams:
+            if (self.seed is None):
+                self.streams[key] = self.new_stream(None)
+            else:
+                key_hash = zlib.crc32('/'.join(map(str, key))) & 0xffffffff
+                self.streams[key] = self.new_stream([self.seed, key_hash])
+        return self.streams[key]
+
+
+    def new_stream(self, seed):
+
+        stream = numpy.random.RandomState(seed)
+        return AntitheticStream(stream) if (self.antithetic) else stream
+
+
+    def next_sample(self, key, params, draw_block):
+
+        buffer = self.buffers.get((key, params))
+        if (buffer is None or buffer[1] == len(buffer[0])):
+            buffer = [draw_block(self.stream(key), params, self.block_size).tolist(), 0]
+            self.buffers[(key, params)] = buffer
+        sample = buffer[0][buffer[1]]
+        buffer[1] += 1
+        return sample
+
+
+    def exponential(self, key, scale):
+
+        if (self.legacy):
+            return int(round(self.legacy_stream.exponential(scale=scale, size=1)))
+        return self.next_sample(key, scale, RandomSampler.exponential_block)
+
+
+    def normal(self, key, mean, stdev):
+
+        if (self.legacy):
+            return int(round(self.legacy_stream.normal(loc=mean, scale=stdev, size=1)))
+        return self.next_sample(key, (mean, stdev), RandomSampler.normal_block)
+
+
+    def positive_normal(self, key, mean, stdev):
+
+        # Normal distribution truncated to (rounded) positive values
+        if (self.legacy):
+            while True:
+                sample = int(round(self.legacy_stream.normal(loc=mean, scale=stdev, size=1)))
+                if (sample > 0):
+                    return sample
+        return self.next_sample(key, (mean, stdev), RandomSampler.positive_normal_block)
+
+
+    def apriori_service(self, key, mean, stdev):
+
+        # A-priori service time of a task on a server type. With common random
+        # numbers, it is also the service time of the task on assignment, so it
+        # is drawn from the same (positive) distribution as those
+        if (self.crn):
+            return self.positive_normal(key, mean, stdev)
+        return self.normal(key, mean, stdev)
+
+
+    def apriori_service_block(self, key, mean, stdev, n):
+
+        # A whole array of 'n' a-priori service times (see block); positive
+        # normal samples are drawn in blocks of 'block_size', as the per-sample
+        # method draws them
+        if (not self.crn):
+            return self.block(key, (mean, stdev), n, RandomSampler.normal_block)
+        samples = [numpy.zeros(0, dtype=int)]
+        count   = 0
+        while (count < n):
+            samples.append(RandomSampler.positive_normal_block(self.stream(key), (mean, stdev), self.block_size))
+            count += len(samples[-1])
+        return numpy.concatenate(samples)[:n]
+
+
+    def choice(self, key, options):
+
+        if (self.legacy):
+            return self.legacy_stream.choice(options)
+        return options[self.next_sample(key, len(options), RandomSampler.index_block)]
+
+
+    def block(self, key, params, n, draw_block):
+
+        # A whole array of 'n' samples, straight from the distribution's stream
+        # (the same samples the per-sample methods would return, in 'buffered' mode)
+        return draw_block(self.stream(key), params, n)
+
+
+    @staticmethod
+    def round_block(block):
+
+        # Round half away from zero, as round() does
+        return (numpy.sign(block) * numpy.floor(numpy.abs(block) + 0.5)).astype(int)
+
+    @staticmethod
+    def exponential_block(stream, scale, n):
+        return RandomSampler.round_block(stream.exponential(scale=scale, size=n))
+
+    @staticmethod
+    def normal_block(stream, params, n):
+        (mean, stdev) = params
+        return RandomSampler.round_block(stream.normal(loc=mean, scale=stdev, size=n))
+
+    @staticmethod
+    def positive_normal_block(stream, params, n):
+
+        # Vectorized rejection: keep the positive samples of each block
+        (mean, stdev) = params
+        samples = []
+        while (len(samples) == 0):
+            block   = RandomSampler.round_block(stream.normal(loc=mean, scale=stdev, size=n))
+            samples = block[block > 0]
+        return samples
+
+    @staticmethod
+    def index_block(stream, num_options, n):
+        return stream.randint(num_options, size=n)
+
+
+###############################################################################
+# This class wraps a random stream (numpy RandomState) to return antithetic   #
+# variates: each sample is computed from the same uniform numbers as the      #
+# wrapped stream's sample, mirrored (u -> 1 - u), so the two simulations of   #
+# an antithetic pair are negatively correlated. Normal samples are reflected  #
+# about their mean, exponential samples use -log(u) instead of -log(1 - u),   #
+# and integers in [0, n) are mirrored to n - 1 - k. Other distributions are   #
+# drawn from the wrapped stream as they are.                                  #
+###############################################################################
+class AntitheticStream(object):
+
+    def __init__(self, stream):
+
+        self.stream = stream
+
+
+    def normal(self, loc=0.0, scale=1.0, size=None):
+        return 2 * loc - self.stream.normal(loc=loc, scale=scale, size=size)
+
+    def exponential(self, scale=1.0, size=None):
+        # RandomState.exponential draws -log(1 - u) for each uniform u
+        return -scale * numpy.log(self.stream.random_sample(size))
+
+    def random_sample(self, size=None):
+        return 1 - self.stream.random_sample(size)
+
+    def randint(self, low, high=None, size=None):
+        if (high is None):
+            (low, high) = (0, low)
+        return (low + high - 1) - self.stream.randint(low, high, size=size)
+
+    def choice(self, options):
+        return options[self.randint(len(options))]
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+###############################################################################
+# This class controls the debug messages of the simulation hot path (event    #
+# handling, task assignment, scheduling policies). A message is formatted and #
+# logged only if 'active' is set (and, for messages about a task, only if     #
+# task(task_id) is True), so the messages cost almost nothing when debugging  #
+# is disabled. Tracing can be restricted to a window of simulation times      #
+# and/or to a range of task ids (both inclusive); without restrictions, the   #
+# --debug output is the same as with plain logging.debug() calls. Each STOMP  #
+# simulation has its own DebugTrace (STOMP.debug_trace, also set on its       #
+# servers and scheduling policy), so simulations in the same process can use  #
+# different debug settings.                                                   #
+###############################################################################
+class DebugTrace:
+
+    def __init__(self):
+
+        self.enabled     = False
+        self.active      = False
+        self.time_window = None   # (first, last) simulation time
+        self.task_ids    = None   # (first, last) task id
+
+
+    def configure(self, enabled, time_window=None, task_ids=None):
+
+        self.enabled     = enabled
+        self.time_window = time_window
+        self.task_ids    = task_ids
+        self.set_time(0)
+
+
+    def set_time(self, sim_time):
+
+        self.active = self.enabled and (self.time_window is None or self.time_window[0] <= sim_time <= self.time_window[1])
+
+
+    def task(self, task_id):
+
+        return self.task_ids is None or self.task_ids[0] <= task_id <= self.task_ids[1]
+
+
+# Kept for policies that import it: it is never configured, so it is always
+# inactive; policies should use self.debug_trace (their simulation's) instead
+debug_trace = DebugTrace()
+
+
+###############################################################################
+# This class describes a task type, as given in the configuration file. The   #
+# descriptors are built once per simulation (see TaskType.registry()) and     #
+# shared by all the tasks of each type; they cannot be modified. Server types #
+# have integer ids (their position in the configuration) and are listed in    #
+# preference order (shortest mean service time first) in 'server_types'.      #
+# 'mean_service_times' and 'stdev_service_times' are indexed by server type   #
+# id (None where the task type cannot run on a server type).                  #
+###############################################################################
+class TaskType(object):
+
+    __slots__ = ('id', 'name', 'all_server_types', 'server_types', 'server_type_ids',
+                 'mean_service_times', 'stdev_service_times',
+                 'mean_service_time_dict', 'mean_service_time_list',
+                 'stdev_service_time_dict', 'stdev_service_time_list')
+
+    def __init__(self, id, name, params, all_server_types):
+
+        set_attr = super(TaskType, self).__setattr__
+        set_attr('id',                      id)
+        set_attr('name',                    name)
+        set_attr('all_server_types',        tuple(all_server_types))
+        set_attr('mean_service_time_dict',  params['mean_service_time'])
+        set_attr('mean_service_time_list',  sorted(params['mean_service_time'].items(), key=operator.itemgetter(1)))
+        set_attr('stdev_service_time_dict', params['stdev_service_time'])
+        set_attr('stdev_service_time_list', sorted(params['stdev_service_time'].items(), key=operator.itemgetter(1)))
+        set_attr('server_types',            tuple([server_type for (server_type, mean) in self.mean_service_time_list if server_type in all_server_types]))
+        set_attr('server_type_ids',         tuple([self.all_server_types.index(server_type) for server_type in self.server_types]))
+        set_attr('mean_service_times',      tuple([self.mean_service_time_dict.get(server_type) for server_type in all_server_types]))
+        set_attr('stdev_service_times',     tuple([self.stdev_service_time_dict.get(server_type) for server_type in all_server_types]))
+
+
+    def __setattr__(self, name, value):
+        raise AttributeError('TaskType descriptors cannot be modified')
+
+    def __str__(self):
+        return ('TaskType ' + str(self.id) + ' ( ' + self.name + ' )')
+
+
+    @staticmethod
+    def registry(params):
+
+        # Maps each task type name to its descriptor, in configuration order
+        server_types = list(params['simulation']['servers'])
+        task_types   = OrderedDict()
+        for (id, name) in enumerate(params['simulation']['tasks']):
+            task_types[name] = TaskType(id, name, params['simulation']['tasks'][name], server_types)
+        return task_types
 
 
 ###############################################################################
 # This class represents a 'task' that is processed in the queuing system.     #
 # Its 'service time' is determined from a specified probability distribution  #
-# (exponential, normal or uniform).                                           #
+# (exponential, normal or uniform). The task type information is held by the  #
+# (shared) TaskType descriptor; the task only keeps its own state, in slots,  #
+# so it cannot have attributes other than those listed in __slots__.          #
 ###############################################################################
-class Task:
-    
-    def __init__(self, sim_time, id, type, params):
+class Task(object):
+
+    __slots__ = ('type', 'descriptor', 'arrival_time', 'departure_time', 'per_server_services',
+                 'task_service_time', 'task_lifetime', 'id', 'wpower', 'current_time', 'possible_server_idx')
+
+    def __init__(self, sim_time, id, task_type):
         
         # Obtain a service time for the new task
         #service_time = numpy.random.normal(loc=mean, scale=stdev, size=1)
 
-        self.type                    = type  # The task type  
-        self.mean_service_time_dict  = params['mean_service_time']
-        self.mean_service_time_list  = sorted(params['mean_service_time'].items(), key=operator.itemgetter(1)) 
-        self.stdev_service_time_dict = params['stdev_service_time']
-        self.stdev_service_time_list = sorted(params['stdev_service_time'].items(), key=operator.itemgetter(1))
+        self.type                    = task_type.name  # The task type
+        self.descriptor              = task_type       # The task type descriptor (see TaskType)
         self.arrival_time            = sim_time
         #self.curr_arrival_time      = sim_time
         self.departure_time          = None
-        self.per_server_services     = []    # Holds ordered list of service times
-        self.per_server_service_dict = {}    # Holds (server_type : service_time) key-value pairs; same content as services list really
+        self.per_server_services     = []    # Holds ordered list of service times (one per server type, in configuration order)
         self.task_service_time       = None  # To be set upon scheduling, since it depends on the target server
         self.task_lifetime           = None  # To be set upon finishing; includes time span from arrival to departure
         self.id                      = id
         #self.run_pos                = 0
         self.wpower                  = None
         self.current_time            = 0
-        self.possible_server_idx        = None
+        self.possible_server_idx     = None
+
+    # Task type information (shared by all the tasks of a type)
+    @property
+    def mean_service_time_dict(self):
+        return self.descriptor.mean_service_time_dict
+
+    @property
+    def mean_service_time_list(self):
+        return self.descriptor.mean_service_time_list
+
+    @property
+    def stdev_service_time_dict(self):
+        return self.descriptor.stdev_service_time_dict
+
+    @property
+    def stdev_service_time_list(self):
+        return self.descriptor.stdev_service_time_list
+
+    @property
+    def per_server_service_dict(self):
+        # Holds (server_type : service_time) key-value pairs; same content as services list really
+        return dict([(server_type, int(service_time)) for (server_type, service_time) in zip(self.descriptor.all_server_types, self.per_server_services)
+                     if service_time != 'None'])
 
     def __str__(self):
         return ('Task ' + str(self.id) + ' ( ' + self.type + ' ) ' + str(self.arrival_time))
 
+###############################################################################
+# This class represents the queue of tasks waiting to be served. Tasks are    #
+# kept in arrival (FIFO) order, both globally and in one sub-queue per task   #
+# type. A task is its own handle: removing the head or any given task is      #
+# O(1). List-style indexing (tasks[i], tasks.pop(i)) is kept for existing     #
+# policies, but costs O(i) for any position other than the head.              #
+###############################################################################
+class TaskQueue:
+
+    def __init__(self):
+
+        self.queue          = OrderedDict()  # Maps task id to task, FIFO order
+        self.queue_per_type = {}             # Same, per task type
+
+
+    def append(self, task):
+
+        self.queue[task.id] = task
+        if not task.type in self.queue_per_type:
+            self.queue_per_type[task.type] = OrderedDict()
+        self.queue_per_type[task.type][task.id] = task
+
+
+    def head(self, task_type=None):
+
+        # Oldest task in the queue (of the given type, if any)
+        queue = self.queue if (task_type is None) else self.queue_per_type.get(task_type, {})
+        for task in queue.itervalues():
+            return task
+        return None
+
+
+    def remove(self, task):
+
+        del self.queue[task.id]
+        del self.queue_per_type[task.type][task.id]
+        return task
+
+
+    def pop(self, index):
+
+        if (index == 0):
+            (id, task) = self.queue.popitem(last=False)
+            del self.queue_per_type[task.type][id]
+            return task
+        return self.remove(self[index])
+
+
+    def tasks_of_type(self, task_type):
+
+        # Iterate (in FIFO order) over the queued tasks of a given type
+        return self.queue_per_type.get(task_type, {}).itervalues()
+
+
+    def count(self, task_type):
+
+        return len(self.queue_per_type.get(task_type, ()))
+
+
+    def __getitem__(self, index):
+
+        if (index < 0):
+            index += len(self.queue)
+        if (index < 0 or index >= len(self.queue)):
+            raise IndexError('task queue index out of range')
+        for task in self.queue.itervalues():
+            if (index == 0):
+                return task
+            index -= 1
+
+
+    def __iter__(self):
+        return self.queue.itervalues()
+
+    def __len__(self):
+        return len(self.queue)
+
+    def __nonzero__(self):
+        return len(self.queue) > 0
+
+
+###############################################################################
+# This class keeps track of the idle servers of each server type. It is       #
+# updated by the servers themselves (on task assignment and on reset), and    #
+# gives the number of idle servers of a type, and the idle server of a type   #
+# with the lowest id (i.e. the first one a scan over the server list would    #
+# find) without scanning all the servers.                                     #
+###############################################################################
+class IdleServerIndex:
+
+    def __init__(self):
+
+        self.idle_heap  = {}   # Per server type: min-heap of (possibly stale) idle server ids
+        self.in_heap    = {}   # Per server type: ids currently in the heap
+        self.idle_count = {}   # Per server type: number of idle servers
+        self.servers    = {}   # Maps server id to server
+
+
+    def set_idle(self, server):
+
+        if not server.type in self.idle_heap:
+            self.idle_heap[server.type]  = []
+            self.in_heap[server.type]    = set()
+            self.idle_count[server.type] = 0
+        self.servers[server.id] = server
+        self.idle_count[server.type] += 1
+        if not server.id in self.in_heap[server.type]:
+            heapq.heappush(self.idle_heap[server.type], server.id)
+            self.in_heap[server.type].add(server.id)
+
+
+    def set_busy(self, server):
+
+        # The server id is left in the heap; it is dropped lazily by first_idle()
+        self.idle_count[server.type] -= 1
+
+
+    def first_idle(self, server_type):
+
+        heap = self.idle_heap.get(server_type)
+        if not heap:
+            return None
+        while (heap and self.servers[heap[0]].busy):
+            self.in_heap[server_type].discard(heapq.heappop(heap))
+        if not heap:
+            return None
+        return self.servers[heap[0]]
+
+
+    def num_idle(self, server_type):
+
+        return self.idle_count.get(server_type, 0)
+
+
+###############################################################################
+# This class keeps the projected free time of each busy server: the estimated #
+# end time of its current task (start time plus mean service time) plus the   #
+# mean service times of the tasks tentatively reserved on it. It is updated   #
+# by the servers themselves (on task assignment and on reset) and by the      #
+# policies (reserve() and clear_reservations(), e.g. for the tasks of a       #
+# lookahead window that wait for a busy server). Per server type, the busy    #
+# servers are kept in a min-heap of (projected free time, server id), whose   #
+# stale entries are dropped lazily, so earliest_completion() finds the server #
+# with the earliest estimated completion time for a task type in O(number of  #
+# server types x log servers) instead of scanning all the servers.            #
+###############################################################################
+class ServerBacklog:
+
+    def __init__(self, idle_servers):
+
+        self.idle_servers = idle_servers  # IdleServerIndex of the same servers
+        self.free_time    = {}   # Maps busy server id to its projected free time
+        self.busy_heap    = {}   # Per server type: min-heap of (possibly stale) (free time, server id)
+        self.num_servers  = {}   # Per server type: number of servers
+        self.servers      = {}   # Maps server id to server
+        self.reserved     = []   # Ids of the servers with tentative reservations
+        self.kernel       = None # CompletionTimeKernel to keep up to date, if any
+
+
+    def set_idle(self, server):
+
+        if not server.id in self.servers:
+            self.servers[server.id] = server
+            self.busy_heap.setdefault(server.type, [])
+            self.num_servers[server.type] = self.num_servers.get(server.type, 0) + 1
+        self.free_time.pop(server.id, None)
+        if (self.kernel):
+            self.kernel.set_idle(server)
+
+
+    def set_busy(self, server):
+
+        self.set_free_time(server, server.curr_job_end_time_estimated)
+
+
+    def set_free_time(self, server, free_time):
+
+        # The previous entry of the server (if any) is left in the heap; it is
+        # dropped lazily, or when the heap has too many stale entries
+        heap                       = self.busy_heap[server.type]
+        self.free_time[server.id]  = free_time
+        heapq.heappush(heap, (free_time, server.id))
+        if (self.kernel):
+            self.kernel.set_busy_until(server, free_time)
+        if (len(heap) > 4 * self.num_servers[server.type] + 64):
+            heap[:] = [(free_time, id) for (free_time, id) in heap if (self.free_time.get(id) == free_time)]
+            heapq.heapify(heap)
+
+
+    def reserve(self, server, task_type):
+
+        # Tentatively adds the mean service time of a task of the given type
+        # (TaskType descriptor) to the projected free time of a busy server
+        self.set_free_time(server, self.free_time[server.id] + task_type.mean_service_time_dict[server.type])
+        self.reserved.append(server.id)
+
+
+    def clear_reservations(self):
+
+        for id in self.reserved:
+            server = self.servers[id]
+            if (server.busy and self.free_time[id] != server.curr_job_end_time_estimated):
+                self.set_busy(server)
+        self.reserved = []
+
+
+    def first_busy(self, server_type):
+
+        # The busy server of a type with the earliest projected free time (the
+        # lowest id among equals), or None
+        heap = self.busy_heap.get(server_type)
+        if not heap:
+            return None
+        while (heap and self.free_time.get(heap[0][1]) != heap[0][0]):
+            heapq.heappop(heap)
+        if not heap:
+            return None
+        return self.servers[heap[0][1]]
+
+
+    def earliest_completion(self, task_type, sim_time):
+
+        # The server with the earliest estimated completion time for a task of
+        # the given type (TaskType descriptor) if it were queued on it now, i.e.
+        # the smallest mean service time plus remaining time until the server
+        # is free (0 for an idle server), as (estimated time, server). As with
+        # a scan over the server list, the lowest server id wins among equal
+        # times. (None, None) if no server can run the task type.
+        best_time   = None
+        best_server = None
+        for server_type in task_type.server_types:
+            mean_service_time = task_type.mean_service_time_dict[server_type]
+            for server in (self.idle_servers.first_idle(server_type), self.first_busy(server_type)):
+                if (server is None):
+                    continue
+                if (server.busy):
+                    actual_service_time = mean_service_time + (self.free_time[server.id] - sim_time)
+                else:
+                    actual_service_time = mean_service_time
+                if ((best_server is None) or (actual_service_time < best_time) or
+                    (actual_service_time == best_time and server.id < best_server.id)):
+                    best_time   = actual_service_time
+                    best_server = server
+        return (best_time, best_server)
+
+
+###############################################################################
+# This class scores the servers for a window of queued tasks with NumPy. It   #
+# holds a dense matrix of the mean service times per task type and server     #
+# type (inf where a task type cannot run on a server type) and, per server,   #
+# whether it is busy and its busy-until estimate (its projected free time,    #
+# kept up to date by the ServerBacklog). The estimated completion time of a   #
+# task on a server is its mean service time plus the remaining time until     #
+# the server is free (0 for an idle server); best_servers() computes it for   #
+# all the servers and all the tasks of a window at once, and returns the best #
+# server of each task (the lowest id among equal times, as with a scan over   #
+# the server list).                                                           #
+###############################################################################
+class CompletionTimeKernel(object):
+
+    def __init__(self, task_types, servers):
+
+        assert([server.id for server in servers] == range(len(servers)));
+        self.servers         = servers
+        self.means           = numpy.array([[float('inf') if (mean is None) else mean for mean in task_type.mean_service_times]
+                                            for task_type in task_types.values()], dtype=float)  # Per (task type id, server type id)
+        self.server_type_ids = numpy.array([server.type_index for server in servers], dtype=int)
+        self.server_means    = self.means[:, self.server_type_ids]                               # Per (task type id, server id)
+        self.busy            = numpy.zeros(len(servers), dtype=bool)
+        self.busy_until      = numpy.zeros(len(servers))
+
+
+    def set_busy_until(self, server, free_time):
+
+        self.busy[server.id]       = True
+        self.busy_until[server.id] = free_time
+
+
+    def set_idle(self, server):
+
+        self.busy[server.id] = False
+
+
+    def scores(self, task_type_ids, sim_time):
+
+        # Estimated completion times: one row per task type id, one column per server
+        return self.server_means[task_type_ids] + numpy.where(self.busy, self.busy_until - sim_time, 0)
+
+
+    def best_servers(self, tasks, sim_time):
+
+        # For each of the given tasks (e.g. a window of the queue), the server
+        # with the earliest estimated completion time for it, as (estimated
+        # time, server); (None, None) if no server can run the task
+        scores = self.scores([task.descriptor.id for task in tasks], sim_time)
+        best   = scores.argmin(axis=1)
+        times  = scores[numpy.arange(len(tasks)), best]
+        return [(time, self.servers[id]) if (time != float('inf')) else (None, None) for (time, id) in zip(times.tolist(), best.tolist())]
+
+
+###############################################################################
+# This class accumulates the statistics of a stream of values (e.g. service   #
+# times) in constant memory: count, total, min, max, and the mean and sum of  #
+# squared deviations (M2) with Welford's method. Accumulators can be merged   #
+# (e.g. per server into per server type, and into global) with the parallel   #
+# formula of Chan et al. mean() is computed from the (exact) total, so it is  #
+# the same as averaging the values.                                           #
+###############################################################################
+class StreamingStats(object):
+
+    __slots__ = ('count', 'total', 'min', 'max', 'running_mean', 'm2')
+
+    def __init__(self):
+
+        self.count        = 0
+        self.total        = 0.0
+        self.min          = None
+        self.max          = None
+        self.running_mean = 0.0
+        self.m2           = 0.0
+
+
+    def add(self, value):
+
+        self.count        += 1
+        self.total        += value
+        delta              = value - self.running_mean
+        self.running_mean += delta / self.count
+        self.m2           += delta * (value - self.running_mean)
+        if (self.min is None or value < self.min):
+            self.min = value
+        if (self.max is None or value > self.max):
+            self.max = value
+
+
+    def merge(self, other):
+
+        if (other.count == 0):
+            return self
+        if (self.count == 0):
+            (self.count, self.total, self.min, self.max, self.running_mean, self.m2) = (other.count, other.total, other.min, other.max, other.running_mean, other.m2)
+            return self
+        count              = self.count + other.count
+        delta              = other.running_mean - self.running_mean
+        self.m2           += other.m2 + delta * delta * self.count * other.count / count
+        self.running_mean += delta * other.count / count
+        self.count         = count
+        self.total        += other.total
+        self.min           = min(self.min, other.min)
+        self.max           = max(self.max, other.max)
+        return self
+
+
+    def mean(self):
+        return (self.total / self.count) if (self.count > 0) else 0.0
+
+    def variance(self):
+        # Population variance (as reported by print_stats)
+        return (self.m2 / self.count) if (self.count > 0) else 0.0
+
+    def stdev(self):
+        return numpy.sqrt(self.variance())
+
+
+    @staticmethod
+    def merged(stats_list):
+
+        result = StreamingStats()
+        for stats in stats_list:
+            result.merge(stats)
+        return result
+
+
+###############################################################################
+# This class estimates a confidence interval of the mean of a (correlated)    #
+# stream of values, e.g. response times in completion order, with the method  #
+# of batch means: consecutive values are grouped into batches, whose means    #
+# are nearly independent when the batches are large enough, and the interval  #
+# is the Student t interval of the batch means. It keeps between num_batches  #
+# and 2 * num_batches batch means: when it reaches the upper limit, adjacent  #
+# batches are merged (doubling the batch size), so memory stays constant.     #
+###############################################################################
+class BatchMeans(object):
+
+    __slots__ = ('num_batches', 'batch_size', 'batch_count', 'batch_total', 'means')
+
+    def __init__(self, num_batches=20):
+
+        self.num_batches = num_batches
+        self.batch_size  = 1
+        self.batch_count = 0       # Values in the current (incomplete) batch
+        self.batch_total = 0.0
+        self.means       = []      # Means of the complete batches
+
+
+    def add(self, value):
+
+        # Returns True when the value completes a batch
+        self.batch_total += value
+        self.batch_count += 1
+        if (self.batch_count < self.batch_size):
+            return False
+        self.means.append(self.batch_total / self.batch_size)
+        self.batch_total = 0.0
+        self.batch_count = 0
+        if (len(self.means) == 2 * self.num_batches):
+            self.means       = [(first + second) / 2 for (first, second) in zip(self.means[0::2], self.means[1::2])]
+            self.batch_size *= 2
+        return True
+
+
+    def interval(self, confidence):
+
+        # (mean, half width) of the confidence interval over the complete
+        # batches, or None if there are fewer than num_batches of them
+        num_means = len(self.means)
+        if (num_means < self.num_batches):
+            return None
+        mean     = sum(self.means) / num_means
+        variance = sum([(batch_mean - mean)**2 for batch_mean in self.means]) / (num_means - 1)
+        return (mean, BatchMeans.t_quantile((1 + confidence) / 2, num_means - 1) * math.sqrt(variance / num_means))
+
+
+    @staticmethod
+    def normal_quantile(p):
+
+        # Inverse of the standard normal CDF (Acklam's rational approximation,
+        # relative error below 1.2e-9)
+        a = [-3.969683028665376e+01, 2.209460984245205e+02, -2.759285104469687e+02, 1.383577518672690e+02, -3.066479806614716e+01, 2.506628277459239e+00]
+        b = [-5.447609879822406e+01, 1.615858368580409e+02, -1.556989798598866e+02, 6.680131188771972e+01, -1.328068155288572e+01]
+        c = [-7.784894002430293e-03, -3.223964580411365e-01, -2.400758277161838e+00, -2.549732539343734e+00, 4.374664141464968e+00, 2.938163982698783e+00]
+        d = [7.784695709041462e-03, 3.224671290700398e-01, 2.445134137142996e+00, 3.754408661907416e+00]
+        if (p < 0.02425 or p > 1 - 0.02425):
+            q = math.sqrt(-2 * math.log(min(p, 1 - p)))
+            x = (((((c[0]*q + c[1])*q + c[2])*q + c[3])*q + c[4])*q + c[5]) / ((((d[0]*q + d[1])*q + d[2])*q + d[3])*q + 1)
+            return x if (p < 0.5) else -x
+        q = p - 0.5
+        r = q * q
+        return (((((a[0]*r + a[1])*r + a[2])*r + a[3])*r + a[4])*r + a[5])*q / (((((b[0]*r + b[1])*r + b[2])*r + b[3])*r + b[4])*r + 1)
+
+
+    @staticmethod
+    def t_quantile(p, df):
+
+        # Quantile of the Student t distribution with df degrees of freedom
+        # (Cornish-Fisher expansion, Abramowitz & Stegun 26.7.5; accurate to
+        # 1e-3 or better from 10 degrees of freedom on, and refined with
+        # Newton's method on the exact distribution below that)
+        x  = BatchMeans.normal_quantile(p)
+        g1 = (x**3 + x) / 4
+        g2 = (5*x**5 + 16*x**3 + 3*x) / 96
+        g3 = (3*x**7 + 19*x**5 + 17*x**3 - 15*x) / 384
+        g4 = (79*x**9 + 776*x**7 + 1482*x**5 - 1920*x**3 - 945*x) / 92160
+        t  = x + g1 / df + g2 / df**2 + g3 / df**3 + g4 / df**4
+        if (df < 10):
+            log_norm = math.lgamma((df + 1) / 2) - math.lgamma(df / 2) - 0.5 * math.log(df * math.pi)
+            for i in range(4):
+                density = math.exp(log_norm - (df + 1) / 2 * math.log(1 + t * t / df))
+                t      -= (BatchMeans.t_cdf(t, df) - p) / density
+        return t
+
+
+    @staticmethod
+    def t_cdf(t, df):
+
+        # CDF of the Student t distribution, for an integer number of degrees
+        # of freedom (Abramowitz & Stegun 26.7.3 and 26.7.4)
+        theta  = math.atan(t / math.sqrt(df))
+        cos2   = math.cos(theta)**2
+        term   = 1.0
+        series = 1.0
+        for k in range(1 + df % 2, df - 2, 2):
+            term   *= (k / (k + 1)) * cos2
+            series += term
+        if (df % 2 == 0):
+            prob = math.sin(theta) * series
+        elif (df == 1):
+            prob = 2 * theta / math.pi
+        else:
+            prob = 2 / math.pi * (theta + math.sin(theta) * math.cos(theta) * series)
+        return (1 + prob) / 2
+
+
+###############################################################################
+# This class detects the end of the warm-up period (initial transient) of a   #
+# stream of values, e.g. response times in completion order, with the MSER-m  #
+# rule: values are grouped into batches of m (5 for MSER-5), and the warm-up  #
+# is the number d of first batches that minimizes the MSER statistic (the     #
+# variance of the remaining batch means over their number), over d <= n/2 (n  #
+# batches). A single minimum of a short, noisy stream is not reliable, so it  #
+# is checked online, as batches complete, once at least 'min_count' values    #
+# were added: the warm-up is detected once the minimum is stable, i.e. the    #
+# minima over the n, the first n/2 and the first n/4 batches are not at their #
+# boundary (the stream is at least 8 times as long as its warm-up) and they   #
+# are within 'tolerance' (a fraction of n) of each other. If the minimum      #
+# keeps drifting with n (e.g. the queue grows without bound), it is not       #
+# detected.                                                                   #
+###############################################################################
+class WarmupDetector(object):
+
+    def __init__(self, batch_size=5, min_count=1000, tolerance=0.05):
+
+        self.batch_size  = batch_size
+        self.batch_count = 0
+        self.batch_total = 0.0
+        self.means       = []            # Batch means
+        self.count       = 0             # Values added
+        self.tolerance   = tolerance
+        self.next_check  = max(-(-min_count // batch_size), 4)  # Number of batches of the next check
+        self.cutoff      = None          # Values in the warm-up, once detected
+
+
+    def add(self, value):
+
+        # Returns True when the end of the warm-up period is detected
+        self.count       += 1
+        self.batch_total += value
+        self.batch_count += 1
+        if (self.batch_count < self.batch_size):
+            return False
+        self.means.append(self.batch_total / self.batch_size)
+        self.batch_total = 0.0
+        self.batch_count = 0
+        if (len(self.means) < self.next_check):
+            return False
+        # Checks are geometrically spaced, so their total cost is linear
+        self.next_check = int(1.1 * len(self.means)) + 1
+        return self.detect()
+
+
+    def detect(self):
+
+        # Checks the minimum over all the batch means against the ones over
+        # the first half and the first quarter of them (also used for a last
+        # check at the end)
+        num_means = len(self.means)
+        if (num_means < 8):
+            return False
+        best = self.minimum(num_means)
+        for num_first in (num_means // 2, num_means // 4):
+            first = self.minimum(num_first)
+            if (best is None or first is None or abs(best - first) > self.tolerance * num_means):
+                return False
+        self.cutoff = best * self.batch_size
+        return True
+
+
+    def minimum(self, num_means):
+
+        # MSER statistic for every d, from suffix sums of the (centered)
+        # first 'num_means' batch means; returns the d that minimizes it, or
+        # None if it is at the boundary (d = n/2)
+        means   = numpy.array(self.means[:num_means])
+        means  -= means.mean()
+        sums    = numpy.cumsum(means[::-1])[::-1]
+        squares = numpy.cumsum((means**2)[::-1])[::-1]
+        kept    = num_means - numpy.arange(num_means)
+        mser    = (squares - sums**2 / kept) / kept**2
+        half    = num_means // 2
+        best    = int(numpy.argmin(mser[:half + 1]))
+        return best if (best < half) else None
+
+
+###############################################################################
+# This class keeps the completed tasks (completion time, server id, task type #
+# and response and service times) in compact typed arrays (about 32 bytes per #
+# task, instead of a tuple of objects), so that the statistics can be         #
+# recomputed without the warm-up tasks once the warm-up is detected. The task #
+# types are stored as indices into 'task_types'.                              #
+###############################################################################
+class TaskRecords(object):
+
+    def __init__(self):
+
+        self.task_types    = []
+        self.type_indices  = {}
+        self.times         = array('l')
+        self.servers       = array('i')
+        self.types         = array('i')
+        self.resp_times    = array('l')
+        self.service_times = array('l')
+
+
+    def __len__(self):
+
+        return len(self.times)
+
+
+    def append(self, time, server_id, task_type, resp_time, service_time):
+
+        if not task_type in self.type_indices:
+            self.type_indices[task_type] = len(self.task_types)
+            self.task_types.append(task_type)
+        self.times.append(time)
+        self.servers.append(server_id)
+        self.types.append(self.type_indices[task_type])
+        self.resp_times.append(resp_time)
+        self.service_times.append(service_time)
+
+
+    def records(self, start=0):
+
+        # Yields (time, server id, task type, response time, service time)
+        # for the tasks from 'start' on, in completion order
+        for i in range(start, len(self.times)):
+            yield (self.times[i], self.servers[i], self.task_types[self.types[i]], self.resp_times[i], self.service_times[i])
+
+
+###############################################################################
+# This class is a streaming quantile sketch (DDSketch) of a stream of values  #
+# (e.g. response times). Positive values are counted in logarithmic bins, so  #
+# that any quantile is estimated within 'relative_error' of its true value;   #
+# zero (or negative) values are counted apart. The memory used is bounded by  #
+# 'max_bins': beyond it, the lowest bins are collapsed (so only the accuracy  #
+# of the lowest quantiles degrades). Sketches with the same relative error    #
+# can be merged (e.g. per server into per server type, and into global).      #
+###############################################################################
+class QuantileSketch(object):
+
+    __slots__ = ('relative_error', 'max_bins', 'gamma', 'log_gamma', 'bins', 'zero_count', 'count', 'min', 'max')
+
+    def __init__(self, relative_error=0.01, max_bins=2048):
+
+        self.relative_error = relative_error
+        self.max_bins       = max_bins
+        self.gamma          = (1 + relative_error) / (1 - relative_error)
+        self.log_gamma      = math.log(self.gamma)
+        self.bins           = {}    # Maps bin index to count: bin i holds (gamma^(i-1), gamma^i]
+        self.zero_count     = 0
+        self.count          = 0
+        self.min            = float("inf")
+        self.max            = float("-inf")
+
+
+    def add(self, value):
+
+        self.count += 1
+        if (value < self.min):
+            self.min = value
+        if (value > self.max):
+            self.max = value
+        if (value <= 0):
+            self.zero_count += 1
+            return
+        key  = int(math.ceil(math.log(value) / self.log_gamma))
+        bins = self.bins
+        if (key in bins):
+            bins[key] += 1
+        else:
+            bins[key] = 1
+            if (len(bins) > self.max_bins):
+                self.collapse()
+
+
+    def collapse(self):
+
+        # Fold the lowest bins into the lowest of the 'max_bins' highest ones
+        keys   = sorted(self.bins)
+        target = keys[len(keys) - self.max_bins]
+        for key in keys[:len(keys) - self.max_bins]:
+            self.bins[target] += self.bins.pop(key)
+
+
+    def merge(self, other):
+
+        assert(self.relative_error == other.relative_error);
+        if (other.count == 0):
+            return self
+        for (key, count) in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count      += other.count
+        self.min         = min(self.min, other.min)
+        self.max         = max(self.max, other.max)
+        if (len(self.bins) > self.max_bins):
+            self.collapse()
+        return self
+
+
+    def quantile(self, q):
+
+        # Estimated q-quantile (0 <= q <= 1), or None if no value was added
+        if (self.count == 0):
+            return None
+        if (q <= 0):
+            return self.min
+        if (q >= 1):
+            return self.max
+        rank = q * (self.count - 1)
+        if (rank < self.zero_count):
+            return self.min if (self.min < 0) else 0
+        cumulative = self.zero_count
+        for key in sorted(self.bins):
+            cumulative += self.bins[key]
+            if (cumulative > rank):
+                value = 2 * math.exp(key * self.log_gamma) / (1 + self.gamma)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+
+    @staticmethod
+    def merged(sketches, relative_error=0.01, max_bins=2048):
+
+        result = QuantileSketch(relative_error, max_bins)
+        for sketch in sketches:
+            result.merge(sketch)
+        return result
+
+
 ###############################################################################
 # This class represents a 'server' in the system; i.e. an entity that can     #
 # process tasks. Each server has an associated 'type' (e.g. CPU, GPU, etc.)   #
@@ -68,10 +1109,15 @@ class Task:
 ###############################################################################
 class Server:
     
-    def __init__(self, id, type):
+    def __init__(self, id, type, idle_servers=None, sampler=None, type_index=None, backlog=None, debug_trace=None):
 
         self.id                 = id
         self.type               = type
+        self.type_index         = type_index    # Position of 'type' in the configuration (and in task.per_server_services)
+        self.idle_servers       = idle_servers  # IdleServerIndex to keep up to date
+        self.backlog            = backlog       # ServerBacklog to keep up to date
+        self.sampler            = sampler if (sampler) else RandomSampler(None, legacy=True)
+        self.debug_trace        = debug_trace if (debug_trace) else DebugTrace()
         self.pmode              = None
         self.num_reqs           = 0
         self.last_stopped_at    = 0
@@ -82,8 +1128,9 @@ class Server:
         self.stats['Tasks Serviced per Type'] = {}
         self.stats['Avg Resp Time']           = 0     # Overall for all tasks
         self.stats['Avg Resp Time per Type']  = {}    # Per task type
-        self.stats['Service Time per Type']   = {}    # Per task type
-        self.stats['Lifetime per Type']       = {}    # Per task type
+        self.stats['Service Time per Type']   = {}    # Per task type (StreamingStats)
+        self.stats['Lifetime per Type']       = {}    # Per task type (StreamingStats)
+        self.stats['Waiting Time per Type']   = {}    # Per task type (StreamingStats)
 
         self.reset()
         
@@ -98,22 +1145,28 @@ class Server:
         self.curr_job_end_time      = None
         self.last_usage_started_at  = None
         self.task                   = None
+
+        if (self.idle_servers):
+            self.idle_servers.set_idle(self)
+        if (self.backlog):
+            self.backlog.set_idle(self)
         
         
     def assign_task(self, sim_time, task):
         
         # At this moment, we know the target server where the task will run.
         # Therefore, we can compute the task's service time
-        mean_service_time                = task.mean_service_time_dict[self.type]
-        stdev_service_time               = task.stdev_service_time_dict[self.type]
+        mean_service_time                = task.descriptor.mean_service_time_dict[self.type]
+        stdev_service_time               = task.descriptor.stdev_service_time_dict[self.type]
         #service_time                    = task.per_server_service_dict[self.type] # Use the per-server type service time, indexed by server_type
         #service_time                    = int(round(numpy.random.normal(loc=mean_service_time, scale=stdev_service_time, size=1)))
         
         # Ensure that the random service time is a positive value...
-        while True:
-            service_time                 = int(round(numpy.random.normal(loc=mean_service_time, scale=stdev_service_time, size=1)))
-            if (service_time > 0):
-                break
+        if (self.sampler.crn):
+            # Common random numbers: the a-priori service time of the task
+            service_time                 = max(int(task.per_server_services[self.type_index]), 1)
+        else:
+            service_time                 = self.sampler.positive_normal(('service', task.type, self.type), mean_service_time, stdev_service_time)
         
         # Ensure that the random service time is a positive value...
         #if (service_time <= 0):
@@ -128,10 +1181,16 @@ class Server:
         self.last_usage_started_at       = sim_time
         self.num_reqs                    += 1
         self.task                        = task
+
+        if (self.idle_servers):
+            self.idle_servers.set_busy(self)
+        if (self.backlog):
+            self.backlog.set_busy(self)
         
         self.busy_time                   += self.curr_service_time
-        logging.debug("[%10ld] Assigned task %ld (%s) to server %d" % (sim_time, task.id, task.type, self.id))
-        logging.debug("               Service time: %ld, start time: %ld, end time: %ld, estimated end time: %ld" % (self.curr_service_time, self.curr_job_start_time, self.curr_job_end_time, self.curr_job_end_time_estimated))
+        if (self.debug_trace.active and self.debug_trace.task(task.id)):
+            logging.debug("[%10ld] Assigned task %ld (%s) to server %d" % (sim_time, task.id, task.type, self.id))
+            logging.debug("               Service time: %ld, start time: %ld, end time: %ld, estimated end time: %ld" % (self.curr_service_time, self.curr_job_start_time, self.curr_job_end_time, self.curr_job_end_time_estimated))
     
     def __str__(self):
         return ('Server ' + str(self.id) + ' (' + self.type + ')\n'
@@ -141,23 +1200,702 @@ class Server:
                 )
 
 
+###############################################################################
+# This class holds a stream of task arrivals (e.g. pre-generated arrivals or  #
+# a binary input trace) in compact numeric arrays: one entry per task, with   #
+# its arrival time, its task type (as a code into 'task_types') and its       #
+# service time on each server type (NaN where the task type cannot run on     #
+# that server type). The arrays may be memory-mapped. Entries are consumed in #
+# order, with the same interface (and options) as TextTaskTrace: 'columns'    #
+# maps each of the 'server_types' to its service_times column (None if not    #
+# present), arrival times are scaled by 'time_scale', and 'service_times_fn'  #
+# (if given) computes the service times of each task from its task type.      #
+###############################################################################
+class TaskArrivalTrace:
+
+    def __init__(self, server_types, task_types, arrival_times, task_codes, service_times,
+                 columns=None, time_scale=1.0, service_times_fn=None, arrival_deltas=False):
+
+        self.server_types     = server_types    # Order of the service times returned by pop()
+        self.task_types       = task_types      # Task type names, indexed by task code
+        self.arrival_times    = arrival_times   # Int array (of the differences between arrival times, if 'arrival_deltas')
+        self.arrival_deltas   = arrival_deltas
+        self.task_codes       = task_codes      # Small-int array
+        self.service_times    = service_times   # Float (NaN if missing) or int (negative if missing) matrix: one row per task, one column per server type
+        self.columns          = columns if (columns is not None) else range(len(server_types))
+        self.time_scale       = time_scale
+        self.service_times_fn = service_times_fn
+        self.next_entry       = 0
+
+        # The columns (possibly memory-mapped) are converted to Python lists one
+        # block of entries at a time: indexing numpy arrays per entry is slow
+        self.block_start      = 0
+        self.block_base       = 0               # Arrival time before the block (with 'arrival_deltas')
+        self.block_times      = []
+        self.block_tasks      = []
+        self.block_services   = []
+
+
+    def load_block(self):
+
+        start = self.next_entry
+        end   = min(start + TRACE_BLOCK_SIZE, len(self.arrival_times))
+        times = self.arrival_times[start:end]
+        if (self.arrival_deltas):
+            # Blocks are loaded in order, so the running sum carries over
+            times = self.block_base + numpy.cumsum(times, dtype=numpy.int64)
+            if (len(times) > 0):
+                self.block_base = int(times[-1])
+        if (self.time_scale != 1.0):
+            times = (times * self.time_scale).astype(numpy.int64)
+        self.block_start    = start
+        self.block_times    = times.tolist()
+        self.block_tasks    = [self.task_types[code] for code in self.task_codes[start:end].tolist()]
+        self.block_services = []
+        if (self.service_times_fn is None):
+            # Reorder the service time columns, then turn NaNs or negative
+            # values (and missing columns) into None
+            block    = self.service_times[start:end]
+            services = numpy.zeros((end - start, len(self.columns)), dtype=numpy.int64)
+            missing  = numpy.ones((end - start, len(self.columns)), dtype=bool)
+            for (idx, col) in enumerate(self.columns):
+                if (col is not None):
+                    column           = block[:, col]
+                    missing[:, idx]  = numpy.isnan(column) if (column.dtype.kind == 'f') else (column < 0)
+                    services[:, idx] = numpy.where(missing[:, idx], 0, column)
+            services = services.astype(object)
+            services[missing] = None
+            self.block_services = services.tolist()
+
+
+    def peek_time(self):
+
+        # Arrival time of the next entry
+        idx = self.next_entry - self.block_start
+        if (idx >= len(self.block_times)):
+            self.load_block()
+            idx = 0
+        return self.block_times[idx]
+
+
+    def pop(self):
+
+        # Returns (arrival time, task type, service time per server type);
+        # the service time is None where the task cannot run on a server type
+        arrival_time = self.peek_time()
+        idx = self.next_entry - self.block_start
+        self.next_entry += 1
+        task = self.block_tasks[idx]
+        if (self.service_times_fn):
+            return (arrival_time, task, self.service_times_fn(task))
+        return (arrival_time, task, self.block_services[idx])
+
+
+    def close(self):
+        pass
+
+    def __len__(self):
+        return len(self.arrival_times) - self.next_entry
+
+
+    @staticmethod
+    def from_trace(trace):
+
+        # Read a whole (streaming) trace into memory
+        task_types    = []
+        arrival_times = []
+        task_codes    = []
+        service_times = []
+        while (trace):
+            (arrival_time, task, stimes) = trace.pop()
+            if not task in task_types:
+                task_types.append(task)
+            arrival_times.append(arrival_time)
+            task_codes.append(task_types.index(task))
+            service_times.append([float("nan") if (st is None) else st for st in stimes])
+        return TaskArrivalTrace(trace.server_types, task_types,
+                                numpy.array(arrival_times, dtype=numpy.int64),
+                                numpy.array(task_codes, dtype=numpy.int16),
+                                numpy.array(service_times, dtype=float).reshape(-1, len(trace.server_types)))
+
+
+###############################################################################
+# This class reads an input trace file (see TRACES.md) lazily, one entry at a #
+# time, with a read-ahead of one entry to know the next arrival time; so the  #
+# memory used does not depend on the trace length. It provides the same       #
+# interface as TaskArrivalTrace. The service time columns are mapped to the   #
+# 'server_types' order through the server types listed in the trace header.   #
+# If 'service_times_fn' is given, it computes the service times of each task  #
+# (from the task type) instead of taking them from the trace.                 #
+###############################################################################
+class TextTaskTrace:
+
+    def __init__(self, file_name, server_types, time_scale=1.0, service_times_fn=None):
+
+        self.server_types       = server_types
+        self.time_scale         = time_scale
+        self.service_times_fn   = service_times_fn
+        self.trace_file         = open(file_name, 'r')
+
+        # First line indicates the order of server_types for future lines
+        header                  = self.trace_file.readline()
+        self.trace_server_order = [item.strip() for item in header.strip().split(',')]
+        if (server_types is None):
+            self.server_types   = server_types = self.trace_server_order
+        self.columns            = [(2 + self.trace_server_order.index(server_type)) if (server_type in self.trace_server_order) else None
+                                   for server_type in server_types]
+        self.next_entry         = self.read_entry()
+
+
+    def read_entry(self):
+
+        for line in self.trace_file:
+            tmp = line.strip().split(',')
+            if (len(tmp) < 2):
+                continue
+            atime = int(int(tmp[0])*self.time_scale)
+            task  = tmp[1].strip()
+            if (self.service_times_fn):
+                stimes = self.service_times_fn(task)
+            else:
+                stimes = []
+                for col in self.columns:
+                    if (col is None or col >= len(tmp) or tmp[col].strip() == 'None'):
+                        stimes.append(None)
+                    else:
+                        stimes.append(int(tmp[col]))
+            return (atime, task, stimes)
+
+        self.close()
+        return None
+
+
+    def peek_time(self):
+
+        # Arrival time of the next entry
+        return self.next_entry[0]
+
+
+    def pop(self):
+
+        entry           = self.next_entry
+        self.next_entry = self.read_entry()
+        return entry
+
+
+    def close(self):
+        self.trace_file.close()
+
+    def __nonzero__(self):
+        return self.next_entry is not None
+
+
+###############################################################################
+# Binary (columnar) task trace format. A binary trace file contains:          #
+#   - The magic string 'STOMPTRC'                                             #
+#   - The length of a JSON header (little-endian uint64) and the header, with #
+#     the server types (service time column order), the task type names       #
+#     (indexed by task code), the number of tasks and the type of each column #
+#   - The arrival times, as the difference with the previous arrival time     #
+#     (the first one, with 0), the task codes and the service time matrix     #
+#     (one row per task, -1 where a task cannot run on a server type), each   #
+#     column starting at an 8-byte aligned offset                             #
+# Every column is stored with the narrowest integer type (int8 to int64)      #
+# that holds its values. Traces written by earlier versions, with absolute    #
+# int64 arrival times, int16 task codes and float64 service times (NaN where  #
+# a task cannot run), have no column types in their header, and are still     #
+# read. All values are little-endian, so the columns can be memory-mapped.    #
+# Binary trace files are recognized by their contents when read, and they     #
+# are written when the trace file name ends with BINARY_TRACE_EXT.            #
+###############################################################################
+BINARY_TRACE_MAGIC = 'STOMPTRC'
+BINARY_TRACE_EXT   = '.btrc'
+TRACE_BLOCK_SIZE   = 65536      # Entries converted at a time by TaskArrivalTrace
+BINARY_TRACE_V1    = {'arrival_type': '<i8', 'arrival_deltas': False, 'code_type': '<i2', 'service_type': '<f8'}
+
+
+def is_binary_trace(file_name):
+
+    with open(file_name, 'rb') as trace_file:
+        return trace_file.read(len(BINARY_TRACE_MAGIC)) == BINARY_TRACE_MAGIC
+
+
+def binary_trace_layout(header):
+
+    # Offsets of the three columns, from the start of the data
+    num_tasks      = header['num_tasks']
+    num_servers    = len(header['server_types'])
+    arrival_offset = 0
+    codes_offset   = arrival_offset + ((numpy.dtype(header['arrival_type']).itemsize * num_tasks + 7) // 8) * 8
+    service_offset = codes_offset + ((numpy.dtype(header['code_type']).itemsize * num_tasks + 7) // 8) * 8
+    service_end    = service_offset + numpy.dtype(header['service_type']).itemsize * num_tasks * num_servers
+    return (arrival_offset, codes_offset, service_offset, service_end)
+
+
+def narrowest_int_type(low, high):
+
+    # Narrowest little-endian integer type that holds every value in [low, high]
+    for int_type in ['<i1', '<i2', '<i4']:
+        if (numpy.iinfo(int_type).min <= low and high <= numpy.iinfo(int_type).max):
+            return int_type
+    return '<i8'
+
+
+def open_task_trace(file_name, server_types=None, time_scale=1.0, service_times_fn=None):
+
+    # Open a text or binary task trace for reading (see TextTaskTrace)
+    if not is_binary_trace(file_name):
+        return TextTaskTrace(file_name, server_types, time_scale, service_times_fn)
+
+    with open(file_name, 'rb') as trace_file:
+        trace_file.read(len(BINARY_TRACE_MAGIC))
+        (header_len,) = struct.unpack('<Q', trace_file.read(8))
+        header        = json.loads(trace_file.read(header_len))
+    for (key, value) in BINARY_TRACE_V1.items():
+        header.setdefault(key, value)
+    data_offset = len(BINARY_TRACE_MAGIC) + 8 + header_len
+    num_tasks   = header['num_tasks']
+    num_servers = len(header['server_types'])
+    (arrival_offset, codes_offset, service_offset, service_end) = binary_trace_layout(header)
+    if (num_tasks > 0):
+        arrival_times = numpy.memmap(file_name, dtype=header['arrival_type'], mode='r', offset=data_offset + arrival_offset, shape=(num_tasks,))
+        task_codes    = numpy.memmap(file_name, dtype=header['code_type'], mode='r', offset=data_offset + codes_offset, shape=(num_tasks,))
+        service_times = numpy.memmap(file_name, dtype=header['service_type'], mode='r', offset=data_offset + service_offset, shape=(num_tasks, num_servers))
+    else:
+        arrival_times = numpy.zeros(0, dtype=header['arrival_type'])
+        task_codes    = numpy.zeros(0, dtype=header['code_type'])
+        service_times = numpy.zeros((0, num_servers), dtype=header['service_type'])
+
+    if (server_types is None):
+        server_types = header['server_types']
+    columns = [header['server_types'].index(server_type) if (server_type in header['server_types']) else None
+               for server_type in server_types]
+    trace = TaskArrivalTrace(server_types, header['task_types'], arrival_times, task_codes, service_times,
+                             columns, time_scale, service_times_fn, header['arrival_deltas'])
+    trace.trace_server_order = header['server_types']
+    return trace
+
+
+def create_task_trace(file_name, server_types):
+
+    # Create a text or binary (depending on the file name) task trace for writing
+    if (file_name.endswith(BINARY_TRACE_EXT)):
+        return BinaryTraceWriter(file_name, server_types)
+    return TextTraceWriter(file_name, server_types)
+
+
+###############################################################################
+# These classes write a task trace, one task arrival at a time, in the text   #
+# format (see TRACES.md) or in the binary format. Service times are given in  #
+# 'server_types' order, with None (or 'None') where a task cannot run.        #
+###############################################################################
+class TextTraceWriter:
+
+    def __init__(self, file_name, server_types):
+
+        self.trace_file = open(file_name, 'w')
+        self.trace_file.write('%s\n' % ','.join(map(str, server_types)))
+
+
+    def write(self, arrival_time, task_type, service_times):
+
+        self.trace_file.write('%d,%s,%s\n' % (arrival_time, task_type, ','.join(map(str, service_times))))
+
+
+    def close(self):
+
+        self.trace_file.close()
+
+
+class BinaryTraceWriter:
+
+    # The columns are written (as int64) to temporary files as the tasks
+    # arrive, in blocks of 'block_size' tasks, keeping the range of their
+    # values; on close(), they are narrowed and assembled into the trace
+    def __init__(self, file_name, server_types, block_size=65536):
+
+        self.file_name     = file_name
+        self.server_types  = list(server_types)
+        self.task_types    = []
+        self.task_codes    = {}
+        self.num_tasks     = 0
+        self.block_size    = block_size
+        self.column_files  = [tempfile.TemporaryFile() for i in range(3)]
+        self.ranges        = [[0, 0], [0, 0], [-1, -1]]  # Range of the values of each column
+        self.last_arrival  = 0
+        self.arrival_block = []
+        self.codes_block   = []
+        self.service_block = []
+
+
+    def write(self, arrival_time, task_type, service_times):
+
+        if not task_type in self.task_codes:
+            self.task_codes[task_type] = len(self.task_types)
+            self.task_types.append(task_type)
+        self.arrival_block.append(arrival_time - self.last_arrival)
+        self.last_arrival = arrival_time
+        self.codes_block.append(self.task_codes[task_type])
+        self.service_block.append([-1 if (st is None or st == 'None') else int(st) for st in service_times])
+        self.num_tasks += 1
+        if (len(self.arrival_block) == self.block_size):
+            self.flush()
+
+
+    def flush(self):
+
+        if (len(self.arrival_block) == 0):
+            return
+        for (column_file, value_range, block) in zip(self.column_files, self.ranges, [self.arrival_block, self.codes_block, self.service_block]):
+            values = numpy.array(block, dtype='<i8')
+            if (values.size > 0):
+                value_range[0] = min(value_range[0], int(values.min()))
+                value_range[1] = max(value_range[1], int(values.max()))
+            column_file.write(values.tostring())
+        self.arrival_block = []
+        self.codes_block   = []
+        self.service_block = []
+
+
+    def close(self):
+
+        self.flush()
+        header = OrderedDict([('server_types',   self.server_types),
+                              ('task_types',     self.task_types),
+                              ('num_tasks',      self.num_tasks),
+                              ('arrival_type',   narrowest_int_type(*self.ranges[0])),
+                              ('arrival_deltas', True),
+                              ('code_type',      narrowest_int_type(*self.ranges[1])),
+                              ('service_type',   narrowest_int_type(*self.ranges[2]))])
+        column_types = [header['arrival_type'], header['code_type'], header['service_type']]
+        header = json.dumps(header)
+        # Pad the header so that the data starts at an 8-byte aligned offset
+        header += ' ' * ((8 - (len(BINARY_TRACE_MAGIC) + 8 + len(header)) % 8) % 8)
+        (arrival_offset, codes_offset, service_offset, service_end) = binary_trace_layout(json.loads(header))
+        data_offset = len(BINARY_TRACE_MAGIC) + 8 + len(header)
+        with open(self.file_name, 'wb') as trace_file:
+            trace_file.write(BINARY_TRACE_MAGIC)
+            trace_file.write(struct.pack('<Q', len(header)))
+            trace_file.write(header)
+            for (column_file, column_type, column_end) in zip(self.column_files, column_types, [codes_offset, service_offset, service_end]):
+                column_file.seek(0)
+                for chunk in iter(lambda: column_file.read(8 * self.block_size), b''):
+                    trace_file.write(numpy.frombuffer(chunk, dtype='<i8').astype(column_type).tostring())
+                column_file.close()
+                # Pad the column up to the start of the next one
+                trace_file.write('\0' * (data_offset + column_end - trace_file.tell()))
+
+
+###############################################################################
+# This class writes one of the per-event trace files of a run (.global.trace, #
+# .global.atrace and the per task type .trace files). The records (tuples of  #
+# 'fields' values) are kept in memory and written in bulk every 'buffer_size' #
+# records: as text lines (formatted with 'record_format'), or as packed       #
+# binary records. A binary event trace file contains:                         #
+#   - The magic string 'STOMPREC'                                             #
+#   - The length of a JSON header (little-endian uint64) and the header, with #
+#     the text preamble of the file, 'record_format' and the record fields    #
+#     (name and numpy type of each one)                                       #
+#   - The records, as little-endian packed structures                         #
+# open_event_trace() reads it back, so that the text layout can be rebuilt.   #
+###############################################################################
+EVENT_TRACE_MAGIC = 'STOMPREC'
+EVENT_TRACE_EXT   = '.bin'
+
+
+class EventTraceWriter:
+
+    def __init__(self, file_name, preamble, record_format, fields, binary=False, buffer_size=65536):
+
+        self.record_format = record_format
+        self.binary        = binary
+        self.buffer_size   = buffer_size
+        self.records       = []
+        if (binary):
+            self.dtype      = numpy.dtype([(str(name), type) for (name, type) in fields])
+            self.trace_file = open(file_name + EVENT_TRACE_EXT, 'wb')
+            header = json.dumps({'preamble': preamble, 'record_format': record_format, 'fields': fields})
+            self.trace_file.write(EVENT_TRACE_MAGIC)
+            self.trace_file.write(struct.pack('<Q', len(header)))
+            self.trace_file.write(header)
+        else:
+            self.trace_file = open(file_name, 'w')
+            self.trace_file.write(preamble)
+
+
+    def write(self, record):
+
+        self.records.append(record)
+        if (len(self.records) >= self.buffer_size):
+            self.flush()
+
+
+    def flush(self):
+
+        if (self.binary):
+            self.trace_file.write(numpy.array(self.records, dtype=self.dtype).tostring())
+        else:
+            self.trace_file.write(''.join([self.record_format % record for record in self.records]))
+        self.records = []
+
+
+    def close(self):
+
+        self.flush()
+        self.trace_file.close()
+
+
+def open_event_trace(file_name):
+
+    # Returns the preamble, the record format and the (memory-mapped) records
+    # of a binary event trace file
+    with open(file_name, 'rb') as trace_file:
+        if (trace_file.read(len(EVENT_TRACE_MAGIC)) != EVENT_TRACE_MAGIC):
+            raise ValueError('%s is not a binary event trace file' % (file_name))
+        (header_len,) = struct.unpack('<Q', trace_file.read(8))
+        header        = json.loads(trace_file.read(header_len))
+    dtype       = numpy.dtype([(str(name), str(type)) for (name, type) in header['fields']])
+    data_offset = len(EVENT_TRACE_MAGIC) + 8 + header_len
+    num_records = (os.path.getsize(file_name) - data_offset) // dtype.itemsize
+    if (num_records > 0):
+        records = numpy.memmap(file_name, dtype=dtype, mode='r', offset=data_offset, shape=(num_records,))
+    else:
+        records = numpy.zeros(0, dtype=dtype)
+    return (header['preamble'], str(header['record_format']), records)
+
+
+###############################################################################
+# Simulation results output. STOMP.run() returns the results of a simulation  #
+# as nested (ordered) dictionaries and lists of plain values. write_results() #
+# stores them as JSON, or as CSV if the file name ends with '.csv': a header  #
+# row with the flattened names of the values (nested keys and list indices    #
+# joined with '.', e.g. 'Task Types.fft.Avg Resp Time'), and a row with the   #
+# values.                                                                     #
+###############################################################################
+def flatten_results(results, prefix=''):
+
+    flat = OrderedDict()
+    if (isinstance(results, dict)):
+        items = results.items()
+    elif (isinstance(results, list)):
+        items = enumerate(results)
+    else:
+        flat[prefix] = results
+        return flat
+    for (key, value) in items:
+        flat.update(flatten_results(value, '%s%s' % (prefix + '.' if prefix else '', key)))
+    return flat
+
+
+def write_results(results, file_name):
+
+    with open(file_name, 'wb') as results_file:
+        if (file_name.endswith('.csv')):
+            flat   = flatten_results(results)
+            writer = csv.writer(results_file)
+            writer.writerow(flat.keys())
+            writer.writerow(['' if value is None else value for value in flat.values()])
+        else:
+            json.dump(results, results_file, indent=2, separators=(',', ': '))
+            results_file.write('\n')
+
+
+def read_results(file_name):
+
+    # Reads back results written (as JSON) by write_results()
+    with open(file_name) as results_file:
+        return json.load(results_file, object_pairs_hook=OrderedDict)
+
+
+###############################################################################
+# This class implements the simulation 'event calendar': a priority queue of  #
+# pending events ordered by time. Events scheduled for the same time are      #
+# ordered by event type (its numeric value acts as a priority) and then by    #
+# insertion order, so ties are always resolved in a stable way. Any event     #
+# type can be scheduled; 'data' carries the event payload (e.g. the server    #
+# that finishes).                                                             #
+###############################################################################
+class EventQueue:
+
+    def __init__(self):
+
+        self.heap = []
+        self.seq  = 0    # Insertion counter, used for stable tie-breaking
+
+
+    def push(self, time, event_type, data=None):
+
+        heapq.heappush(self.heap, (time, event_type, self.seq, data))
+        self.seq += 1
+
+
+    def pop(self):
+
+        (time, event_type, seq, data) = heapq.heappop(self.heap)
+        return (time, event_type, data)
+
+
+    def peek_time(self):
+
+        if (len(self.heap) == 0):
+            return float("inf")
+        return self.heap[0][0]
+
+
+    def __len__(self):
+        return len(self.heap)
+
+
 class BaseSchedulingPolicy:
     
     __metaclass__ = ABCMeta
 
+    # The RandomSampler of the simulation (set by STOMP before calling init);
+    # a policy that makes random decisions should draw them from its own
+    # streams, e.g. self.sampler.stream(('policy', ...)), rather than from the
+    # global random state, so that its simulations are reproducible
+    sampler = None
+
+    # The event calendar of the simulation (set by STOMP before calling init),
+    # through which set_timer() schedules the policy's timers
+    events = None
+
+    # The DebugTrace of the simulation (set by STOMP before calling init),
+    # which guards the policy's debug messages; disabled by default
+    debug_trace = DebugTrace()
+
     @abstractmethod
     def init(self, servers, stomp_stats, stomp_params): pass
     
+    # 'tasks' is the TaskQueue of tasks waiting to be served
     @abstractmethod
     def assign_task_to_server(self, sim_time, tasks): pass
 
+    # Batch entry point, used with the 'batch' scheduling_mode: returns the
+    # list of (task, server) assignments to make at this scheduling point, in
+    # order. The tasks are still in 'tasks' and the servers still idle: STOMP
+    # removes each task from the queue and assigns it to its server, so the
+    # policy must not pick the same server twice. The default (None) makes
+    # STOMP call assign_task_to_server until it returns None instead.
+    def assign_tasks_to_servers(self, sim_time, tasks):
+        return None
+
     @abstractmethod
     def remove_task_from_server(self, sim_time, server): pass
 
     @abstractmethod
     def output_final_stats(self, sim_time): pass
 
-    
+    # Optional event callbacks, so that a policy can keep incremental state
+    # (e.g. queue depth or running load per task type) instead of rescanning
+    # the queue and the servers on every event. They are called when a task
+    # is enqueued, when a task is dropped on arrival because the queue is full
+    # ('max_queue_size'), when a task completes on a server (after its
+    # statistics are updated, before remove_task_from_server), and when a
+    # timer set with set_timer() expires; the scheduling decisions of the
+    # same event follow.
+    def on_task_arrival(self, sim_time, task):
+        pass
+
+    def on_task_drop(self, sim_time, task):
+        pass
+
+    def on_task_complete(self, sim_time, task, server):
+        pass
+
+    def on_timer(self, sim_time, data):
+        pass
+
+    # Schedules a call to on_timer(time, data) at simulation time 'time' (not
+    # earlier than the current time), e.g. for periodic rebalancing: on_timer
+    # can set the next timer. Timers cannot be cancelled; a policy can ignore
+    # the ones it no longer needs (e.g. by the 'data' it gave them). Pending
+    # timers do not keep the simulation running once all the tasks are done.
+    def set_timer(self, time, data=None):
+        self.events.push(time, STOMP.E_POLICY_TIMER, data)
+
+    # Policy statistics to include in the simulation results (see
+    # STOMP.compute_results); must be made of plain, JSON-serializable values
+    def final_stats(self, sim_time):
+        return {}
+
+
+###############################################################################
+# This class profiles a simulation (with the 'profile' option): it measures   #
+# the wall time of the phases of each iteration of the main loop of run()     #
+# (event selection, event handling and scheduling decisions), counts the      #
+# events per type, and wraps the entry points of the scheduling policy to     #
+# count their calls, the calls that returned None, the tasks they assigned,   #
+# their wall time and the queue length at call time. When profiling is        #
+# disabled, STOMP has no profile and the policy is called directly.           #
+###############################################################################
+class SimulationProfile(object):
+
+    PHASES      = ('Event Selection', 'Event Handling', 'Scheduling')
+    EVENT_NAMES = {1: 'Power Mgmt', 2: 'Task Arrival', 3: 'Server Finishes', 4: 'Nothing', 5: 'Policy Timer'}
+
+    def __init__(self):
+
+        self.timer       = time.time
+        self.run_time    = 0.0
+        self.phase_times = [0.0] * len(SimulationProfile.PHASES)
+        self.events      = {}            # Per event type: number of events
+        self.calls       = OrderedDict() # Per policy entry point: [calls, None returns, assignments, wall time, queue length (StreamingStats)]
+
+
+    def count_event(self, event_type):
+
+        self.events[event_type] = self.events.get(event_type, 0) + 1
+
+
+    def wrap(self, name, entry_point):
+
+        # Returns a profiled version of a policy entry point (e.g. the bound
+        # method sched_policy.assign_task_to_server)
+        stats = self.calls.setdefault(name, [0, 0, 0, 0.0, StreamingStats()])
+        timer = self.timer
+
+        def profiled_entry_point(sim_time, tasks):
+            queue_length = len(tasks)
+            start        = timer()
+            result       = entry_point(sim_time, tasks)
+            stats[3]    += timer() - start
+            stats[0]    += 1
+            stats[4].add(queue_length)
+            if (result is None):
+                stats[1] += 1
+            else:
+                stats[2] += len(result) if (isinstance(result, list)) else 1
+            return result
+
+        return profiled_entry_point
+
+
+    def results(self):
+
+        num_events = sum(self.events.values())
+        results = OrderedDict()
+        results['Run Time']        = self.run_time
+        results['Events']          = num_events
+        results['Events per Sec']  = (num_events / self.run_time) if (self.run_time > 0) else None
+        results['Events per Type'] = OrderedDict([(SimulationProfile.EVENT_NAMES.get(event_type, str(event_type)), count)
+                                                  for (event_type, count) in sorted(self.events.items())])
+        results['Phases'] = OrderedDict()
+        for (phase, phase_time) in zip(SimulationProfile.PHASES, self.phase_times):
+            results['Phases'][phase] = OrderedDict([('Time', phase_time), ('Pct Time', (100 * phase_time / self.run_time) if (self.run_time > 0) else 0.0)])
+        results['Policy Calls'] = OrderedDict()
+        for (name, (calls, none_returns, assignments, call_time, queue_length)) in self.calls.items():
+            results['Policy Calls'][name] = OrderedDict([
+                ('Calls',            calls),
+                ('None Returns',     none_returns),
+                ('Assignments',      assignments),
+                ('Time',             call_time),
+                ('Avg Time',         (call_time / calls) if (calls > 0) else 0.0),
+                ('Avg Queue Length', queue_length.mean()),
+                ('Max Queue Length', queue_length.max)])
+        return results
+
+
 ###############################################################################
 # >>>>>>> THIS IS THE MAIN CLASS THAT IMPLEMENTS THE QUEUE SIMULATOR <<<<<<<< #
 #                                                                             #
@@ -175,6 +1913,7 @@ class STOMP:
     E_TASK_ARRIVAL      = 2
     E_SERVER_FINISHES   = 3
     E_NOTHING           = 4
+    E_POLICY_TIMER      = 5    # A timer set by the scheduling policy (see BaseSchedulingPolicy.set_timer)
 
     
     def __init__(self, stomp_params, sched_policy):
@@ -186,13 +1925,22 @@ class STOMP:
         self.num_tasks_generated = 0
 
         logging.basicConfig(level=eval('logging.' + self.params['general']['logging_level']), format="%(message)s")
+        self.debug_trace = DebugTrace()
+        self.debug_trace.configure(logging.getLogger().isEnabledFor(logging.DEBUG),
+                                   self.params['general'].get('debug_time_window'),
+                                   self.params['general'].get('debug_task_ids'))
         
-        numpy.random.seed(self.params['general']['random_seed'])
+        self.sampler = RandomSampler(self.params['general']['random_seed'],
+                                     self.params['general'].get('random_block_size', 4096),
+                                     self.params['general'].get('random_sampling', 'buffered') == 'legacy',
+                                     self.params['general'].get('common_random_numbers', False),
+                                     self.params['general'].get('antithetic', False))
         
         #pprint.pprint(self.params)
         logging.info("CONFIGURATION:\n%s\n" % (self.params))  #pprint.pprint(self.params))
         
-        self.tasks                              = []   # Main queue
+        self.tasks                              = TaskQueue()   # Main queue
+        self.task_types                         = TaskType.registry(self.params)  # Maps task type name to its descriptor
         self.servers                            = []
         self.tasks_to_servers                   = {}   # Maps task type to target servers
         #self.supported_servers                 = []
@@ -206,13 +1954,53 @@ class STOMP:
         self.stats['Running Tasks']             = 0
         self.stats['Busy Servers']              = 0
         self.stats['Available Servers']         = {}
+        self.stats['Idle Servers']              = IdleServerIndex()  # Which servers are available, per type
+        self.stats['Server Backlog']            = ServerBacklog(self.stats['Idle Servers'])  # Projected free time of the busy servers
         self.stats['Tasks Generated']           = 0
+        self.stats['Tasks Dropped']             = 0     # Arrived with a full queue
         self.stats['Tasks Serviced']            = 0
         self.stats['Tasks Serviced per Type']   = {}
         self.stats['Avg Resp Time']             = 0     # Overall for all tasks
         self.stats['Avg Resp Time per Type']    = {}    # Per task type
         self.stats['Avg Waiting Time']          = 0     # Overall for all tasks
         self.stats['Avg Waiting Time per Type'] = {}    # Per task type
+        self.stats['Resp Time Sketch per Type']    = {}    # Per task type (QuantileSketch)
+        self.stats['Waiting Time Sketch per Type'] = {}    # Per task type (QuantileSketch)
+        self.stats['Service Time Sketch per Type'] = {}    # Per task type (QuantileSketch)
+        self.stats['Resp Time Batch Means']          = BatchMeans(self.params['simulation'].get('ci_batches', 20))
+        self.stats['Resp Time Batch Means per Type'] = {}  # Per task type (BatchMeans)
+
+        # Sequential stopping: with a 'ci_target', no more tasks are generated
+        # once the confidence interval of the response time is narrow enough;
+        # 'max_tasks_simulated' is then a hard cap
+        self.ci_target     = self.params['simulation'].get('ci_target')
+        self.max_tasks     = self.params['simulation']['max_tasks_simulated']
+        self.ci_stopped_at = None   # Tasks serviced when the target was reached
+
+        # Scheduling mode: 'single' calls the policy's assign_task_to_server
+        # once per event (at most one task started per event); 'batch' starts
+        # all the assignments the policy makes at each scheduling point
+        self.batch_scheduling = (self.params['simulation'].get('scheduling_mode', 'single') == 'batch')
+
+        # Profiling (opt-in): wall time per phase of the main loop and per
+        # call to the policy's entry points; see SimulationProfile
+        self.profile = SimulationProfile() if (self.params['general'].get('profile', False)) else None
+
+        # Warm-up truncation: while the end of the warm-up period is being
+        # detected, the completed tasks are also kept (TaskRecords), so that
+        # the statistics can be recomputed without the warm-up tasks once it
+        # is detected
+        self.warmup         = None
+        self.warmup_records = None
+        self.warmup_results = OrderedDict([('Method', 'off'), ('Detected', None), ('Deleted Tasks', 0), ('Cut-off Time', 0),
+                                           ('Detection Tasks', None), ('Detection Time', None)])
+        if (self.params['simulation'].get('warmup_truncation', 'off') == 'mser'):
+            # The detection gives up (with a last check) after 'warmup_max_tasks'
+            # tasks serviced, which bounds the memory used by the records
+            self.warmup_limit   = self.params['simulation'].get('warmup_max_tasks', 100000)
+            self.warmup         = WarmupDetector(self.params['simulation'].get('warmup_batch_size', 5))
+            self.warmup_records = TaskRecords()
+            self.warmup_results['Method'] = 'MSER-%d' % (self.warmup.batch_size)
         
         # Histograms
         self.bin_size                           = 1
@@ -221,22 +2009,42 @@ class STOMP:
         self.stats['Queue Size Histogram']      = numpy.zeros(self.num_bins, dtype=int)  # N-bin histogram
         self.stats['Max Queue Size']            = 0
         
-        self.task_trace_files                   = {}   # Per task type
-        self.task_trace_file                    = open(self.working_dir + '/' + self.basename + '.global.trace', 'w')
-        self.task_trace_file.write('%s\n\n' % (datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
-        self.task_trace_file.write("CONFIGURATION:\n%s\n" % (self.params))  #pprint.pprint(self.params))
-        self.task_trace_file.write('Time\tResponse time (avg)\n')
+        # Per-event trace files: 'off' (none), 'sampled' (the tasks whose id is a
+        # multiple of event_trace_sample_period) or 'full' (all tasks)
+        event_trace = self.params['general'].get('event_trace', 'full')
+        if (event_trace == 'off'):
+            self.event_trace_period = 0
+        elif (event_trace == 'sampled'):
+            self.event_trace_period = self.params['general'].get('event_trace_sample_period', 100)
+        else:
+            self.event_trace_period = 1
 
-        self.task_assign_trace                = open(self.working_dir + '/' + self.basename + '.global.atrace', 'w')
-        self.task_assign_trace.write('%s\n\n' % (datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
-        self.task_assign_trace.write("CONFIGURATION:\n%s\n" % (self.params))  #pprint.pprint(self.params))
-        self.task_assign_trace.write('Time\tResponse time (avg)\n')
+        # Task and server type names are stored as fixed-size strings in binary event traces
+        name_len                                = max([len(name) for name in list(self.params['simulation']['tasks']) + list(self.params['simulation']['servers'])])
+        name_type                               = 'S%d' % (name_len)
+        self.task_trace_files                   = {}   # Per task type
+        self.task_trace_file                    = None
+        self.task_assign_trace                  = None
+        if (self.event_trace_period):
+            self.task_trace_file   = self.open_event_trace('.global.trace', '%ld,%.1f,%d,%s,%d,%s,%d,%d,%d\n',
+                                                           [('time', '<i8'), ('avg_resp_time', '<f8'), ('task_id', '<i8'), ('task_type', name_type),
+                                                            ('server_id', '<i8'), ('server_type', name_type), ('start_time', '<i8'),
+                                                            ('service_time', '<i8'), ('end_time', '<i8')])
+            self.task_assign_trace = self.open_event_trace('.global.atrace', '%ld,%d,%s,%d,%s,%d,%d,%d\n',
+                                                           [('time', '<i8'), ('task_id', '<i8'), ('task_type', name_type),
+                                                            ('server_id', '<i8'), ('server_type', name_type), ('start_time', '<i8'),
+                                                            ('service_time', '<i8'), ('end_time', '<i8')])
         
 
         self.init_servers()
 
+        # NumPy scoring kernel of the servers (see CompletionTimeKernel), kept
+        # up to date by the server backlog
+        self.stats['Completion Kernel']        = CompletionTimeKernel(self.task_types, self.servers)
+        self.stats['Server Backlog'].kernel    = self.stats['Completion Kernel']
+
         # IF user specified an input trace file then read that in here:
-        self.global_task_trace = []
+        self.global_task_trace = None
         if (stomp_params['general']['input_trace_file']):
             self.arrival_trace    = stomp_params['general']['input_trace_file'][0]
             self.input_trace_file = stomp_params['general']['input_trace_file'][1]
@@ -253,67 +2061,24 @@ class STOMP:
             
         if (self.input_trace_file):
             in_trace_name = self.working_dir + '/' + self.input_trace_file
-            with open(in_trace_name, 'r') as input_trace:
-                line_count = 0;
-                for line in input_trace.readlines():
-                    tmp = line.strip().split(',')
-                    if (line_count < 1):
-                        # First line indicates the order of server_types for future lines
-                        for item in tmp:
-                            self.intrace_server_order.append(item)
-                    else:
-                        tr_entry = []
-                        atime = int(tmp.pop(0))*self.params['simulation']['arrival_time_scale']
-                        task  = tmp.pop(0)
-                        tr_entry.append((atime, task))
-                        stimes = []
-                        if (self.arrival_trace):
-                            # We take the task type and arrival time, but compute (new) service times...
-                            for server_type in self.params['simulation']['servers']:
-                                if (server_type in self.params['simulation']['tasks'][task]['mean_service_time']):
-                                    mean_service_time  = self.params['simulation']['tasks'][task]['mean_service_time'][server_type]
-                                    stdev_service_time = self.params['simulation']['tasks'][task]['stdev_service_time'][server_type]
-                                    service_time = str(int(round(numpy.random.normal(loc=mean_service_time, scale=stdev_service_time, size=1))))
-                                    stimes.append((server_type,service_time))
-                                else :
-                                    stimes.append((server_type,str(None)))
-                            tr_entry.append(stimes)
-                            self.global_task_trace.append(tr_entry)
-                        else:
-                            # We take the service times from the input trace
-                            for item, server_type in zip(tmp, self.params['simulation']['servers']):
-                                stimes.append((server_type, item))
-                            tr_entry.append(stimes)
-                            self.global_task_trace.append(tr_entry)
-                    line_count += 1
+            if (self.arrival_trace):
+                # We take the task type and arrival time, but compute (new) service times...
+                service_times_fn = self.draw_apriori_service_times
+            else:
+                # We take the service times from the input trace
+                service_times_fn = None
+            self.global_task_trace = open_task_trace(in_trace_name, list(self.params['simulation']['servers']),
+                                                     self.params['simulation']['arrival_time_scale'], service_times_fn)
+            for item in self.global_task_trace.trace_server_order:
+                self.intrace_server_order.append(item)
+            if (self.arrival_trace and self.sampler.legacy):
+                # Legacy sampling draws all the service times before the simulation starts
+                self.global_task_trace = TaskArrivalTrace.from_trace(self.global_task_trace)
         elif (self.pre_gen_arrivals):
             # create an a-priori list of tasks at times...
             for server_type in self.params['simulation']['servers']:
                 self.intrace_server_order.append(server_type)
-            a_task_time = 0;
-            a_task_num = 0;
-            while (a_task_num < self.params['simulation']['max_tasks_simulated']):
-                task = numpy.random.choice(list(self.params['simulation']['tasks'])) 
-                tr_entry = []
-                tr_entry.append((int(a_task_time), task))
-                #tr_entry.append((a_task_time, task))
-                stimes = []
-                for server_type in self.params['simulation']['servers']:
-                    #tr_entry.append(server_type)
-                    if (server_type in self.params['simulation']['tasks'][task]['mean_service_time']):
-                        mean_service_time  = self.params['simulation']['tasks'][task]['mean_service_time'][server_type]
-                        stdev_service_time = self.params['simulation']['tasks'][task]['stdev_service_time'][server_type]
-                        service_time = str(int(round(numpy.random.normal(loc=mean_service_time, scale=stdev_service_time, size=1))))
-                        #tr_entry.append(service_time)
-                        stimes.append((server_type,service_time))
-                    else :
-                        #tr_entry.append(None)
-                        stimes.append((server_type,str(None)))
-                tr_entry.append(stimes)
-                self.global_task_trace.append(tr_entry)
-                logging.debug('%s' % tr_entry)
-                a_task_time = int(round(a_task_time + numpy.random.exponential(scale=self.params['simulation']['mean_arrival_time']*self.params['simulation']['arrival_time_scale'], size=1)))
-                a_task_num = a_task_num + 1;
+            self.global_task_trace = self.pre_generate_arrivals(self.params['simulation']['max_tasks_simulated'])
         else:
             for server_type in self.params['simulation']['servers']:
                 self.intrace_server_order.append(server_type)
@@ -321,21 +2086,93 @@ class STOMP:
         if (self.output_trace_file):
             out_trace_name = self.working_dir + '/' + self.output_trace_file
             logging.info('Generating output trace file to %s' % (out_trace_name))
-            self.output_trace = open(out_trace_name, 'w')
-            self.output_trace.write('%s\n' % ','.join(map(str, self.params['simulation']['servers'])))
+            self.output_trace = create_task_trace(out_trace_name, list(self.params['simulation']['servers']))
         
     
 
 
+    def pre_generate_arrivals(self, num_tasks):
+
+        # Generate the whole stream of task arrivals a priori: task types,
+        # arrival times (cumulative sum of the inter-arrival times) and a
+        # matrix with the service time of each task on each server type
+        task_types    = list(self.params['simulation']['tasks'])
+        server_types  = list(self.params['simulation']['servers'])
+        arrival_scale = self.params['simulation']['mean_arrival_time']*self.params['simulation']['arrival_time_scale']
+        arrival_times = numpy.zeros(num_tasks, dtype=numpy.int64)
+        task_codes    = numpy.zeros(num_tasks, dtype=numpy.int16)
+        service_times = numpy.full((num_tasks, len(server_types)), numpy.nan)
+
+        if (self.sampler.legacy):
+            # One task at a time, to reproduce the legacy random sequence
+            a_task_time = 0
+            for a_task_num in range(num_tasks):
+                task = self.sampler.choice(('task_type',), task_types)
+                arrival_times[a_task_num] = a_task_time
+                task_codes[a_task_num]    = task_types.index(task)
+                task_type = self.task_types[task]
+                for col, server_type in enumerate(server_types):
+                    if (task_type.mean_service_times[col] is not None):
+                        mean_service_time  = task_type.mean_service_times[col]
+                        stdev_service_time = task_type.stdev_service_times[col]
+                        service_times[a_task_num, col] = self.sampler.apriori_service(('apriori_service', task, server_type), mean_service_time, stdev_service_time)
+                a_task_time = a_task_time + self.sampler.exponential(('arrival',), arrival_scale)
+        else:
+            task_codes[:]     = self.sampler.block(('task_type',), len(task_types), num_tasks, RandomSampler.index_block)
+            arrival_times[1:] = numpy.cumsum(self.sampler.block(('arrival',), arrival_scale, max(num_tasks - 1, 0), RandomSampler.exponential_block))
+            for code, task in enumerate(task_types):
+                rows = numpy.flatnonzero(task_codes == code)
+                task_type = self.task_types[task]
+                for col, server_type in enumerate(server_types):
+                    if (task_type.mean_service_times[col] is not None):
+                        mean_service_time  = task_type.mean_service_times[col]
+                        stdev_service_time = task_type.stdev_service_times[col]
+                        service_times[rows, col] = self.sampler.apriori_service_block(('apriori_service', task, server_type), mean_service_time, stdev_service_time, len(rows))
+
+        return TaskArrivalTrace(server_types, task_types, arrival_times, task_codes, service_times)
+
+
+    def draw_apriori_service_times(self, task):
+
+        # Random service time of a task on each server type (None where it cannot run)
+        stimes    = []
+        task_type = self.task_types[task]
+        for (server_type, mean_service_time, stdev_service_time) in zip(task_type.all_server_types, task_type.mean_service_times, task_type.stdev_service_times):
+            if (mean_service_time is not None):
+                stimes.append(self.sampler.apriori_service(('apriori_service', task, server_type), mean_service_time, stdev_service_time))
+            else:
+                stimes.append(None)
+        return stimes
+
+
+    def open_event_trace(self, suffix, record_format, fields):
+
+        preamble = '%s\n\n' % (datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        preamble += "CONFIGURATION:\n%s\n" % (self.params)  #pprint.pprint(self.params))
+        preamble += 'Time\tResponse time (avg)\n'
+        return EventTraceWriter(self.working_dir + '/' + self.basename + suffix, preamble, record_format, fields,
+                                self.params['general'].get('event_trace_format', 'text') == 'binary',
+                                self.params['general'].get('event_trace_buffer_size', 65536))
+
+
+    def new_sketch(self):
+
+        return QuantileSketch(self.params['general'].get('quantile_relative_error', 0.01), self.params['general'].get('quantile_max_bins', 2048))
+
+
     def init_servers(self):
         
         id = 0
-        for server_type in self.params['simulation']['servers']:
+        for (type_index, server_type) in enumerate(self.params['simulation']['servers']):
             if not server_type in self.stats['Available Servers']:
                 self.stats['Available Servers'][server_type] = self.params['simulation']['servers'][server_type]['count']
             server_count = self.params['simulation']['servers'][server_type]['count']
             for i in range(server_count):
-                self.servers.append(Server(id, server_type))
+                server = Server(id, server_type, self.stats['Idle Servers'], self.sampler, type_index, self.stats['Server Backlog'], self.debug_trace)
+                server.stats['Resp Time Sketch']    = self.new_sketch()
+                server.stats['Waiting Time Sketch'] = self.new_sketch()
+                server.stats['Service Time Sketch'] = self.new_sketch()
+                self.servers.append(server)
                 id += 1
                 
             #self.supported_servers.append(server_type)
@@ -343,10 +2180,7 @@ class STOMP:
 
     def generate_n_enqueue_new_task(self, task_num):
         
-        if (len(self.tasks) == self.params['simulation']['max_queue_size']):
-            logging.info('[%10ld] Problem with finding an empty queue slot!' % (self.sim_time))
-            return False
-
+        # A task that arrives with a full queue ('max_queue_size') is dropped
         # Update histogram
         queue_size  = len(self.tasks)
         bin         = int(queue_size / self.bin_size)        
@@ -365,91 +2199,139 @@ class STOMP:
         # Create and enqueue a new task
         # Select the "type" of task to create
         # NOTE: self.global_task_trace is used for EITHER an input trace or pre-gen arrival trace behavior
-        tr_entry = []
+        tr_entry = None
         if (self.global_task_trace):
-            tr_entry = self.global_task_trace.pop(0)
-            #logging.info('ARR_TR : %s' % tr_entry)
-            task = tr_entry[0][1];
-            logging.debug('[%10ld] Setting next task type from TRACE to %s' % (self.sim_time, task))
+            tr_entry = self.global_task_trace.pop()
+            task = tr_entry[1]
+            if (self.debug_trace.active and self.debug_trace.task(task_num)):
+                logging.debug('[%10ld] Setting next task type from TRACE to %s' % (self.sim_time, task))
         else:
-            task = numpy.random.choice(list(self.params['simulation']['tasks'])) 
+            task = self.sampler.choice(('task_type',), list(self.params['simulation']['tasks']))
             #logging.debug("NEW_TASK from %s\n" % list(self.params['simulation']['tasks']))
             #logging.debug("%s\n" % task)
         #task = Task(self.sim_time, self.params['simulation']['mean_service_time'], self.params['simulation']['stdev_service_time'])
         #self.tasks.append(task)
-        the_task = Task(self.sim_time, task_num, task, self.params['simulation']['tasks'][task])
+        the_task = Task(self.sim_time, task_num, self.task_types[task])
 		# Set up the per-server-type execution times for this task...
-        if (self.global_task_trace or tr_entry): ##Trace entries exist or for last entry
+        if (tr_entry):
             # The service times are given (per-server-type) in the global_task_trace
-            stimes = tr_entry[1]
-            #logging.info('%s' % stimes)
-            for time_entry in stimes:
-                #logging.info('   %s %s' % (time_entry[0], time_entry[1]))
-                server_type  = time_entry[0]
-                service_time = time_entry[1]
-                the_task.per_server_services.append(service_time)
-                if (service_time != "None" ):
-                    the_task.per_server_service_dict[server_type] = int(service_time)
-            #logging.info('   PSD : %s' % the_task.per_server_service_dict)
+            for server_type, service_time in zip(self.global_task_trace.server_types, tr_entry[2]):
+                if (service_time is not None):
+                    the_task.per_server_services.append(service_time)
+                else:
+                    the_task.per_server_services.append(str(None))
         else:
             # Compute an a-priori service time per server-type
-            for server_type in self.params['simulation']['servers']:
-                if (server_type in the_task.mean_service_time_dict):
-                    mean_service_time  = the_task.mean_service_time_dict[server_type]
-                    stdev_service_time = the_task.stdev_service_time_dict[server_type]
-                    service_time       = int(round(numpy.random.normal(loc=mean_service_time, scale=stdev_service_time, size=1)))
+            task_type = self.task_types[task]
+            for (server_type, mean_service_time, stdev_service_time) in zip(task_type.all_server_types, task_type.mean_service_times, task_type.stdev_service_times):
+                if (mean_service_time is not None):
+                    service_time       = self.sampler.apriori_service(('apriori_service', task, server_type), mean_service_time, stdev_service_time)
                     # With a large StDev, we can end up with negative service times...
                     if (service_time <= 0): 
                         service_time = 1;  # Correct so we get a minmum service time of 1 
                     the_task.per_server_services.append(service_time)
-                    if (service_time != "None" ):
-                        the_task.per_server_service_dict[server_type] = int(service_time)
                 else:
                     the_task.per_server_services.append(str(None))
-                    #the_task.per_server_service_dict[server_type] = service_time  # Could add with service time "None"?
 
         #logging.info('%s :: %s' % (the_task.per_server_services, the_task.per_server_service_dict))
-        self.tasks.append(the_task)
+        dropped = (len(self.tasks) >= self.params['simulation']['max_queue_size'])
+        if (dropped):
+            logging.info('[%10ld] Problem with finding an empty queue slot! Task %d dropped' % (self.sim_time, task_num))
+        else:
+            self.tasks.append(the_task)
         self.stats['Tasks Generated'] += 1
 
         if (self.output_trace_file):
-            self.output_trace.write('%d,%s,%s\n' % (self.sim_time, task, ','.join(map(str, the_task.per_server_services))))
+            self.output_trace.write(self.sim_time, task, the_task.per_server_services)
 
                 
         if not task in self.stats['Avg Resp Time per Type']:
             self.stats['Avg Resp Time per Type'][task]    = 0
             self.stats['Avg Waiting Time per Type'][task] = 0
             self.stats['Tasks Serviced per Type'][task]   = 0
-            self.task_trace_files[task] = open(self.working_dir + '/' + self.basename + '.' + task + '.' + self.params['simulation']['sched_policy_module'].split('.')[-1] + '.trace', 'w')
-            
-            self.task_trace_files[task].write('%s\n\n' % (datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
-            self.task_trace_files[task].write("CONFIGURATION:\n%s\n" % (self.params))  #pprint.pprint(self.params))
-            self.task_trace_files[task].write('Time\tResponse time (avg)\n')
-            
-        return True
+            self.stats['Resp Time Sketch per Type'][task]    = self.new_sketch()
+            self.stats['Waiting Time Sketch per Type'][task] = self.new_sketch()
+            self.stats['Service Time Sketch per Type'][task] = self.new_sketch()
+            self.stats['Resp Time Batch Means per Type'][task] = BatchMeans(self.params['simulation'].get('ci_batches', 20))
+            if (self.event_trace_period):
+                self.task_trace_files[task] = self.open_event_trace('.' + task + '.' + self.params['simulation']['sched_policy_module'].split('.')[-1] + '.trace',
+                                                                    '%ld\t%.1f\n', [('time', '<i8'), ('avg_resp_time', '<f8')])
+
+        if (dropped):
+            self.stats['Tasks Dropped'] += 1
+            self.sched_policy.on_task_drop(self.sim_time, the_task)
+        else:
+            self.sched_policy.on_task_arrival(self.sim_time, the_task)
             
 
     def release_server(self, server):
         
         # Update statistics
-        task_type = server.task.type
+        task_type    = server.task.type
+        service_time = server.task.task_service_time
 
         resp_time = (self.sim_time - server.task.arrival_time)
-        wait_time = resp_time - server.task.task_service_time
         server.task.task_lifetime = resp_time
+
+        batch_done = self.account_task(server, task_type, resp_time, service_time)
+        if (self.warmup_records is not None):
+            self.warmup_records.append(self.sim_time, server.id, task_type, resp_time, service_time)
+            if (self.warmup.add(resp_time)):
+                self.end_warmup(self.warmup.cutoff)
+            elif (len(self.warmup_records) >= self.warmup_limit):
+                # Last check, over all the tasks serviced so far
+                self.end_warmup(self.warmup.cutoff if (self.warmup.detect()) else None)
+            # The precision is only checked once the detection ends, and then
+            # at once, on the batch means of the tasks after the warm-up
+            batch_done = (self.warmup_records is None)
+        if (batch_done and self.ci_target and self.ci_stopped_at is None):
+            self.check_precision()
+
+        self.stats['Busy Servers']                       -= 1
+        self.stats['Available Servers'][server.type]     += 1
+
+        if (self.event_trace_period and server.task.id % self.event_trace_period == 0):
+            avg_resp_time = self.stats['Avg Resp Time'] / self.stats['Tasks Serviced']
+            self.task_trace_file.write((self.sim_time, avg_resp_time, server.task.id, server.task.type, server.id, server.type, server.curr_job_start_time, server.curr_service_time, server.curr_job_end_time))
+
+            avg_resp_time = self.stats['Avg Resp Time per Type'][task_type] / self.stats['Tasks Serviced per Type'][task_type]
+            self.task_trace_files[task_type].write((self.sim_time, avg_resp_time))
+        
+        self.sched_policy.on_task_complete(self.sim_time, server.task, server)
+        self.sched_policy.remove_task_from_server(self.sim_time, server)
+
+        server.reset()
+        server.last_stopped_at = self.sim_time
         
+        
+    def account_task(self, server, task_type, resp_time, service_time):
+
+        # Add a completed task to the response, waiting and service time
+        # statistics; returns True if it completes a batch of the response
+        # time batch means
+        wait_time = resp_time - service_time
+
         if not task_type in server.stats['Avg Resp Time per Type']:
             server.stats['Avg Resp Time per Type'][task_type]  = 0
             server.stats['Tasks Serviced per Type'][task_type] = 0
-            server.stats['Service Time per Type'][task_type]   = []
-            server.stats['Lifetime per Type'][task_type]       = []
+            server.stats['Service Time per Type'][task_type]   = StreamingStats()
+            server.stats['Lifetime per Type'][task_type]       = StreamingStats()
+            server.stats['Waiting Time per Type'][task_type]   = StreamingStats()
 
         server.stats['Avg Resp Time']                      += resp_time
         server.stats['Avg Resp Time per Type'][task_type]  += resp_time
         server.stats['Tasks Serviced']                     += 1
         server.stats['Tasks Serviced per Type'][task_type] += 1
-        server.stats['Service Time per Type'][task_type].append(server.task.task_service_time)
-        server.stats['Lifetime per Type'][task_type].append(server.task.task_lifetime)
+        server.stats['Service Time per Type'][task_type].add(service_time)
+        server.stats['Lifetime per Type'][task_type].add(resp_time)
+        server.stats['Waiting Time per Type'][task_type].add(wait_time)
+        server.stats['Resp Time Sketch'].add(resp_time)
+        server.stats['Waiting Time Sketch'].add(wait_time)
+        server.stats['Service Time Sketch'].add(service_time)
+        self.stats['Resp Time Sketch per Type'][task_type].add(resp_time)
+        self.stats['Waiting Time Sketch per Type'][task_type].add(wait_time)
+        self.stats['Service Time Sketch per Type'][task_type].add(service_time)
+        self.stats['Resp Time Batch Means per Type'][task_type].add(resp_time)
         self.stats['Avg Resp Time']                        += resp_time
         self.stats['Avg Resp Time per Type'][task_type]    += resp_time
         self.stats['Avg Waiting Time']                     += wait_time
@@ -459,100 +2341,276 @@ class STOMP:
         #                 (SIM_TIME-server[SERVER_ID].cust.arrival_time)) / int_num_tasks_serviced
         #int_serv_time = (int_serv_time*(int_num_tasks_serviced-1)+server[SERVER_ID].cust.task_service_time)/int_num_tasks_serviced
 
-                
         self.stats['Tasks Serviced']                     += 1
         self.stats['Tasks Serviced per Type'][task_type] += 1
-        self.stats['Busy Servers']                       -= 1
-        self.stats['Available Servers'][server.type]     += 1
-        self.next_serv_end_time                           = float("inf")
-        self.next_serv_end                                = None
+        return self.stats['Resp Time Batch Means'].add(resp_time)
 
-        avg_resp_time = self.stats['Avg Resp Time'] / self.stats['Tasks Serviced']
-        self.task_trace_file.write('%ld,%.1f,%d,%s,%d,%s,%d,%d,%d\n' % (self.sim_time, avg_resp_time, server.task.id, server.task.type, server.id, server.type, server.curr_job_start_time, server.curr_service_time, server.curr_job_end_time))
 
-        avg_resp_time = self.stats['Avg Resp Time per Type'][task_type] / self.stats['Tasks Serviced per Type'][task_type]
-        self.task_trace_files[task_type].write('%ld\t%.1f\n' % (self.sim_time, avg_resp_time))
-        
-        self.sched_policy.remove_task_from_server(self.sim_time, server)
+    def reset_task_stats(self):
 
-        server.reset()
-        server.last_stopped_at = self.sim_time
-        
-        # Determine next server end time
+        # Drop the response, waiting and service time statistics (see
+        # account_task)
         for server in self.servers:
-            if (server.busy and server.curr_job_end_time <= self.next_serv_end_time):
-                self.next_serv_end_time  = server.curr_job_end_time
-                self.next_serv_end       = server
-        
-        
+            server.stats['Tasks Serviced']          = 0
+            server.stats['Tasks Serviced per Type'] = {}
+            server.stats['Avg Resp Time']           = 0
+            server.stats['Avg Resp Time per Type']  = {}
+            server.stats['Service Time per Type']   = {}
+            server.stats['Lifetime per Type']       = {}
+            server.stats['Waiting Time per Type']   = {}
+            server.stats['Resp Time Sketch']        = self.new_sketch()
+            server.stats['Waiting Time Sketch']     = self.new_sketch()
+            server.stats['Service Time Sketch']     = self.new_sketch()
+        self.stats['Tasks Serviced']        = 0
+        self.stats['Avg Resp Time']         = 0
+        self.stats['Avg Waiting Time']      = 0
+        self.stats['Resp Time Batch Means'] = BatchMeans(self.params['simulation'].get('ci_batches', 20))
+        for task in self.stats['Avg Resp Time per Type']:
+            self.stats['Tasks Serviced per Type'][task]        = 0
+            self.stats['Avg Resp Time per Type'][task]         = 0
+            self.stats['Avg Waiting Time per Type'][task]      = 0
+            self.stats['Resp Time Sketch per Type'][task]      = self.new_sketch()
+            self.stats['Waiting Time Sketch per Type'][task]   = self.new_sketch()
+            self.stats['Service Time Sketch per Type'][task]   = self.new_sketch()
+            self.stats['Resp Time Batch Means per Type'][task] = BatchMeans(self.params['simulation'].get('ci_batches', 20))
+
+
+    def end_warmup(self, cutoff):
+
+        # Stop the warm-up detection; if the warm-up was detected ('cutoff'
+        # tasks), recompute the statistics without the warm-up tasks
+        records             = self.warmup_records
+        self.warmup_records = None
+        self.warmup_results['Detected']        = (cutoff is not None)
+        self.warmup_results['Detection Tasks'] = len(records)
+        self.warmup_results['Detection Time']  = self.sim_time
+        if (cutoff):
+            self.warmup_results['Deleted Tasks'] = cutoff
+            self.warmup_results['Cut-off Time']  = records.times[cutoff - 1]
+            self.reset_task_stats()
+            for (time, server_id, task_type, resp_time, service_time) in records.records(cutoff):
+                self.account_task(self.servers[server_id], task_type, resp_time, service_time)
+        if (cutoff is None):
+            logging.info('[%10ld] Warm-up period not detected after %d tasks serviced; no tasks deleted' % (self.sim_time, len(records)))
+        else:
+            logging.info('[%10ld] Warm-up period detected after %d tasks serviced: %d tasks (until time %d) deleted' % (self.sim_time, len(records), cutoff,
+                                                                                                                     self.warmup_results['Cut-off Time']))
+
+
+    def check_precision(self):
+
+        # Stop generating tasks once the relative half width of the confidence
+        # interval of the response time (and, if 'ci_per_task_type', of each
+        # task type's) is within 'ci_target'
+        if (self.stats['Tasks Serviced'] < self.params['simulation'].get('ci_min_tasks', 1000)):
+            return
+        estimators = [self.stats['Resp Time Batch Means']]
+        if (self.params['simulation'].get('ci_per_task_type', False)):
+            estimators += list(self.stats['Resp Time Batch Means per Type'].values())
+        for batch_means in estimators:
+            interval = batch_means.interval(self.params['simulation'].get('ci_confidence', 0.95))
+            if (interval is None or interval[0] <= 0 or interval[1] / interval[0] > self.ci_target):
+                return
+        self.ci_stopped_at = self.stats['Tasks Serviced']
+        self.max_tasks     = self.stats['Tasks Generated']
+        logging.info('[%10ld] Confidence interval target reached after %d tasks serviced; no more tasks generated' % (self.sim_time, self.ci_stopped_at))
+
+
+    def compute_results(self):
+
+        # Collect every simulation statistic (as printed by print_stats) into
+        # a nested structure of plain Python values, suitable for JSON output
+        results = OrderedDict()
+        results['Scheduling Policy']     = self.params['simulation']['sched_policy_module'].split('.')[-1]
+        results['Arrival Trace']         = self.arrival_trace
+        results['Input Trace']           = self.input_trace_file
+        results['Total Simulation Time'] = self.sim_time
+        results['Tasks Serviced']        = self.stats['Tasks Serviced']
+        results['Tasks Generated']       = self.stats['Tasks Generated']
+        results['Tasks Dropped']         = self.stats['Tasks Dropped']
+
+        tasks_serviced = self.stats['Tasks Serviced']
+        results['Avg Resp Time']    = (self.stats['Avg Resp Time'] / tasks_serviced) if (tasks_serviced > 0) else 0.0
+        results['Avg Waiting Time'] = (self.stats['Avg Waiting Time'] / tasks_serviced) if (tasks_serviced > 0) else 0.0
+        results['Task Types'] = OrderedDict()
+        for task in self.stats['Avg Resp Time per Type']:
+            count = self.stats['Tasks Serviced per Type'][task]
+            results['Task Types'][task] = OrderedDict([
+                ('Tasks Serviced',   count),
+                ('Avg Resp Time',    (self.stats['Avg Resp Time per Type'][task] / count) if (count > 0) else 0.0),
+                ('Avg Waiting Time', (self.stats['Avg Waiting Time per Type'][task] / count) if (count > 0) else 0.0)])
+
+        total_time = int(numpy.sum(self.stats['Queue Size Histogram']))
+        results['Servers'] = []
+        for server in self.servers:
+            count   = server.stats['Tasks Serviced']
+            entry   = OrderedDict()
+            entry['Id']             = server.id
+            entry['Type']           = server.type
+            entry['Tasks Serviced'] = count
+            entry['Avg Resp Time']  = (server.stats['Avg Resp Time'] / count) if (count > 0) else 0.0
+            entry['Busy Time']      = server.busy_time
+            entry['Utilization']    = float(numpy.around(100 * server.busy_time / total_time, decimals=2))
+            entry['Task Types']     = OrderedDict()
+            for task in server.stats['Avg Resp Time per Type']:
+                task_count = server.stats['Tasks Serviced per Type'][task]
+                entry['Task Types'][task] = OrderedDict([
+                    ('Tasks Serviced', task_count),
+                    ('Avg Resp Time',  (server.stats['Avg Resp Time per Type'][task] / task_count) if (task_count > 0) else 0.0),
+                    ('Service Time',   self.service_time_results(server.stats['Service Time per Type'][task], task, server.type)),
+                    ('Waiting Time',   self.waiting_time_results(server.stats['Waiting Time per Type'][task]))])
+            results['Servers'].append(entry)
+
+        results['Server Types'] = OrderedDict()
+        for server_type in self.params['simulation']['servers']:
+            results['Server Types'][server_type] = OrderedDict()
+            for task_type in self.params['simulation']['tasks']:
+                service_stats = StreamingStats.merged([server.stats['Service Time per Type'][task_type] for server in self.servers
+                                                       if (server.type == server_type and task_type in server.stats['Service Time per Type'])])
+                wait_stats    = StreamingStats.merged([server.stats['Waiting Time per Type'][task_type] for server in self.servers
+                                                       if (server.type == server_type and task_type in server.stats['Waiting Time per Type'])])
+                if (service_stats.count > 0):
+                    results['Server Types'][server_type][task_type] = OrderedDict([
+                        ('Service Time', self.service_time_results(service_stats, task_type, server_type)),
+                        ('Waiting Time', self.waiting_time_results(wait_stats))])
+
+        # Queue size histogram: time spent in each bin, and its percentage
+        # (the cumulative percentage adds up the rounded percentages)
+        histogram = OrderedDict()
+        histogram['Bin Size']       = self.bin_size
+        histogram['Max Queue Size'] = self.stats['Max Queue Size']
+        histogram['Bins']           = []
+        histogram['Time']           = []
+        histogram['Pct Time']       = []
+        histogram['Cum Time']       = []
+        histogram['Cum Pct']        = []
+        idx = 0;
+        bin = 0;
+        c_time = 0
+        c_pct_time = 0
+        for count in self.stats['Queue Size Histogram']:
+            sz = numpy.around(100 * count / total_time, decimals=2)
+            c_time += count
+            c_pct_time += sz
+            histogram['Bins'].append(str(bin))
+            histogram['Time'].append(int(count))
+            histogram['Pct Time'].append(float(sz))
+            histogram['Cum Time'].append(int(c_time))
+            histogram['Cum Pct'].append(float(c_pct_time))
+            idx += 1
+            if (idx < (self.num_bins - 1)):
+                bin += self.bin_size
+            else:
+                bin = ">" + str(bin)
+        results['Queue Size Histogram'] = histogram
+
+        results['Quantiles']            = self.compute_quantiles()
+        results['Confidence Intervals'] = self.compute_intervals()
+        results['Warm-up']              = self.warmup_results
+        results['Policy Stats']         = self.sched_policy.final_stats(self.sim_time)
+        results['Profile']              = self.profile.results() if (self.profile) else None
+        return results
+
+
+    def compute_intervals(self):
+
+        # Confidence intervals of the average response time (global and per
+        # task type) achieved by the simulation, and how it was stopped
+        confidence = self.params['simulation'].get('ci_confidence', 0.95)
+        intervals  = OrderedDict()
+        intervals['Confidence']            = confidence
+        intervals['Target Rel Half Width'] = self.ci_target
+        if (self.ci_target is None):
+            intervals['Stopped By'] = 'max tasks'
+        elif (self.ci_stopped_at is None):
+            intervals['Stopped By'] = 'max tasks (target not reached)'
+        else:
+            intervals['Stopped By'] = 'target'
+        intervals['Stopped At'] = self.ci_stopped_at
+        intervals['global']     = self.interval_results(self.stats['Resp Time Batch Means'], confidence)
+        intervals['Task Types'] = OrderedDict([(task, self.interval_results(batch_means, confidence))
+                                               for (task, batch_means) in self.stats['Resp Time Batch Means per Type'].items()])
+        return intervals
+
+
+    @staticmethod
+    def interval_results(batch_means, confidence):
+
+        interval = batch_means.interval(confidence)
+        (mean, half_width) = interval if (interval) else (None, None)
+        return OrderedDict([('Mean',           mean),
+                            ('Half Width',     half_width),
+                            ('Rel Half Width', (half_width / mean) if (interval and mean > 0) else None),
+                            ('Batches',        len(batch_means.means)),
+                            ('Batch Size',     batch_means.batch_size)])
+
+
+    def service_time_results(self, service_stats, task_type, server_type):
+
+        return OrderedDict([('Avg',           service_stats.mean()),
+                            ('StDev',         service_stats.stdev()),
+                            ('Min',           service_stats.min),
+                            ('Max',           service_stats.max),
+                            ('Count',         service_stats.count),
+                            ('Config Mean',   self.params['simulation']['tasks'][task_type]['mean_service_time'][server_type]),
+                            ('Config StDev',  self.params['simulation']['tasks'][task_type]['stdev_service_time'][server_type])])
+
+
+    def waiting_time_results(self, wait_stats):
+
+        return OrderedDict([('Avg',   wait_stats.mean()),
+                            ('StDev', wait_stats.stdev()),
+                            ('Min',   wait_stats.min),
+                            ('Max',   wait_stats.max),
+                            ('Count', wait_stats.count)])
+
+
     def print_stats(self):
-        
-        self.stats['Avg Resp Time']    = self.stats['Avg Resp Time'] / self.stats['Tasks Serviced']
-        self.stats['Avg Waiting Time'] = self.stats['Avg Waiting Time'] / self.stats['Tasks Serviced']
-        
-        # Final histogram update
-        queue_size  = len(self.tasks)
-        bin         = int(queue_size / self.bin_size)        
-        time_period = self.sim_time - self.last_size_change_time
-        if (bin >= len(self.stats['Queue Size Histogram'])):
-            bin = len(self.stats['Queue Size Histogram']) - 1
-        self.stats['Queue Size Histogram'][bin] += time_period
-        self.last_size_change_time = self.sim_time
 
-        # Normalize histogram
-        total_time = numpy.sum(self.stats['Queue Size Histogram'])
-        pct_qsize = numpy.around(100 * self.stats['Queue Size Histogram'] / total_time, decimals=2)
-        
-        
+        results = self.results
+
         ##### DUMP STATISTICS TO STDOUT #####
         
         logging.info('\n==================== Simulation Statistics ====================')
-        logging.info(' Scheduling policy:     %s'  % self.params['simulation']['sched_policy_module'].split('.')[-1])
-        logging.info(' Arrival trace:         %s'  % self.arrival_trace)
-        logging.info(' Input trace:           %s'  % (self.input_trace_file if self.input_trace_file else 'none (random generation)'))
-        logging.info(' Total simulation time: %ld' % self.sim_time)
-        logging.info(' Tasks serviced:        %ld' % self.stats['Tasks Serviced'])
+        logging.info(' Scheduling policy:     %s'  % results['Scheduling Policy'])
+        logging.info(' Arrival trace:         %s'  % results['Arrival Trace'])
+        logging.info(' Input trace:           %s'  % (results['Input Trace'] if results['Input Trace'] else 'none (random generation)'))
+        logging.info(' Total simulation time: %ld' % results['Total Simulation Time'])
+        logging.info(' Tasks serviced:        %ld' % results['Tasks Serviced'])
+        if (results['Tasks Dropped'] > 0):
+            logging.info(' Tasks dropped:         %ld (full queue)' % results['Tasks Dropped'])
+        warmup = results['Warm-up']
+        if (warmup['Method'] != 'off'):
+            logging.info(' %-22s %s' % ('Warm-up (%s):' % (warmup['Method']), ('%d tasks deleted (until time %d)' % (warmup['Deleted Tasks'], warmup['Cut-off Time']))
+                                                                             if (warmup['Detected']) else 'not detected, no tasks deleted'))
         logging.info('')
         
         logging.info(' Response time (avg):')
-        logging.info('   %12s : %8.4f over %8d tasks' % ("global", self.stats['Avg Resp Time'], self.stats['Tasks Serviced']))
-        for task in self.stats['Avg Resp Time per Type']:
-            if (self.stats['Tasks Serviced per Type'][task] > 0):
-                logging.info('   %12s : %8.4f over %8d tasks' % (task, self.stats['Avg Resp Time per Type'][task]/self.stats['Tasks Serviced per Type'][task], self.stats['Tasks Serviced per Type'][task]))
-            else:
-                logging.info('   %12s : %8.4f over %8d tasks' % (task, 0.0, 0))
+        logging.info('   %12s : %8.4f over %8d tasks' % ("global", results['Avg Resp Time'], results['Tasks Serviced']))
+        for (task, task_results) in results['Task Types'].items():
+            logging.info('   %12s : %8.4f over %8d tasks' % (task, task_results['Avg Resp Time'], task_results['Tasks Serviced']))
         logging.info('')
 
         logging.info(' Waiting time (avg):')
-        logging.info('   %12s : %8.8f over %8d tasks' % ("global", self.stats['Avg Waiting Time'], self.stats['Tasks Serviced']))
-        for task in self.stats['Avg Waiting Time per Type']:
-            if (self.stats['Tasks Serviced per Type'][task] > 0):
-                logging.info('   %12s : %8.4f over %8d tasks' % (task, self.stats['Avg Waiting Time per Type'][task]/self.stats['Tasks Serviced per Type'][task], self.stats['Tasks Serviced per Type'][task]))
-            else:
-                logging.info('   %12s : %8.4f over %8d tasks' % (task, 0.0, 0))
+        logging.info('   %12s : %8.8f over %8d tasks' % ("global", results['Avg Waiting Time'], results['Tasks Serviced']))
+        for (task, task_results) in results['Task Types'].items():
+            logging.info('   %12s : %8.4f over %8d tasks' % (task, task_results['Avg Waiting Time'], task_results['Tasks Serviced']))
         logging.info('')
 
         logging.info(' Server Response time (avg):')
-        for server in self.servers:
-            if (server.stats['Tasks Serviced'] > 0):
-                server.stats['Avg Resp Time'] = server.stats['Avg Resp Time'] / server.stats['Tasks Serviced']
-                logging.info('   Server %3d : %12s : %8.4f over %8d tasks' % (server.id, "global", server.stats['Avg Resp Time'], server.stats['Tasks Serviced']))
-            else:
-                logging.info('   Server %3d : %12s : %8.4f over %8d tasks' % (server.id, "global", 0.0, 0))
+        for server in results['Servers']:
+            logging.info('   Server %3d : %12s : %8.4f over %8d tasks' % (server['Id'], "global", server['Avg Resp Time'], server['Tasks Serviced']))
 
         logging.info('')
-        for server in self.servers:
-            for task in server.stats['Avg Resp Time per Type']:
-                if (server.stats['Tasks Serviced per Type'][task] > 0):
-                    logging.info('   Server %3d : %12s : %8.4f over %8d tasks' % (server.id, task, server.stats['Avg Resp Time per Type'][task]/server.stats['Tasks Serviced per Type'][task], server.stats['Tasks Serviced per Type'][task]))
-                else:
-                    logging.info('   Server %3d : %12s : %8.4f over %8d tasks' % (server.id, task, 0.0, 0))
+        for server in results['Servers']:
+            for (task, task_results) in server['Task Types'].items():
+                logging.info('   Server %3d : %12s : %8.4f over %8d tasks' % (server['Id'], task, task_results['Avg Resp Time'], task_results['Tasks Serviced']))
         logging.info('')
 
         logging.info(' Busy time and Utilization:')
         logging.info('                %12s  : %10s  %5s' % ("Server Type", "Busy Time", "Util."))
-        for server in self.servers:
-            logging.info('   Server %3d ( %12s ): %10ld  %5.4f' % (server.id, server.type, server.busy_time, numpy.around(100 * server.busy_time / total_time, decimals=2)))
+        for server in results['Servers']:
+            logging.info('   Server %3d ( %12s ): %10ld  %5.4f' % (server['Id'], server['Type'], server['Busy Time'], server['Utilization']))
         logging.info('')
 
         #logging.info(' Utilization:')
@@ -560,152 +2618,189 @@ class STOMP:
         #    logging.info('   Server %3d ( %12s ): %.1f' % (server.id, server.type, 100*server.busy_time/self.sim_time))
         #logging.info('')
 
+        histogram = results['Queue Size Histogram']
         logging.info(' Histograms:')
         #logging.info('   Queue size Pct time (bin size=%d): %s' % (self.bin_size, ', '.join(map(str,self.stats['Queue Size Histogram']))))
-        logging.info('   Queue size Pct time: bin_size, %d , max_In_Queue, %d , %s' % (self.bin_size, self.stats['Max Queue Size'],', '.join(map(str,self.stats['Queue Size Histogram']))))
-        idx = 0;
-        bin = 0;
+        logging.info('   Queue size Pct time: bin_size, %d , max_In_Queue, %d , %s' % (histogram['Bin Size'], histogram['Max Queue Size'], ', '.join(map(str,histogram['Time']))))
         logging.info('         %4s  %10s  %8s  %10s  %8s' % ("Bin", "Tot Time", "Pct Time", "Cum Time", "Cum Pct"))
-        c_time = 0
-        c_pct_time = 0
-        for count in self.stats['Queue Size Histogram']:
-            sz = numpy.around(100 * count / total_time, decimals=2)
-            c_time += count
-            c_pct_time += sz
-            sbin = str(bin)
+        for (sbin, count, sz, c_time, c_pct_time) in zip(histogram['Bins'], histogram['Time'], histogram['Pct Time'], histogram['Cum Time'], histogram['Cum Pct']):
             logging.info('         %4s  %10d    %6.2f  %10d    %6.2f' % (sbin, count, sz, c_time, c_pct_time))
-            idx += 1
-            if (idx < (self.num_bins - 1)):
-                bin += self.bin_size
-            else:
-                bin = ">" + str(bin)
         logging.info('')
 
-        server = self.sched_policy.output_final_stats(self.sim_time)
+        self.sched_policy.output_final_stats(self.sim_time)
 
         logging.info(' Per Server Task Service Times Analysis:')
-        for server in self.servers:
-            for task in server.stats['Avg Resp Time per Type']:
-                anum = float(0.0)
-                for rt in server.stats['Service Time per Type'][task]: #.append(resp_time)
-                    anum += rt
-                #avg = numpy.around(100 * anum / len(server.stats['Service Time per Type'][task]), decimals=2)
-                avg = anum / len(server.stats['Service Time per Type'][task])
-                num = float(0.0)
-                for rt in server.stats['Service Time per Type'][task]: #.append(resp_time)
-                    num += (rt - avg)*(rt - avg)
-                    #logging.info('STDEV_CMP,Server,%d,task,%s,%d,%d' % (server.id, task, avg, rt))
-                stdv = numpy.sqrt(num / len(server.stats['Service Time per Type'][task]))
-                #logging.info('   Server %3d : %12s : Avg %8.2f vs %8.2f : StDev %8.2f vs %8.2f : over %8d tasks' % (server.id, task,
-                logging.info('   Server %3d : %12s : Avg %8.2f vs %8.3f : StDev %8.2f vs %8.3f : over %8d tasks' % (server.id, task,
-                                                                                                                    avg,  self.params['simulation']['tasks'][task]['mean_service_time'][server.type],
-                                                                                                                    #stdv, (self.params['simulation']['tasks'][task]['stdev_service_time'][server.type] * self.params['simulation']['tasks'][task]['mean_service_time'][server.type]),
-                                                                                                                    stdv, self.params['simulation']['tasks'][task]['stdev_service_time'][server.type],
-                                                                                                                    len(server.stats['Service Time per Type'][task])))
+        for server in results['Servers']:
+            for (task, task_results) in server['Task Types'].items():
+                service_stats = task_results['Service Time']
+                logging.info('   Server %3d : %12s : Avg %8.2f vs %8.3f : StDev %8.2f vs %8.3f : over %8d tasks' % (server['Id'], task,
+                                                                                                                    service_stats['Avg'],   service_stats['Config Mean'],
+                                                                                                                    service_stats['StDev'], service_stats['Config StDev'],
+                                                                                                                    service_stats['Count']))
         logging.info('')
         logging.info(' Server Type Task Type Service Times Analysis:')
-        for server_type in self.params['simulation']['servers']:
-            for task_type in self.params['simulation']['tasks']:
-                anum = float(0.0)
-                aden = 0
-                avg = 0
-                stdev = 0
-                for server in self.servers:
-                    if (server.type == server_type):
-                        if (task_type in server.stats['Service Time per Type'].keys()):
-                            for rt in server.stats['Service Time per Type'][task_type]:
-                                anum += rt
-                                aden += 1
-                if (aden > 0):
-                    avg = anum / float(aden)
-                    snum = float(0.0)
-                    sden = 0
-                    for server in self.servers:
-                        if (server.type == server_type):
-                            if (task_type in server.stats['Service Time per Type'].keys()):
-                                for rt in server.stats['Service Time per Type'][task_type]:
-                                    snum += (rt - avg)*(rt - avg)
-                                    sden += 1
-                    stdv = numpy.sqrt(snum / float(sden))
-                    logging.info('   %12s : %12s : Avg %8.2f vs %8.3f : StDev %8.2f vs %8.3f : over %8d tasks' % (server_type, task_type,
-                                                                                                                  avg,  self.params['simulation']['tasks'][task_type]['mean_service_time'][server_type],
-                                                                                                                  stdv, self.params['simulation']['tasks'][task_type]['stdev_service_time'][server_type],
-                                                                                                                  sden))
+        for (server_type, server_type_results) in results['Server Types'].items():
+            for (task_type, task_results) in server_type_results.items():
+                service_stats = task_results['Service Time']
+                logging.info('   %12s : %12s : Avg %8.2f vs %8.3f : StDev %8.2f vs %8.3f : over %8d tasks' % (server_type, task_type,
+                                                                                                              service_stats['Avg'],   service_stats['Config Mean'],
+                                                                                                              service_stats['StDev'], service_stats['Config StDev'],
+                                                                                                              service_stats['Count']))
 
             #logging.info('')
 
         logging.info('')
         logging.info(' Per Server Task Wait Times (in-Queue) Analysis:')
-        for server in self.servers:
-            #for task_type in self.params['simulation']['tasks']:
-            for task in server.stats['Avg Resp Time per Type']:
-                anum = float(0.0)
-                aden = 0
-                for st,lt in zip(server.stats['Service Time per Type'][task], server.stats['Lifetime per Type'][task]):
-                    wt = lt - st
-                    anum += wt
-                    #logging.info('%s %s %d %d %d' % (server.type, task, lt, st, wt))
-                avg = anum / len(server.stats['Service Time per Type'][task])
-                num = float(0.0)
-                for st,lt in zip(server.stats['Service Time per Type'][task], server.stats['Lifetime per Type'][task]):
-                    wt = float(lt - st)
-                    num += (wt - avg)*(wt - avg)
-                stdv = numpy.sqrt(num / len(server.stats['Service Time per Type'][task]))
-                logging.info('   Server %3d %12s : %12s : Avg %8.2f : StDev %8.2f : over %8d tasks' % (server.id, server.type, task, avg, stdv, len(server.stats['Service Time per Type'][task])))
+        for server in results['Servers']:
+            for (task, task_results) in server['Task Types'].items():
+                wait_stats = task_results['Waiting Time']
+                logging.info('   Server %3d %12s : %12s : Avg %8.2f : StDev %8.2f : over %8d tasks' % (server['Id'], server['Type'], task, wait_stats['Avg'], wait_stats['StDev'], wait_stats['Count']))
                                                                                                                     
         logging.info('')
         logging.info(' Server Type Task Type Wait Times (in-Queue) Analysis:')
-        for server_type in self.params['simulation']['servers']:
-            for task_type in self.params['simulation']['tasks']:
-                anum = float(0.0)
-                aden = 0
-                avg = 0
-                stdev = 0
-                for server in self.servers:
-                    if (server.type == server_type):
-                        if (task_type in server.stats['Service Time per Type'].keys()):
-                            for st,lt in zip(server.stats['Service Time per Type'][task_type], server.stats['Lifetime per Type'][task_type]):
-                                wt = lt - st
-                                anum += wt
-                                aden += 1
-                if (aden > 0):
-                    avg = anum / float(aden)
-                    snum = float(0.0)
-                    sden = 0
-                    for server in self.servers:
-                        if (server.type == server_type):
-                            if (task_type in server.stats['Service Time per Type'].keys()):
-                                for st,lt in zip(server.stats['Service Time per Type'][task_type], server.stats['Lifetime per Type'][task_type]):
-                                    wt = float(lt - st)
-                                    snum += (wt - avg)*(wt - avg)
-                                    sden += 1
-                    stdv = numpy.sqrt(snum / float(sden))
-                    logging.info('   %12s : %12s : Avg %8.2f : StDev %8.2f : over %8d tasks' % (server_type, task_type, avg, stdv, sden))
+        for (server_type, server_type_results) in results['Server Types'].items():
+            for (task_type, task_results) in server_type_results.items():
+                wait_stats = task_results['Waiting Time']
+                logging.info('   %12s : %12s : Avg %8.2f : StDev %8.2f : over %8d tasks' % (server_type, task_type, wait_stats['Avg'], wait_stats['StDev'], wait_stats['Count']))
+
+        for (metric, title) in [('Resp Time', 'Response'), ('Waiting Time', 'Waiting'), ('Service Time', 'Service')]:
+            logging.info('')
+            logging.info(' %s Time Quantiles (relative error %.2f%%):' % (title, 100 * self.params['general'].get('quantile_relative_error', 0.01)))
+            for group in ['global', 'task type', 'server type', 'server']:
+                for (name, quantiles) in results['Quantiles'][metric][group].items():
+                    if (quantiles['count'] > 0):
+                        labels = [self.quantile_label(q) for q in self.params['general'].get('quantiles', [0.5, 0.95, 0.99, 0.999])]
+                        logging.info('   %12s : %12s : %s : over %8d tasks' % (group, name, ' : '.join(['%s %10.2f' % (label, quantiles[label]) for label in labels]), quantiles['count']))
+
+        intervals = results['Confidence Intervals']
+        logging.info('')
+        logging.info(' Response time (avg) %g%% confidence intervals (batch means), stopped by %s%s:' % (100 * intervals['Confidence'], intervals['Stopped By'],
+                     (' after %d tasks' % (intervals['Stopped At'])) if (intervals['Stopped At'] is not None) else ''))
+        for (name, interval) in [('global', intervals['global'])] + list(intervals['Task Types'].items()):
+            if (interval['Mean'] is None):
+                logging.info('   %12s : too few tasks (%d batches of %d)' % (name, interval['Batches'], interval['Batch Size']))
+            else:
+                logging.info('   %12s : %8.4f +/- %8.4f (%6.2f%%) : %3d batches of %8d tasks' % (name, interval['Mean'], interval['Half Width'],
+                                                                                              100 * interval['Rel Half Width'], interval['Batches'], interval['Batch Size']))
+
+        profile = results['Profile']
+        if (profile is not None):
+            logging.info('')
+            logging.info(' Profile: %.3f secs, %d events (%.0f events/sec)' % (profile['Run Time'], profile['Events'], profile['Events per Sec'] or 0.0))
+            for (name, count) in profile['Events per Type'].items():
+                logging.info('   %15s : %8d events' % (name, count))
+            for (phase, phase_stats) in profile['Phases'].items():
+                logging.info('   %15s : %8.3f secs (%6.2f%%)' % (phase, phase_stats['Time'], phase_stats['Pct Time']))
+            for (name, calls) in profile['Policy Calls'].items():
+                if (calls['Calls'] == 0):
+                    continue
+                logging.info('   %23s : %8d calls : %8d None : %8d assigned : %8.3f secs (%8.2f usecs/call) : queue avg %8.2f max %6d' % (name,
+                             calls['Calls'], calls['None Returns'], calls['Assignments'], calls['Time'], 1e6 * calls['Avg Time'],
+                             calls['Avg Queue Length'], calls['Max Queue Length']))
 
         logging.info('')
         logging.info('')
 
 
+    @staticmethod
+    def quantile_label(q):
+
+        # E.g. 0.5 -> 'p50', 0.999 -> 'p99.9'
+        return 'p%s' % ('%.4f' % (100 * q)).rstrip('0').rstrip('.')
+
+
+    def compute_quantiles(self):
+
+        # Merge the per-server and per-task type sketches; for each metric and
+        # group ('global', 'task type', 'server type', 'server'), maps each name
+        # (server ids as strings, as in JSON) to its quantiles (labeled as in
+        # quantile_label) and count
+        quantiles = OrderedDict()
+        for metric in ['Resp Time', 'Waiting Time', 'Service Time']:
+            sketches = OrderedDict()
+            sketches['global']      = {'global': self.merge_sketches(self.stats[metric + ' Sketch per Type'].values())}
+            sketches['task type']   = self.stats[metric + ' Sketch per Type']
+            sketches['server type'] = OrderedDict([(server_type, self.merge_sketches([server.stats[metric + ' Sketch'] for server in self.servers if (server.type == server_type)]))
+                                                   for server_type in self.params['simulation']['servers']])
+            sketches['server']      = OrderedDict([(str(server.id), server.stats[metric + ' Sketch']) for server in self.servers])
+            quantiles[metric] = OrderedDict()
+            for group in sketches:
+                quantiles[metric][group] = OrderedDict()
+                for (name, sketch) in sketches[group].items():
+                    quantiles[metric][group][name] = OrderedDict([(self.quantile_label(q), sketch.quantile(q)) for q in self.params['general'].get('quantiles', [0.5, 0.95, 0.99, 0.999])])
+                    quantiles[metric][group][name]['count'] = sketch.count
+        return quantiles
+
+
+    def merge_sketches(self, sketches):
+
+        return QuantileSketch.merged(sketches, self.params['general'].get('quantile_relative_error', 0.01), self.params['general'].get('quantile_max_bins', 2048))
+
+
         
+    def start_task(self, server):
+
+        # Schedules the completion of the task just assigned to 'server' and
+        # updates the statistics
+        self.events.push(server.curr_job_end_time, STOMP.E_SERVER_FINISHES, server)
+
+        self.stats['Running Tasks']                  += 1
+        self.stats['Busy Servers']                   += 1
+        self.stats['Available Servers'][server.type] -= 1
+
+        if (self.event_trace_period and server.task.id % self.event_trace_period == 0):
+            self.task_assign_trace.write((self.sim_time, server.task.id, server.task.type, server.id, server.type, server.curr_job_start_time, server.curr_service_time, server.curr_job_end_time))
+
+        # Update histogram
+        queue_size  = len(self.tasks) + 1  # +1 because the task was already removed
+        if (self.stats['Max Queue Size'] < queue_size):
+            self.stats['Max Queue Size'] = queue_size
+        bin         = int(queue_size / self.bin_size)        
+        time_period = self.sim_time - self.last_size_change_time
+        if (bin >= len(self.stats['Queue Size Histogram'])):
+            bin = len(self.stats['Queue Size Histogram']) - 1
+        self.stats['Queue Size Histogram'][bin] += time_period
+        self.last_size_change_time = self.sim_time
+
+        if (self.debug_trace.active and self.debug_trace.task(server.task.id)):
+            logging.debug('[%10ld] Task %d scheduled in server %d ( %s ) until %d' % (self.sim_time, server.task.id, server.id, server.type, server.curr_job_end_time))
+            logging.debug('               Running tasks: %d, busy servers: %d, waiting tasks: %d' % (self.stats['Running Tasks'], self.stats['Busy Servers'], len(self.tasks)))
+            logging.debug('               Avail: %s' % (', '.join(['%s: %s' % (key, value) for (key, value) in self.stats['Available Servers'].items()])))
+
+
     def run(self):
 
         logging.info('\nRunning STOMP simulation...')
         
         # This is because some scheduling policies may need to know about
         # the existent servers in order to make scheduling decisions
+        # Event calendar: a task is forced to arrive now. Power management
+        # events are not yet supported, so none is scheduled. The policy may
+        # schedule its own timers (from init on).
+        self.events                  = EventQueue()
+        self.sched_policy.sampler = self.sampler
+        self.sched_policy.events      = self.events
+        self.sched_policy.debug_trace = self.debug_trace
         self.sched_policy.init(self.servers, self.stats, self.params)
         
-        # Force a task to arrive now
         self.next_cust_arrival_time  = self.sim_time
-        self.next_power_mgmt_time    = float("inf")
-        self.next_serv_end_time      = float("inf")
-        self.next_serv_end           = None
+        self.events.push(self.next_cust_arrival_time, STOMP.E_TASK_ARRIVAL)
+
+        # Policy entry points (wrapped to count and time their calls when
+        # profiling; called directly otherwise)
+        profile      = self.profile
+        assign_task  = self.sched_policy.assign_task_to_server
+        assign_tasks = self.sched_policy.assign_tasks_to_servers
+        if (profile):
+            assign_task  = profile.wrap('assign_task_to_server', assign_task)
+            if (self.batch_scheduling):
+                assign_tasks = profile.wrap('assign_tasks_to_servers', assign_tasks)
+            run_start = profile.timer()
         
         ######################################################################
         # MAIN SIMULATION: Generate 'max_tasks_simulated' and service them   #
         ######################################################################
-        i = 0
-        while ((self.stats['Tasks Generated'] < self.params['simulation']['max_tasks_simulated']) or
+        while ((self.stats['Tasks Generated'] < self.max_tasks) or
               (len(self.tasks) > 0) or            # There are tasks in the queue, waiting to be served
               (self.stats['Busy Servers'] > 0)):  # There are tasks being served in the servers
         
@@ -715,116 +2810,145 @@ class STOMP:
             ######################################################################
             # 1) Determine next event to handle                                  #
             ######################################################################
-            if (self.params['simulation']['power_mgmt_enabled'] and
-               ((self.next_power_mgmt_time <= self.next_cust_arrival_time) or (self.stats['Tasks Generated'] >= self.params['simulation']['max_tasks_simulated'])) and
-               (self.next_power_mgmt_time <= self.next_serv_end_time)):
-                
-                # Next event is a power management event
-                next_event = STOMP.E_PWR_MGMT
-            
-            elif ((self.stats['Tasks Generated'] < self.params['simulation']['max_tasks_simulated']) and
-                 ((self.next_cust_arrival_time <= self.next_power_mgmt_time) or not self.params['simulation']['power_mgmt_enabled']) and
-                 ((self.next_cust_arrival_time <= self.next_serv_end_time) or (self.stats['Tasks Generated'] >= self.params['simulation']['max_tasks_simulated']))):
-                
-                # Next event is a task arrival
-                next_event = STOMP.E_TASK_ARRIVAL
-            
-            else:
-                assert (self.next_serv_end_time <= self.next_power_mgmt_time) or not self.params['simulation']['power_mgmt_enabled']
-                assert (self.next_serv_end_time <= self.next_cust_arrival_time) or (self.stats['Tasks Generated'] >= self.params['simulation']['max_tasks_simulated'])
-        
-                # Next event is a server finishing the execution of its assigned task
-                next_event = STOMP.E_SERVER_FINISHES
+            assert(len(self.events) > 0);
+            if (profile):
+                phase_start = profile.timer()
+            (event_time, next_event, event_data) = self.events.pop()
+            if (self.debug_trace.enabled):
+                self.debug_trace.set_time(event_time)
+            if (profile):
+                phase_end = profile.timer()
+                profile.phase_times[0] += phase_end - phase_start
+                profile.count_event(next_event)
+                phase_start = phase_end
         
 
             ######################################################################
             # 2) Handle the event                                                #
             ######################################################################
             if (next_event == STOMP.E_PWR_MGMT):
-                if (self.next_power_mgmt_time < self.sim_time):
-                    logging.info('WARNING: PWR_MGMT Time Moving Backward: sim_time %ld but smaller next_power_mgmt_time %ld' % (self.sim_time, self.next_power_mgmt_time))
+                if (event_time < self.sim_time):
+                    logging.info('WARNING: PWR_MGMT Time Moving Backward: sim_time %ld but smaller next_power_mgmt_time %ld' % (self.sim_time, event_time))
                 # Manage power...
-                self.sim_time = self.next_power_mgmt_time
+                self.sim_time = event_time
                 logging.warning('[%10ld] Power management not yet supported...' % (self.sim_time))
         
+            elif (next_event == STOMP.E_TASK_ARRIVAL and self.stats['Tasks Generated'] >= self.max_tasks):
+                # Scheduled before the confidence interval target was reached
+                continue
+
             elif (next_event == STOMP.E_TASK_ARRIVAL):
-                if (self.next_cust_arrival_time < self.sim_time):
-                    logging.info('WARNING: TASK_ARRIVAL Time Moving Backward: sim_time %ld but smaller next_cust_arrival_time %ld' % (self.sim_time, self.next_cust_arrival_time))
+                if (event_time < self.sim_time):
+                    logging.info('WARNING: TASK_ARRIVAL Time Moving Backward: sim_time %ld but smaller next_cust_arrival_time %ld' % (self.sim_time, event_time))
                 
                 # Customer (task) arrival...
-                self.sim_time = self.next_cust_arrival_time
-
-                # Add task to queue
-                if (self.generate_n_enqueue_new_task(self.num_tasks_generated)):
-                    self.num_tasks_generated += 1
-                    if (self.global_task_trace):
-                        tmp = self.global_task_trace[0]
-                        #logging.info('%s' % tmp)
-                        self.next_cust_arrival_time = int(tmp[0][0])
-                        logging.debug('[%10ld] Setting next task arrival time from TRACE to %d ( %s )' % (self.sim_time, self.next_cust_arrival_time, tmp[0][0]))
-                    else:
-                        self.next_cust_arrival_time = self.sim_time + int(round(numpy.random.exponential(scale=self.params['simulation']['mean_arrival_time']*self.params['simulation']['arrival_time_scale'], size=1)))
+                self.sim_time = event_time
+
+                # Add task to queue (or drop it, if the queue is full)
+                self.generate_n_enqueue_new_task(self.num_tasks_generated)
+                self.num_tasks_generated += 1
+                if (self.global_task_trace):
+                    self.next_cust_arrival_time = self.global_task_trace.peek_time()
+                    if (self.debug_trace.active and self.debug_trace.task(self.stats['Tasks Generated']-1)):
+                        logging.debug('[%10ld] Setting next task arrival time from TRACE to %d ( %s )' % (self.sim_time, self.next_cust_arrival_time, self.next_cust_arrival_time))
+                else:
+                    self.next_cust_arrival_time = self.sim_time + self.sampler.exponential(('arrival',), self.params['simulation']['mean_arrival_time']*self.params['simulation']['arrival_time_scale'])
 
+                if (self.debug_trace.active and self.debug_trace.task(self.stats['Tasks Generated']-1)):
                     logging.debug('[%10ld] Task %ld enqueued. Next task will arrive at time %ld' % (self.sim_time, self.stats['Tasks Generated']-1, self.next_cust_arrival_time))
                     logging.debug('               Running tasks: %d, busy servers: %d, waiting tasks: %d' % (self.stats['Running Tasks'], self.stats['Busy Servers'], len(self.tasks)))
+
+                if (self.stats['Tasks Generated'] < self.max_tasks):
+                    self.events.push(self.next_cust_arrival_time, STOMP.E_TASK_ARRIVAL)
         
                 
             elif (next_event == STOMP.E_SERVER_FINISHES):
-                if (self.next_serv_end_time < self.sim_time):
-                    logging.info('WARNING: SERVER_FINISH Time Moving Backward: sim_time %ld but smaller next_serv_end_time %ld' % (self.sim_time, self.next_serv_end_time))
+                if (event_time < self.sim_time):
+                    logging.info('WARNING: SERVER_FINISH Time Moving Backward: sim_time %ld but smaller next_serv_end_time %ld' % (self.sim_time, event_time))
                     
 
-                # Service completion (next_cust_arrival_time >= next_serv_end_time)
-                self.sim_time = self.next_serv_end_time
+                # Service completion
+                self.sim_time = event_time
         
-                assert(not self.next_serv_end is None);
-                self.release_server(self.next_serv_end)
+                assert(not event_data is None);
+                trace_task = self.debug_trace.active and self.debug_trace.task(event_data.task.id)
+                self.release_server(event_data)
                 self.stats['Running Tasks'] -= 1
 
-                logging.debug('[%10ld] Server finished' % (self.sim_time))
-                logging.debug('             Running tasks: %d, busy servers: %d, waiting tasks: %d' % (self.stats['Running Tasks'], self.stats['Busy Servers'], len(self.tasks)))
-                logging.debug('             Waiting time (accum): %ld, tasks serviced: %ld' % (self.stats['Avg Waiting Time'], self.stats['Tasks Serviced']))
+                if (trace_task):
+                    logging.debug('[%10ld] Server finished' % (self.sim_time))
+                    logging.debug('             Running tasks: %d, busy servers: %d, waiting tasks: %d' % (self.stats['Running Tasks'], self.stats['Busy Servers'], len(self.tasks)))
+                    logging.debug('             Waiting time (accum): %ld, tasks serviced: %ld' % (self.stats['Avg Waiting Time'], self.stats['Tasks Serviced']))
+        
+
+            elif (next_event == STOMP.E_POLICY_TIMER):
+                if (event_time < self.sim_time):
+                    logging.info('WARNING: POLICY_TIMER Time Moving Backward: sim_time %ld but smaller timer time %ld' % (self.sim_time, event_time))
+
+                # Scheduling policy timer
+                self.sim_time = event_time
+                self.sched_policy.on_timer(self.sim_time, event_data)
         
                 
             ######################################################################
             # 3) Make scheduling decisions                                       #
             ######################################################################
             
-            server = self.sched_policy.assign_task_to_server(self.sim_time, self.tasks)
-            if server is not None:
-                if server.curr_job_end_time < self.next_serv_end_time:
-                    self.next_serv_end_time = server.curr_job_end_time
-                    self.next_serv_end      = server
-
-                self.stats['Running Tasks']                  += 1
-                self.stats['Busy Servers']                   += 1
-                self.stats['Available Servers'][server.type] -= 1
-
-                self.task_assign_trace.write('%ld,%d,%s,%d,%s,%d,%d,%d\n' % (self.sim_time, server.task.id, server.task.type, server.id, server.type, server.curr_job_start_time, server.curr_service_time, server.curr_job_end_time))
-
-                # Update histogram
-                queue_size  = len(self.tasks) + 1  # +1 because the task was already removed
-                if (self.stats['Max Queue Size'] < queue_size):
-                    self.stats['Max Queue Size'] = queue_size
-                bin         = int(queue_size / self.bin_size)        
-                time_period = self.sim_time - self.last_size_change_time
-                if (bin >= len(self.stats['Queue Size Histogram'])):
-                    bin = len(self.stats['Queue Size Histogram']) - 1
-                self.stats['Queue Size Histogram'][bin] += time_period
-                self.last_size_change_time = self.sim_time
+            if (profile):
+                phase_end = profile.timer()
+                profile.phase_times[1] += phase_end - phase_start
+                phase_start = phase_end
+
+            if (self.batch_scheduling):
+                assignments = assign_tasks(self.sim_time, self.tasks)
+                if (assignments is None):
+                    # No batch entry point: repeat the policy's single assignments
+                    server = assign_task(self.sim_time, self.tasks)
+                    while (server is not None):
+                        self.start_task(server)
+                        server = assign_task(self.sim_time, self.tasks)
+                else:
+                    for (task, server) in assignments:
+                        server.assign_task(self.sim_time, self.tasks.remove(task))
+                        self.start_task(server)
+            else:
+                server = assign_task(self.sim_time, self.tasks)
+                if server is not None:
+                    self.start_task(server)
 
-                logging.debug('[%10ld] Task %d scheduled in server %d ( %s ) until %d' % (self.sim_time, server.task.id, server.id, server.type, server.curr_job_end_time))
-                logging.debug('               Running tasks: %d, busy servers: %d, waiting tasks: %d' % (self.stats['Running Tasks'], self.stats['Busy Servers'], len(self.tasks)))
-                logging.debug('               Avail: %s' % (', '.join(['%s: %s' % (key, value) for (key, value) in self.stats['Available Servers'].items()])))
+            if (profile):
+                profile.phase_times[2] += profile.timer() - phase_start
 
+        if (profile):
+            profile.run_time = profile.timer() - run_start
 
 
         # Close task trace files
-        self.task_trace_file.close()
-        self.task_assign_trace.close()
+        if (self.event_trace_period):
+            self.task_trace_file.close()
+            self.task_assign_trace.close()
 
         for task in self.task_trace_files:
             self.task_trace_files[task].close()
 
         if (self.output_trace_file):
             self.output_trace.close()
+
+        if (self.global_task_trace):
+            self.global_task_trace.close()
+
+        # Last check of the warm-up period, if not detected yet
+        if (self.warmup_records is not None):
+            self.end_warmup(self.warmup.cutoff if (self.warmup.detect()) else None)
+
+        # Final histogram update
+        queue_size  = len(self.tasks)
+        bin         = int(queue_size / self.bin_size)        
+        time_period = self.sim_time - self.last_size_change_time
+        if (bin >= len(self.stats['Queue Size Histogram'])):
+            bin = len(self.stats['Queue Size Histogram']) - 1
+        self.stats['Queue Size Histogram'][bin] += time_period
+        self.last_size_change_time = self.sim_time
+
+        self.results = self.compute_results()
+        return self.results
@@ -22,11 +22,13 @@ import sys, getopt
 import importlib
 import json
 import collections
-from stomp import STOMP
+import logging
+from stomp import STOMP, write_results
+from stomp_sweep import run_replications, print_replications
 
 
 def usage_and_exit(exit_code):
-    print 'usage: stomp_main.py [--help] [--debug] [--conf-file=<json_config_file>] [--conf-json=<json_string>] [--arrival-trace=<string>] [--input-trace=<string>] [--generate-trace=<string>] [--pre-gen-arrivals]'
+    print 'usage: stomp_main.py [--help] [--debug] [--debug-window=<first>:<last>] [--debug-tasks=<first>:<last>] [--conf-file=<json_config_file>] [--conf-json=<json_string>] [--arrival-trace=<string>] [--input-trace=<string>] [--generate-trace=<string>] [--pre-gen-arrivals] [--results=<results_file>] [--quiet] [--replications=<n>] [--workers=<n>] [--profile]'
     sys.exit(exit_code)
 
 
@@ -44,16 +46,23 @@ def update(d, u):
 def main(argv):
 
     try:
-        opts, args = getopt.getopt(argv,"hdpc:j:i:a:g:",["help", "conf-file=", "conf-json=", "debug", "arrival-trace=", "input-trace=", "generate-trace=", "pre-gen-arrivals"])
+        opts, args = getopt.getopt(argv,"hdpqc:j:i:a:g:w:t:r:n:",["help", "conf-file=", "conf-json=", "debug", "debug-window=", "debug-tasks=", "arrival-trace=", "input-trace=", "generate-trace=", "pre-gen-arrivals", "results=", "quiet", "replications=", "workers=", "profile"])
     except getopt.GetoptError:
         usage_and_exit(2)
 
     conf_file = "stomp.json"
     conf_json = None
     log_level = None
+    debug_time_window = None
+    debug_task_ids = None
     input_trace_file = None
     output_trace_file = None
     pre_gen = False
+    results_file = None
+    quiet = False
+    replications = None
+    workers = None
+    profile = False
 
     for opt, arg in opts:
         if opt in ("-h", "--help"):
@@ -70,8 +79,31 @@ def main(argv):
             output_trace_file = arg
         elif opt in ("-d", "--debug"):
             log_level = "DEBUG"
+        elif opt in ("-w", "--debug-window"):
+            # Debug messages only between two simulation times
+            log_level = "DEBUG"
+            debug_time_window = [int(item) for item in arg.split(':')]
+        elif opt in ("-t", "--debug-tasks"):
+            # Debug messages only about a range of task ids
+            log_level = "DEBUG"
+            debug_task_ids = [int(item) for item in arg.split(':')]
         elif opt in ("-p", "--pre-gen-arrivals"):
             pre_gen = True
+        elif opt in ("-r", "--results"):
+            # Write the simulation results as JSON (or CSV, if <results_file> ends with .csv)
+            results_file = arg
+        elif opt in ("-q", "--quiet"):
+            # Do not print the simulation statistics
+            quiet = True
+        elif opt in ("-n", "--replications"):
+            # Run independent replications, and combine their results
+            replications = int(arg)
+        elif opt == "--workers":
+            # Worker processes for the replications (one per core by default)
+            workers = int(arg)
+        elif opt == "--profile":
+            # Profile the engine phases and the scheduling policy calls
+            profile = True
 
     with open(conf_file) as conf_file:
         stomp_params = json.load(conf_file)
@@ -86,17 +118,51 @@ def main(argv):
     if (log_level):
         stomp_params['general']['logging_level'] = log_level
 
+    if (debug_time_window):
+        stomp_params['general']['debug_time_window'] = debug_time_window
+
+    if (debug_task_ids):
+        stomp_params['general']['debug_task_ids'] = debug_task_ids
+
     if (pre_gen):
         stomp_params['general']['pre_gen_arrivals'] = True
+
+    if (replications):
+        stomp_params['general']['replications'] = replications
+
+    if (profile):
+        stomp_params['general']['profile'] = True
         
     #print('Setting input_arr_tr file to %s and output_tr_file to %s\n' % (input_trace_file, output_trace_file))
     stomp_params['general']['input_trace_file'] = input_trace_file
     stomp_params['general']['output_trace_file'] = output_trace_file
 
+    replications = stomp_params['general'].get('replications', 1)
+    if (replications > 1):
+        # Run the replications on a pool of worker processes, print the
+        # combined statistics
+        if (output_trace_file):
+            print 'ERROR: cannot generate a trace with several replications'
+            usage_and_exit(3)
+        if (stomp_params['general'].get('antithetic', False) and replications % 2 != 0):
+            print 'ERROR: antithetic replications must be an even number (pairs)'
+            usage_and_exit(4)
+        logging.basicConfig(level=eval('logging.' + stomp_params['general']['logging_level']), format="%(message)s")
+        (results, replication_results) = run_replications(stomp_params, replications, workers,
+                                                          input_trace_file, stomp_params['general']['pre_gen_arrivals'])
+        if (not quiet):
+            print_replications(results)
+        if (results_file):
+            write_results(results, results_file)
+        return
+
     # Instantiate and run STOMP, print statistics
     stomp_sim = STOMP(stomp_params, sched_policy_module.SchedulingPolicy())
-    stomp_sim.run()
-    stomp_sim.print_stats()
+    results = stomp_sim.run()
+    if (not quiet):
+        stomp_sim.print_stats()
+    if (results_file):
+        write_results(results, results_file)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,621 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 IBM
+#
+# This is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+#
+
+from __future__ import division
+import os
+import copy
+import math
+import json
+import time
+import hashlib
+import logging
+import importlib
+import sqlite3
+import tempfile
+import multiprocessing
+import numpy
+from collections import OrderedDict
+import stomp
+from stomp import STOMP
+
+
+###############################################################################
+# This class describes one point of a parameter sweep: a STOMP simulation,    #
+# identified by 'key' (any hashable value, e.g. a tuple of the swept          #
+# parameters), with its own copy of the configuration 'params' and the        #
+# stomp_main.py equivalent options (input/arrival trace, output trace and     #
+# pre-generated arrivals). 'seed' is the random seed of the point (the        #
+# configured random_seed if not given): each point is seeded on its own, so   #
+# its results do not depend on which worker runs it, or on the points run     #
+# before it. 'cost' is an estimate of the run time of the point (see          #
+# estimate_cost), used to start the longest points first. If 'log_file' is    #
+# given, the output of the simulation (including its statistics) is written   #
+# to it.                                                                      #
+###############################################################################
+class SweepPoint:
+
+    def __init__(self, key, params, input_trace_file=None, output_trace_file=None, pre_gen_arrivals=False,
+                 seed=None, cost=None, log_file=None):
+
+        self.key    = key
+        self.params = copy.deepcopy(params)
+        self.params['general']['input_trace_file']  = input_trace_file
+        self.params['general']['output_trace_file'] = output_trace_file
+        if (pre_gen_arrivals):
+            self.params['general']['pre_gen_arrivals'] = True
+        if (seed is not None):
+            self.params['general']['random_seed'] = seed
+        self.seed     = self.params['general']['random_seed']
+        self.cost     = cost if (cost is not None) else estimate_cost(self.params)
+        self.log_file = log_file
+
+
+###############################################################################
+# A sweep point is identified (e.g. in the result cache and the result store) #
+# by point_hash(), a hash of:                                                 #
+#   - Its effective configuration (with the options that do not affect the    #
+#     results, e.g. 'working_dir' or the debug and event trace options,       #
+#     left out), including the random seed                                    #
+#   - The contents of its input (or arrival) trace file, if any               #
+#   - The source code of its scheduling policy module and of stomp.py         #
+# So editing a policy only changes the hash of the points of that policy.     #
+# File hashes are kept by (path, size, modification time), so a trace file    #
+# shared by many points is only read once.                                    #
+###############################################################################
+IGNORED_OPTIONS = ['working_dir', 'basename', 'logging_level', 'debug_time_window', 'debug_task_ids',
+                   'event_trace', 'event_trace_sample_period', 'event_trace_format', 'event_trace_buffer_size',
+                   'input_trace_file', 'output_trace_file']
+
+file_hashes   = {}  # (path, size, mtime) -> hash of the file contents
+source_hashes = {}  # Module name -> hash of its source file
+
+
+def file_hash(file_name):
+
+    stat = os.stat(file_name)
+    file_id = (os.path.abspath(file_name), stat.st_size, stat.st_mtime)
+    if (file_id not in file_hashes):
+        digest = hashlib.sha256()
+        with open(file_name, 'rb') as in_file:
+            for chunk in iter(lambda: in_file.read(1 << 20), b''):
+                digest.update(chunk)
+        file_hashes[file_id] = digest.hexdigest()
+    return file_hashes[file_id]
+
+
+def source_hash(module_name):
+
+    if (module_name not in source_hashes):
+        module_file = importlib.import_module(module_name).__file__
+        if (module_file.endswith('.pyc') or module_file.endswith('.pyo')):
+            module_file = module_file[:-1]
+        source_hashes[module_name] = file_hash(module_file)
+    return source_hashes[module_name]
+
+
+def point_hash(point):
+
+    params = copy.deepcopy(point.params)
+    for option in IGNORED_OPTIONS:
+        params['general'].pop(option, None)
+    input_trace = point.params['general']['input_trace_file']
+    if (input_trace):
+        input_trace = (input_trace[0], file_hash(point.params['general']['working_dir'] + '/' + input_trace[1]))
+    hash_data = {'params':      params,
+                 'seed':        point.seed,
+                 'input_trace': input_trace,
+                 'policy':      source_hash(point.params['simulation']['sched_policy_module']),
+                 'stomp':       source_hash(stomp.__name__)}
+    return hashlib.sha256(json.dumps(hash_data, sort_keys=True)).hexdigest()
+
+
+def writes_files(point):
+
+    # True if the simulation of the point writes files other than its results:
+    # a task trace, per-event trace files (unless 'event_trace' is 'off') or a
+    # log file. Such points are always simulated, even if their results are in
+    # the result cache or store, as those files would not be written otherwise.
+    general = point.params['general']
+    return bool(general['output_trace_file'] or general.get('event_trace', 'full') != 'off' or point.log_file)
+
+
+###############################################################################
+# This class is an on-disk cache of simulation results, so that the sweep     #
+# points that did not change since a previous sweep (see point_hash) are not  #
+# simulated again. Each entry is a JSON file (named by the point hash) with   #
+# the results and a description of the point; entries are evicted in least    #
+# recently used order when the total size of the cache exceeds 'max_size'     #
+# bytes. Points that write a task trace, event trace files or a log file are  #
+# never cached (those files would not be written on a hit; see writes_files), #
+# nor are profiled points (their timings would be stale).                     #
+###############################################################################
+class ResultCache:
+
+    DEFAULT_SIZE = 1024 * 1024 * 1024
+
+    def __init__(self, cache_dir, max_size=DEFAULT_SIZE):
+
+        self.cache_dir  = cache_dir
+        self.max_size   = max_size
+        self.total_size = None  # Computed on the first store
+        if (not os.path.isdir(cache_dir)):
+            os.makedirs(cache_dir)
+
+
+    def cacheable(self, point):
+
+        # Profiled points are not cached either: their profile is a wall time
+        # measurement, which would be stale on a hit
+        return not (writes_files(point) or point.params['general'].get('profile', False))
+
+
+    def entry_file(self, key):
+
+        return os.path.join(self.cache_dir, key + '.json')
+
+
+    def get(self, point):
+
+        # Returns the cached results of the point (or None), marking the entry
+        # as recently used
+        if (not self.cacheable(point)):
+            return None
+        entry_file = self.entry_file(point_hash(point))
+        try:
+            with open(entry_file) as in_file:
+                entry = json.load(in_file, object_pairs_hook=OrderedDict)
+            os.utime(entry_file, None)
+        except (IOError, OSError, ValueError):
+            return None
+        return entry['results']
+
+
+    def put(self, point, results):
+
+        if (not self.cacheable(point)):
+            return
+        key   = point_hash(point)
+        entry = OrderedDict([('key',         key),
+                             ('created',     time.strftime('%Y-%m-%d %H:%M:%S')),
+                             ('policy',      point.params['simulation']['sched_policy_module']),
+                             ('seed',        point.seed),
+                             ('input_trace', point.params['general']['input_trace_file']),
+                             ('params',      point.params),
+                             ('results',     results)])
+        # Write to a temporary file first, so that entries are never partial
+        (fd, tmp_file) = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w') as out_file:
+            json.dump(entry, out_file)
+        if (self.total_size is None):
+            self.total_size = sum([size for (entry_file, size, last_used) in self.entries()])
+        else:
+            self.total_size += os.path.getsize(tmp_file)
+        if (os.path.exists(self.entry_file(key))):
+            self.total_size -= os.path.getsize(self.entry_file(key))
+        os.rename(tmp_file, self.entry_file(key))
+        if (self.total_size > self.max_size):
+            self.total_size -= sum([size for (entry_file, size, last_used) in self.evict(self.max_size)])
+
+
+    def entries(self):
+
+        # Returns (file, size, last use time) of every entry, least recently used first
+        entries = []
+        for file_name in os.listdir(self.cache_dir):
+            if (file_name.endswith('.json')):
+                entry_file = os.path.join(self.cache_dir, file_name)
+                stat = os.stat(entry_file)
+                entries.append((entry_file, stat.st_size, stat.st_mtime))
+        return sorted(entries, key=lambda entry: entry[2])
+
+
+    def load(self, entry_file):
+
+        with open(entry_file) as in_file:
+            return json.load(in_file, object_pairs_hook=OrderedDict)
+
+
+    def evict(self, max_size):
+
+        # Removes the least recently used entries until the cache takes at
+        # most 'max_size' bytes; returns the removed entries
+        entries = self.entries()
+        size    = sum([size for (entry_file, size, last_used) in entries])
+        removed = []
+        for entry in entries:
+            if (size <= max_size):
+                break
+            os.remove(entry[0])
+            size -= entry[1]
+            removed.append(entry)
+        return removed
+
+
+###############################################################################
+# This class is a SQLite database of simulation results, where each sweep     #
+# point is stored (and committed) as soon as it completes, so that a sweep    #
+# that is interrupted can be resumed: the points already in the store (see    #
+# point_hash) are not simulated again. Besides the configuration and the      #
+# results (as JSON), each point is described by indexed columns with the      #
+# usual sweep dimensions and a few main results, for queries (see             #
+# utils/query_results.py):                                                    #
+#   - policy: the scheduling policy (module) name                             #
+#   - mean_arrival_time, arrival_scale: 'mean_arrival_time' and               #
+#     'arrival_time_scale' of the configuration                               #
+#   - stdev_factor: the ratio between the stdev and mean service times, if it #
+#     is the same for every task and server type (NULL otherwise)             #
+#   - server_counts: the number of servers per server type, as text (e.g.     #
+#     'cpu_core:8,fft_accel:1,gpu:2', sorted by server type); num_servers     #
+#   - seed: the random seed                                                   #
+# Points that write files (a task trace, which may be needed by other points, #
+# event trace files or a log file; see writes_files) are always simulated,    #
+# so a resumed sweep writes the same files as a complete one.                 #
+###############################################################################
+class ResultStore:
+
+    DIMENSIONS = ['policy', 'mean_arrival_time', 'arrival_scale', 'stdev_factor', 'server_counts', 'num_servers', 'seed']
+    METRICS    = ['avg_resp_time', 'avg_waiting_time', 'tasks_serviced', 'total_sim_time']
+
+    def __init__(self, db_file):
+
+        self.db = sqlite3.connect(db_file)
+        self.db.execute('''CREATE TABLE IF NOT EXISTS points (
+                               hash              TEXT PRIMARY KEY,
+                               policy            TEXT,
+                               mean_arrival_time REAL,
+                               arrival_scale     REAL,
+                               stdev_factor      REAL,
+                               server_counts     TEXT,
+                               num_servers       INTEGER,
+                               seed              INTEGER,
+                               input_trace       TEXT,
+                               avg_resp_time     REAL,
+                               avg_waiting_time  REAL,
+                               tasks_serviced    INTEGER,
+                               total_sim_time    INTEGER,
+                               created           TEXT,
+                               params            TEXT,
+                               results           TEXT)''')
+        self.db.execute('CREATE INDEX IF NOT EXISTS points_by_dims ON points (policy, arrival_scale, stdev_factor, server_counts, seed)')
+        for column in ['arrival_scale', 'stdev_factor', 'server_counts', 'seed']:
+            self.db.execute('CREATE INDEX IF NOT EXISTS points_by_%s ON points (%s)' % (column, column))
+        self.db.commit()
+
+
+    @staticmethod
+    def dimensions(params):
+
+        sim           = params['simulation']
+        server_counts = ','.join(['%s:%d' % (server_type, sim['servers'][server_type]['count']) for server_type in sorted(sim['servers'])])
+        ratios        = [sim['tasks'][task]['stdev_service_time'][server_type] / mean_service_time
+                         for task in sim['tasks'] for (server_type, mean_service_time) in sim['tasks'][task]['mean_service_time'].items()
+                         if (mean_service_time > 0)]
+        stdev_factor  = None
+        if (len(ratios) > 0 and max(ratios) - min(ratios) <= 1e-9 * max(max(ratios), 1)):
+            stdev_factor = round(ratios[0], 9)
+        return OrderedDict([('policy',            sim['sched_policy_module'].split('.')[-1]),
+                            ('mean_arrival_time', sim['mean_arrival_time']),
+                            ('arrival_scale',     sim['arrival_time_scale']),
+                            ('stdev_factor',      stdev_factor),
+                            ('server_counts',     server_counts),
+                            ('num_servers',       sum([sim['servers'][server_type]['count'] for server_type in sim['servers']])),
+                            ('seed',              params['general']['random_seed'])])
+
+
+    def get(self, point):
+
+        # Returns the stored results of the point (or None)
+        if (writes_files(point)):
+            return None
+        row = self.db.execute('SELECT results FROM points WHERE hash = ?', (point_hash(point),)).fetchone()
+        return json.loads(row[0], object_pairs_hook=OrderedDict) if (row) else None
+
+
+    def put(self, point, results):
+
+        input_trace = point.params['general']['input_trace_file']
+        row = self.dimensions(point.params)
+        row['hash']             = point_hash(point)
+        row['input_trace']      = input_trace[1] if (input_trace) else None
+        row['avg_resp_time']    = results['Avg Resp Time']
+        row['avg_waiting_time'] = results['Avg Waiting Time']
+        row['tasks_serviced']   = results['Tasks Serviced']
+        row['total_sim_time']   = results['Total Simulation Time']
+        row['created']          = time.strftime('%Y-%m-%d %H:%M:%S')
+        row['params']           = json.dumps(point.params)
+        row['results']          = json.dumps(results)
+        self.db.execute('INSERT OR REPLACE INTO points (%s) VALUES (%s)' % (', '.join(row.keys()), ', '.join(['?'] * len(row))), row.values())
+        self.db.commit()
+
+
+    def query(self, columns, filters):
+
+        # Returns the given columns of the points matching the filters (a dict
+        # of column -> value), in insertion order
+        where = ' AND '.join(['%s = ?' % (column) for column in filters])
+        sql   = 'SELECT %s FROM points%s ORDER BY rowid' % (', '.join(columns), (' WHERE ' + where) if (where) else '')
+        return self.db.execute(sql, filters.values()).fetchall()
+
+
+    def close(self):
+
+        self.db.close()
+
+
+def estimate_cost(params):
+
+    # Relative run time of a simulation: the number of tasks, weighted by the
+    # expected queue length (policies scan the waiting tasks, so loaded
+    # systems take longer per task). The load is the mean service time (over
+    # task and server types) per server, relative to the mean arrival time.
+    sim           = params['simulation']
+    num_servers   = sum([sim['servers'][server_type]['count'] for server_type in sim['servers']])
+    service_times = [mean_service_time for task in sim['tasks'] for mean_service_time in sim['tasks'][task]['mean_service_time'].values()]
+    load          = (sum(service_times) / len(service_times)) / (sim['mean_arrival_time'] * sim['arrival_time_scale'] * max(num_servers, 1))
+    load          = min(load, 0.99)
+    return sim['max_tasks_simulated'] * (1 + load / (1 - load))
+
+
+def run_point(point):
+
+    # Runs the simulation of a sweep point in this process; returns the
+    # point key and the simulation results (see STOMP.run). The logging
+    # configuration of the process is restored afterwards.
+    logger         = logging.getLogger()
+    saved_handlers = logger.handlers[:]
+    saved_level    = logger.level
+    for handler in saved_handlers:
+        logger.removeHandler(handler)
+    if (point.log_file):
+        handler = logging.FileHandler(point.log_file, 'w')
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.setLevel(getattr(logging, point.params['general']['logging_level']))
+    else:
+        handler = logging.NullHandler()
+        logger.setLevel(logging.WARNING)
+    logger.addHandler(handler)
+
+    try:
+        sched_policy_module = importlib.import_module(point.params['simulation']['sched_policy_module'])
+        stomp_sim = STOMP(point.params, sched_policy_module.SchedulingPolicy())
+        results   = stomp_sim.run()
+        if (point.log_file):
+            stomp_sim.print_stats()
+    finally:
+        handler.close()
+        logger.removeHandler(handler)
+        for saved_handler in saved_handlers:
+            logger.addHandler(saved_handler)
+        logger.setLevel(saved_level)
+    return (point.key, results)
+
+
+def run_sweep(points, workers=None, callback=None, cache=None, store=None):
+
+    # Runs the simulations of all the sweep points, on a pool of 'workers'
+    # processes (one per core by default; 1 runs them in this process), the
+    # longest (highest cost) points first. callback(point, results) is called
+    # (in this process) as each point completes. If a ResultStore is given,
+    # the points already in it are not simulated, and every other point is
+    # stored in it as it completes; if a ResultCache is given, the points
+    # found in it are not simulated, and the results of the other points are
+    # stored in it. Returns the results of every point, by key, in the order
+    # of 'points'.
+    if (workers is None):
+        workers = multiprocessing.cpu_count()
+    by_key  = OrderedDict([(point.key, point) for point in points])
+    results = {}
+
+    pending = []
+    for point in points:
+        stored_results = store.get(point) if (store) else None
+        cached_results = cache.get(point) if (cache and stored_results is None) else None
+        if (stored_results is not None):
+            results[point.key] = stored_results
+        elif (cached_results is not None):
+            results[point.key] = cached_results
+            if (store):
+                store.put(point, cached_results)
+        else:
+            pending.append(point)
+            continue
+        if (callback):
+            callback(point, results[point.key])
+    ordered = sorted(pending, key=lambda point: point.cost, reverse=True)
+
+    use_pool = (workers > 1 and len(pending) > 1)
+    if (use_pool):
+        pool      = multiprocessing.Pool(min(workers, len(pending)))
+        completed = pool.imap_unordered(run_point, ordered, chunksize=1)
+    else:
+        completed = (run_point(point) for point in ordered)
+
+    for (key, point_results) in completed:
+        results[key] = point_results
+        if (cache):
+            cache.put(by_key[key], point_results)
+        if (store):
+            store.put(by_key[key], point_results)
+        if (callback):
+            callback(by_key[key], point_results)
+
+    if (use_pool):
+        pool.close()
+        pool.join()
+
+    return OrderedDict([(key, results[key]) for key in by_key])
+
+
+###############################################################################
+# Independent replications: the same simulation, run with different random    #
+# seeds, spawned from a root seed by spawn_seeds() (like numpy's              #
+# SeedSequence.spawn, which is not available with Python 2). Each simulation  #
+# draws from its own RandomSampler streams (see stomp.py), so replications    #
+# are statistically independent, reproducible from the root seed, and can run #
+# on a pool of worker processes like any other sweep. combine_results()       #
+# summarizes them: every numeric value of the results becomes its mean and    #
+# confidence interval across the replications.                                #
+###############################################################################
+def spawn_seeds(root_seed, num_seeds):
+
+    # Seed i is drawn from a stream seeded with [root_seed, i], so it does not
+    # depend on the number of seeds spawned; the (unlikely) repeated seeds are
+    # replaced by the next values of their stream
+    if (root_seed is None):
+        root_seed = int(numpy.random.RandomState().randint(2**31))
+    seeds = []
+    for index in range(num_seeds):
+        stream = numpy.random.RandomState([root_seed, index])
+        seed   = int(stream.randint(2**31))
+        while (seed in seeds):
+            seed = int(stream.randint(2**31))
+        seeds.append(seed)
+    return seeds
+
+
+def merge_results(results_list, merge_numbers):
+
+    # Merge several results value by value: numbers (ints and floats,
+    # skipping None) are merged by merge_numbers(values); other values are
+    # kept if they are the same in all the results, or listed otherwise.
+    # Dictionaries and lists are merged element by element.
+    present = [results for results in results_list if (results is not None)]
+    if (len(present) == 0):
+        return None
+    if (isinstance(present[0], dict)):
+        keys = []
+        for results in present:
+            keys += [key for key in results if (key not in keys)]
+        return OrderedDict([(key, merge_results([results.get(key) for results in present], merge_numbers)) for key in keys])
+    if (isinstance(present[0], list)):
+        length = max([len(results) for results in present])
+        return [merge_results([results[index] if (index < len(results)) else None for results in present], merge_numbers) for index in range(length)]
+    if (all([isinstance(value, (int, long, float)) and not isinstance(value, bool) for value in present])):
+        return merge_numbers(present)
+    if (all([value == present[0] for value in present])):
+        return present[0]
+    return present
+
+
+def combine_results(results_list, confidence=0.95):
+
+    # Combine the results of several replications (see merge_results): each
+    # number becomes the mean, the half width of the confidence interval
+    # (Student t, None with fewer than 2 values), min, max and count of its
+    # values
+    def interval(values):
+        count      = len(values)
+        mean       = sum(values) / count
+        half_width = None
+        if (count > 1):
+            variance   = sum([(value - mean)**2 for value in values]) / (count - 1)
+            half_width = stomp.BatchMeans.t_quantile((1 + confidence) / 2, count - 1) * math.sqrt(variance / count)
+        return OrderedDict([('Mean', mean), ('Half Width', half_width), ('Min', min(values)), ('Max', max(values)), ('Count', count)])
+
+    return merge_results(results_list, interval)
+
+
+def average_results(results_list):
+
+    # Average several results (see merge_results)
+    return merge_results(results_list, lambda values: sum(values) / len(values))
+
+
+def run_replications(params, replications, workers=None, input_trace_file=None, pre_gen_arrivals=False, cache=None, store=None):
+
+    # Runs 'replications' independent replications of a simulation (with
+    # seeds spawned from its random_seed) as a sweep; returns the combined
+    # results (see combine_results), with the confidence level of the
+    # simulation's 'ci_confidence', and the results of each replication.
+    # With 'antithetic', the replications are antithetic pairs (an even
+    # number of them): both simulations of a pair use the same seed, the
+    # second one with antithetic variates, and the confidence intervals are
+    # computed over the averages of the pairs, which are independent.
+    root_seed  = params['general']['random_seed']
+    antithetic = params['general'].get('antithetic', False)
+    if (antithetic):
+        assert(replications % 2 == 0);
+        seeds = spawn_seeds(root_seed, replications // 2)
+    else:
+        seeds = spawn_seeds(root_seed, replications)
+    points = []
+    for index in range(replications):
+        if (antithetic):
+            point = SweepPoint(index, params, input_trace_file, None, pre_gen_arrivals, seeds[index // 2])
+            point.params['general']['antithetic'] = (index % 2 == 1)
+        else:
+            point = SweepPoint(index, params, input_trace_file, None, pre_gen_arrivals, seeds[index])
+        point.params['general']['basename'] = '%s.rep%d' % (params['general']['basename'], index)
+        points.append(point)
+    sweep_results = list(run_sweep(points, workers, None, cache, store).values())
+    if (antithetic):
+        samples = [average_results(sweep_results[index:index + 2]) for index in range(0, replications, 2)]
+    else:
+        samples = sweep_results
+
+    confidence = params['simulation'].get('ci_confidence', 0.95)
+    combined   = OrderedDict()
+    combined['Replications']     = replications
+    combined['Antithetic Pairs'] = antithetic
+    combined['Root Seed']        = root_seed
+    combined['Seeds']            = seeds
+    combined['Confidence']       = confidence
+    combined['Results']          = combine_results(samples, confidence)
+    return (combined, sweep_results)
+
+
+def print_replications(combined):
+
+    # Prints the main combined results of a set of replications (as
+    # STOMP.print_stats does for one simulation)
+    def interval(value):
+        if (value is None):
+            return '%8s' % ('-')
+        if (value['Half Width'] is None):
+            return '%12.4f' % (value['Mean'])
+        return '%12.4f +/- %10.4f' % (value['Mean'], value['Half Width'])
+
+    results = combined['Results']
+    logging.info('\n================ Replications Statistics ================')
+    logging.info(' Scheduling policy:     %s'  % results['Scheduling Policy'])
+    logging.info(' Replications:          %d%s (root seed %s)' % (combined['Replications'], ' (antithetic pairs)' if (combined['Antithetic Pairs']) else '', combined['Root Seed']))
+    logging.info(' Means and %g%% confidence intervals over the replications' % (100 * combined['Confidence']))
+    logging.info('')
+    logging.info(' Total simulation time: %s' % interval(results['Total Simulation Time']))
+    logging.info(' Tasks serviced:        %s' % interval(results['Tasks Serviced']))
+    logging.info('')
+    for (title, name) in [('Response time (avg)', 'Avg Resp Time'), ('Waiting time (avg)', 'Avg Waiting Time')]:
+        logging.info(' %s:' % (title))
+        logging.info('   %12s : %s' % ('global', interval(results[name])))
+        for (task, task_results) in results['Task Types'].items():
+            logging.info('   %12s : %s' % (task, interval(task_results[name])))
+        logging.info('')
+    logging.info(' Utilization:')
+    for server in results['Servers']:
+        logging.info('   Server %3d ( %12s ): %s' % (server['Id']['Mean'], server['Type'], interval(server['Utilization'])))
+    for (metric, title) in [('Resp Time', 'Response'), ('Waiting Time', 'Waiting')]:
+        logging.info('')
+        logging.info(' %s Time Quantiles:' % (title))
+        for (name, quantiles) in list(results['Quantiles'][metric]['global'].items()) + list(results['Quantiles'][metric]['task type'].items()):
+            for (label, value) in quantiles.items():
+                if (label != 'count'):
+                    logging.info('   %12s : %6s : %s' % (name, label, interval(value)))
+    logging.info('')
+    logging.info('')
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 IBM
+#
+# This is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+#
+
+# DESCRIPTION:
+#  This script measures the raw speed of the STOMP simulation engine.
+#  STOMP is run in-process (no subprocess per run) on the validation
+#  configuration (one server type, one task type), scaling the number of
+#  servers while keeping the system load constant, and the number of
+#  simulation events handled per second of wall-clock time is reported.
+#  With --queue-memory, it instead reports the memory used per queued task
+#  when the task queue holds the given number of tasks (default STOMP
+#  configuration, stomp.json).
+#
+
+
+from __future__ import print_function
+from __future__ import division
+import os
+import sys
+import json
+import copy
+import time
+import shutil
+import getopt
+import logging
+import resource
+import tempfile
+import importlib
+from sys import stdout
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from stomp import STOMP
+
+
+CONF_FILE      = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stomp_validation.json')
+QUEUE_CONF     = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'stomp.json')
+POLICY         = 'simple_policy_ver2'
+SERVER_COUNT   = [ 10, 100, 1000, 10000 ]
+NUM_TASKS      = 20000
+MEAN_SER_TIME  = 100000   # units of time
+COEFF_OF_VAR   = 0.10     # coefficient of variation (stdev / mean_ser_time)
+UTILIZATION    = 0.90     # target load (rho / c)
+
+
+def usage_and_exit(exit_code):
+    stdout.write('\nusage: %s [--help] [--tasks=<num_tasks>] [--policy=<policy>] [--servers=<n1,n2,...>] [--queue-memory=<num_tasks>]\n\n' % (os.path.basename(__file__)))
+    sys.exit(exit_code)
+
+
+def run_stomp(stomp_params):
+
+    sched_policy_module = importlib.import_module(stomp_params['simulation']['sched_policy_module'])
+    stomp_sim = STOMP(stomp_params, sched_policy_module.SchedulingPolicy())
+
+    start_time = time.time()
+    stomp_sim.run()
+    elapsed_time = time.time() - start_time
+
+    num_events = stomp_sim.stats['Tasks Generated'] + stomp_sim.stats['Tasks Serviced']
+    return (num_events, elapsed_time)
+
+
+def measure_queue_memory(stomp_params, num_tasks):
+
+    # Memory growth (peak resident set size, in KB on Linux) while
+    # 'num_tasks' tasks are enqueued, with no task ever served
+    sched_policy_module = importlib.import_module(stomp_params['simulation']['sched_policy_module'])
+    stomp_sim = STOMP(stomp_params, sched_policy_module.SchedulingPolicy())
+
+    start_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    for task_num in range(num_tasks):
+        stomp_sim.generate_n_enqueue_new_task(task_num)
+    end_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return (len(stomp_sim.tasks), (end_rss - start_rss) * 1024)
+
+
+def main(argv):
+
+    try:
+        opts, args = getopt.getopt(argv, "ht:p:s:m:", ["help", "tasks=", "policy=", "servers=", "queue-memory="])
+    except getopt.GetoptError:
+        usage_and_exit(2)
+
+    num_tasks     = NUM_TASKS
+    policy        = POLICY
+    server_counts = SERVER_COUNT
+    queue_tasks   = None
+
+    for opt, arg in opts:
+        if opt in ("-h", "--help"):
+            usage_and_exit(0)
+        elif opt in ("-t", "--tasks"):
+            num_tasks = int(arg)
+        elif opt in ("-p", "--policy"):
+            policy = arg
+        elif opt in ("-s", "--servers"):
+            server_counts = [int(count) for count in arg.split(',')]
+        elif opt in ("-m", "--queue-memory"):
+            queue_tasks = int(arg)
+        else:
+            stdout.write('\nERROR: Unrecognized input parameter %s\n' % opt)
+            usage_and_exit(3)
+
+    with open(QUEUE_CONF if (queue_tasks) else CONF_FILE) as conf_file:
+        base_params = json.load(conf_file)
+
+    # STOMP output (statistics, trace files) is not relevant here
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+    work_dir = tempfile.mkdtemp(prefix='stomp_bench_')
+
+    try:
+        if (queue_tasks):
+            stomp_params = copy.deepcopy(base_params)
+            stomp_params['general']['logging_level']     = 'WARNING'
+            stomp_params['general']['working_dir']       = work_dir
+            stomp_params['general']['input_trace_file']  = None
+            stomp_params['general']['output_trace_file'] = None
+            stomp_params['simulation']['sched_policy_module'] = 'policies.' + policy
+            stomp_params['simulation']['max_queue_size']      = queue_tasks
+
+            (num_queued, queue_bytes) = measure_queue_memory(stomp_params, queue_tasks)
+            stdout.write('%10s  %14s  %14s\n' % ("Tasks", "Memory (MB)", "Bytes/task"))
+            stdout.write('%10d  %14.1f  %14.1f\n' % (num_queued, queue_bytes / (1024 * 1024), queue_bytes / num_queued))
+            return
+
+        stdout.write('%10s  %10s  %12s  %14s\n' % ("Servers", "Events", "Wall (secs)", "Events/sec"))
+        for server_count in server_counts:
+
+            stomp_params = copy.deepcopy(base_params)
+            stomp_params['general']['logging_level']     = 'WARNING'
+            stomp_params['general']['working_dir']       = work_dir
+            stomp_params['general']['input_trace_file']  = None
+            stomp_params['general']['output_trace_file'] = None
+            stomp_params['simulation']['sched_policy_module'] = 'policies.' + policy
+            stomp_params['simulation']['max_tasks_simulated'] = num_tasks
+            stomp_params['simulation']['mean_arrival_time']   = MEAN_SER_TIME / (server_count * UTILIZATION)
+            stomp_params['simulation']['servers']['dummy_server']['count'] = server_count
+            stomp_params['simulation']['tasks']['dummy_task']['mean_service_time']['dummy_server']  = MEAN_SER_TIME
+            stomp_params['simulation']['tasks']['dummy_task']['stdev_service_time']['dummy_server'] = COEFF_OF_VAR * MEAN_SER_TIME
+
+            (num_events, elapsed_time) = run_stomp(stomp_params)
+            stdout.write('%10d  %10d  %12.2f  %14.1f\n' % (server_count, num_events, elapsed_time, num_events / elapsed_time))
+            sys.stdout.flush()
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+   main(sys.argv[1:])
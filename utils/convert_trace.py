@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 IBM
+#
+# This is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+#
+
+# DESCRIPTION:
+#  This script converts STOMP task traces between the text (.trc) format
+#  and the binary (.btrc) format (see TRACES.md). The format of the input
+#  trace is detected from its contents; the output trace is written in
+#  binary format if its name ends with '.btrc', and in text format otherwise.
+#
+
+
+from __future__ import print_function
+import os
+import sys
+import time
+import getopt
+from sys import stdout
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from stomp import open_task_trace, create_task_trace
+
+
+def usage_and_exit(exit_code):
+    stdout.write('\nusage: %s [--help] <input_trace> <output_trace>\n\n' % (os.path.basename(__file__)))
+    sys.exit(exit_code)
+
+
+def main(argv):
+
+    try:
+        opts, args = getopt.getopt(argv, "h", ["help"])
+    except getopt.GetoptError:
+        usage_and_exit(2)
+
+    for opt, arg in opts:
+        if opt in ("-h", "--help"):
+            usage_and_exit(0)
+
+    if (len(args) != 2):
+        usage_and_exit(3)
+    (in_trace_name, out_trace_name) = args
+
+    start_time = time.time()
+    num_tasks  = 0
+
+    in_trace  = open_task_trace(in_trace_name)
+    out_trace = create_task_trace(out_trace_name, in_trace.server_types)
+    while (in_trace):
+        (arrival_time, task_type, service_times) = in_trace.pop()
+        out_trace.write(arrival_time, task_type, service_times)
+        num_tasks += 1
+    out_trace.close()
+    in_trace.close()
+
+    elapsed_time = time.time() - start_time
+    stdout.write('%d tasks converted from %s (%d bytes) to %s (%d bytes) in %.2f secs.\n' % (num_tasks,
+                 in_trace_name, os.path.getsize(in_trace_name), out_trace_name, os.path.getsize(out_trace_name), elapsed_time))
+
+
+if __name__ == "__main__":
+   main(sys.argv[1:])
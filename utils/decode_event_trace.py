@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 IBM
+#
+# This is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+#
+
+# DESCRIPTION:
+#  This script decodes a binary per-event trace file of a STOMP run (e.g.
+#  <basename>.global.trace.bin, written with "event_trace_format": "binary")
+#  into the text layout of the corresponding text trace file. By default,
+#  the output file name is the input file name without the '.bin' extension.
+#
+
+
+from __future__ import print_function
+import os
+import sys
+import time
+import getopt
+from sys import stdout
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from stomp import open_event_trace, EVENT_TRACE_EXT
+
+BLOCK_SIZE = 65536
+
+
+def usage_and_exit(exit_code):
+    stdout.write('\nusage: %s [--help] <binary_event_trace> [<text_event_trace>]\n\n' % (os.path.basename(__file__)))
+    sys.exit(exit_code)
+
+
+def main(argv):
+
+    try:
+        opts, args = getopt.getopt(argv, "h", ["help"])
+    except getopt.GetoptError:
+        usage_and_exit(2)
+
+    for opt, arg in opts:
+        if opt in ("-h", "--help"):
+            usage_and_exit(0)
+
+    if (len(args) == 2):
+        (in_trace_name, out_trace_name) = args
+    elif (len(args) == 1 and args[0].endswith(EVENT_TRACE_EXT)):
+        in_trace_name  = args[0]
+        out_trace_name = args[0][:-len(EVENT_TRACE_EXT)]
+    else:
+        usage_and_exit(3)
+
+    start_time = time.time()
+
+    (preamble, record_format, records) = open_event_trace(in_trace_name)
+    with open(out_trace_name, 'w') as out_trace:
+        out_trace.write(preamble)
+        for start in range(0, len(records), BLOCK_SIZE):
+            out_trace.write(''.join([record_format % record for record in records[start:start+BLOCK_SIZE].tolist()]))
+
+    elapsed_time = time.time() - start_time
+    stdout.write('%d records decoded from %s to %s in %.2f secs.\n' % (len(records), in_trace_name, out_trace_name, elapsed_time))
+
+
+if __name__ == "__main__":
+   main(sys.argv[1:])
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 IBM
+#
+# This is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+#
+
+# DESCRIPTION:
+#  This script queries a STOMP result store (see the --db option of
+#  run_all.py and 'class ResultStore' in stomp_sweep.py). It prints a table
+#  of a metric, with one row per combination of the --rows dimensions and
+#  one column per value of the --columns dimension (by default, the average
+#  response time per arrival scale and stdev factor, for each policy); when
+#  several points fall in the same cell (e.g. different seeds), their mean
+#  is shown. The metric is either one of the stored main results
+#  (avg_resp_time, avg_waiting_time, tasks_serviced, total_sim_time) or any
+#  value of the results, by its flattened name (e.g. 'Task Types.fft.Avg Resp
+#  Time', as in the CSV results of stomp_main.py). The points can be filtered
+#  by any dimension; --list shows the matching points instead.
+#
+
+
+from __future__ import print_function
+from __future__ import division
+import os
+import sys
+import json
+import getopt
+from sys import stdout
+from collections import OrderedDict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from stomp import flatten_results
+from stomp_sweep import ResultStore
+
+
+def usage_and_exit(exit_code):
+    stdout.write('\nusage: %s [--help] --db=<sqlite_file> [--metric=<metric>] [--rows=<dim1,dim2,...>] [--columns=<dim>] [--list] [--csv-out]\n'
+                 '          [--policy=<policy>] [--arrival-scale=<scale>] [--mean-arrival-time=<time>] [--stdev-factor=<factor>]\n'
+                 '          [--servers=<type:count,...>] [--num-servers=<n>] [--seed=<seed>]\n'
+                 '\n  dimensions: %s\n  metrics:    %s (or a flattened results name)\n\n' % (os.path.basename(__file__),
+                 ', '.join(ResultStore.DIMENSIONS), ', '.join(ResultStore.METRICS)))
+    sys.exit(exit_code)
+
+
+def main(argv):
+
+    try:
+        opts, args = getopt.getopt(argv, "hlc", ["help", "db=", "metric=", "rows=", "columns=", "list", "csv-out", "policy=", "arrival-scale=",
+                                                 "mean-arrival-time=", "stdev-factor=", "servers=", "num-servers=", "seed="])
+    except getopt.GetoptError:
+        usage_and_exit(2)
+
+    db_file   = None
+    metric    = 'avg_resp_time'
+    rows      = ['arrival_scale', 'stdev_factor']
+    column    = 'policy'
+    do_list   = False
+    out_sep   = '\t'
+    filters   = OrderedDict()
+
+    for opt, arg in opts:
+        if opt in ("-h", "--help"):
+            usage_and_exit(0)
+        elif opt == "--db":
+            db_file = arg
+        elif opt == "--metric":
+            metric = arg
+        elif opt == "--rows":
+            rows = arg.split(',')
+        elif opt == "--columns":
+            column = arg
+        elif opt in ("-l", "--list"):
+            do_list = True
+        elif opt in ("-c", "--csv-out"):
+            out_sep = ','
+        elif opt == "--policy":
+            filters['policy'] = arg
+        elif opt == "--arrival-scale":
+            filters['arrival_scale'] = float(arg)
+        elif opt == "--mean-arrival-time":
+            filters['mean_arrival_time'] = float(arg)
+        elif opt == "--stdev-factor":
+            filters['stdev_factor'] = float(arg)
+        elif opt == "--servers":
+            filters['server_counts'] = ','.join(sorted(arg.split(',')))
+        elif opt == "--num-servers":
+            filters['num_servers'] = int(arg)
+        elif opt == "--seed":
+            filters['seed'] = int(arg)
+
+    if (not db_file or not os.path.exists(db_file)):
+        stdout.write('\nERROR: A result store (--db) is required\n')
+        usage_and_exit(3)
+    for dim in rows + [column]:
+        if (dim not in ResultStore.DIMENSIONS):
+            stdout.write('\nERROR: Unknown dimension %s\n' % (dim))
+            usage_and_exit(4)
+
+    store = ResultStore(db_file)
+
+    if (do_list):
+        columns = ResultStore.DIMENSIONS + ResultStore.METRICS + ['input_trace', 'created']
+        stdout.write('%s\n' % (out_sep.join(columns)))
+        for row in store.query(columns, filters):
+            stdout.write('%s\n' % (out_sep.join([str(value) for value in row])))
+        store.close()
+        return
+
+    # Metric values per (row, column) cell
+    if (metric in ResultStore.METRICS):
+        points = [(row[:-1], row[-1]) for row in store.query(rows + [column, metric], filters)]
+    else:
+        points = []
+        for row in store.query(rows + [column, 'results'], filters):
+            flat = flatten_results(json.loads(row[-1]))
+            if (metric not in flat):
+                stdout.write('\nERROR: Unknown metric %s\n' % (metric))
+                usage_and_exit(5)
+            points.append((row[:-1], flat[metric]))
+    store.close()
+
+    cells        = OrderedDict()
+    column_names = []
+    for (dims, value) in points:
+        (row_dims, column_name) = (tuple(dims[:-1]), dims[-1])
+        if (column_name not in column_names):
+            column_names.append(column_name)
+        cells.setdefault(row_dims, {}).setdefault(column_name, []).append(value)
+
+    stdout.write('%s\n' % (out_sep.join(rows + [str(name) for name in column_names])))
+    for row_dims in sorted(cells):
+        values = []
+        for column_name in column_names:
+            cell = [value for value in cells[row_dims].get(column_name, []) if (value is not None)]
+            values.append(('%.4f' % (sum(cell) / len(cell))) if (cell) else '-')
+        stdout.write('%s\n' % (out_sep.join([str(dim) for dim in row_dims] + values)))
+
+
+if __name__ == "__main__":
+   main(sys.argv[1:])
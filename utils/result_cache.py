@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 IBM
+#
+# This is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+#
+
+# DESCRIPTION:
+#  This script inspects and prunes a STOMP result cache (see the --cache
+#  option of run_all.py and 'class ResultCache' in stomp_sweep.py). By
+#  default, it shows the number of entries and the total size of the cache;
+#  --list shows every entry (least recently used first). --prune removes the
+#  entries selected by --policy and/or --older-than (all of them if neither
+#  is given), or, with --max-size, the least recently used entries until the
+#  cache is no larger than the given size.
+#
+
+
+from __future__ import print_function
+import os
+import sys
+import time
+import getopt
+from sys import stdout
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from stomp_sweep import ResultCache
+
+
+def usage_and_exit(exit_code):
+    stdout.write('\nusage: %s [--help] [--cache=<dir>] [--list] [--prune] [--policy=<policy>] [--older-than=<days>] [--max-size=<MB>]\n\n' % (os.path.basename(__file__)))
+    sys.exit(exit_code)
+
+
+def main(argv):
+
+    try:
+        opts, args = getopt.getopt(argv, "hlp", ["help", "cache=", "list", "prune", "policy=", "older-than=", "max-size="])
+    except getopt.GetoptError:
+        usage_and_exit(2)
+
+    cache_dir  = '.stomp_cache'
+    do_list    = False
+    do_prune   = False
+    policy     = None
+    older_than = None
+    max_size   = None
+
+    for opt, arg in opts:
+        if opt in ("-h", "--help"):
+            usage_and_exit(0)
+        elif opt == "--cache":
+            cache_dir = arg
+        elif opt in ("-l", "--list"):
+            do_list = True
+        elif opt in ("-p", "--prune"):
+            do_prune = True
+        elif opt == "--policy":
+            policy = arg
+        elif opt == "--older-than":
+            older_than = float(arg)
+        elif opt == "--max-size":
+            max_size = int(float(arg) * 1024 * 1024)
+
+    if (not os.path.isdir(cache_dir)):
+        stdout.write('\nERROR: No result cache in %s\n' % (cache_dir))
+        usage_and_exit(3)
+    cache = ResultCache(cache_dir)
+
+    if (do_list):
+        stdout.write('%-19s  %10s  %-12s  %-28s  %6s  %8s  %12s  %s\n' % ('Last used', 'Size', 'Key', 'Policy', 'Seed', 'Tasks', 'Resp Time', 'Input trace'))
+        for (entry_file, size, last_used) in cache.entries():
+            entry   = cache.load(entry_file)
+            results = entry['results']
+            stdout.write('%-19s  %10d  %-12s  %-28s  %6s  %8d  %12.4f  %s\n' % (time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(last_used)), size,
+                                                                              entry['key'][:12], entry['policy'], entry['seed'],
+                                                                              results['Tasks Serviced'], results['Avg Resp Time'],
+                                                                              entry['input_trace'][1] if entry['input_trace'] else '-'))
+
+    if (do_prune):
+        if (max_size is not None):
+            removed = cache.evict(max_size)
+        else:
+            removed = []
+            for (entry_file, size, last_used) in cache.entries():
+                if (older_than is not None and last_used > time.time() - older_than * 24 * 3600):
+                    continue
+                if (policy is not None and cache.load(entry_file)['policy'].split('.')[-1] != policy.split('.')[-1]):
+                    continue
+                os.remove(entry_file)
+                removed.append((entry_file, size, last_used))
+        stdout.write('%d entries (%d bytes) removed\n' % (len(removed), sum([size for (entry_file, size, last_used) in removed])))
+
+    entries = cache.entries()
+    stdout.write('%d entries, %d bytes in %s\n' % (len(entries), sum([size for (entry_file, size, last_used) in entries]), cache_dir))
+
+
+if __name__ == "__main__":
+   main(sys.argv[1:])
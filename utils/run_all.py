@@ -25,22 +25,27 @@
 #  This script also supports the output of the results in a "CSV"
 #   format, automatically converting the outputs to be comma-separated
 #   and to be written into files ending in .csv
+#  The simulations are run in-process, on a pool of worker processes
+#   (one per core by default, see stomp_sweep.py), the longest first.
 #
 
 
 
 from __future__ import print_function
 import os
-import subprocess
 import json
 import time
 import sys
 import getopt
+import shutil
 from sys import stdout
-from subprocess import check_output
 from collections import defaultdict
 from __builtin__ import str
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from stomp import write_results
+from stomp_sweep import SweepPoint, ResultCache, ResultStore, run_sweep
+
 
 CONF_FILE    = './stomp.json'
 POLICY       = ['simple_policy_ver1', 'simple_policy_ver2', 'simple_policy_ver3', 'simple_policy_ver4', 'simple_policy_ver5']
@@ -54,7 +59,7 @@ ARRIVE_SCALE = [ 1.0, 1.50, 2.0]  # percentages
 
 
 def usage_and_exit(exit_code):
-    stdout.write('\nusage: run_all.py [--help] [--verbose] [--csv-out] [--save-stdout] [--pre-gen-tasks] [--arrival-trace] [--input-trace] [--user-input-trace]\n\n')
+    stdout.write('\nusage: run_all.py [--help] [--verbose] [--csv-out] [--save-stdout] [--pre-gen-tasks] [--arrival-trace] [--input-trace] [--user-input-trace] [--workers=<n>] [--cache=<dir>] [--cache-size=<MB>] [--db=<sqlite_file>] [--event-trace] [--no-event-trace]\n\n')
     sys.exit(exit_code)
 
 
@@ -62,7 +67,7 @@ def usage_and_exit(exit_code):
 def main(argv):
 
     try:
-        opts, args = getopt.getopt(argv,"hvcspaiu",["help", "verbose", "csv-out", "save-stdout", "pre-gen-tasks", "arrival-trace", "input-trace", "user-input-trace"])
+        opts, args = getopt.getopt(argv,"hvcspaiuw:",["help", "verbose", "csv-out", "save-stdout", "pre-gen-tasks", "arrival-trace", "input-trace", "user-input-trace", "workers=", "cache=", "cache-size=", "db=", "event-trace", "no-event-trace"])
     except getopt.GetoptError:
         usage_and_exit(2)
 
@@ -74,6 +79,11 @@ def main(argv):
     use_user_input_trace  = False
     do_csv_output         = False
     out_sep               = '\t'
+    workers               = None  # One per core
+    cache_dir             = None  # No result cache
+    cache_size            = ResultCache.DEFAULT_SIZE
+    db_file               = None  # No result store
+    event_trace           = None  # As in CONF_FILE, but off with a result cache or store
 
     for opt, arg in opts:
         if opt in ("-h", "--help"):
@@ -93,6 +103,18 @@ def main(argv):
             use_input_trace = True
         elif opt in ("-u", "--user-input-trace"):
             use_user_input_trace = True
+        elif opt in ("-w", "--workers"):
+            workers = int(arg)
+        elif opt == "--cache":
+            cache_dir = arg
+        elif opt == "--cache-size":
+            cache_size = int(float(arg) * 1024 * 1024)
+        elif opt == "--db":
+            db_file = arg
+        elif opt == "--event-trace":
+            event_trace = True
+        elif opt == "--no-event-trace":
+            event_trace = False
         else:
             stdout.write('\nERROR: Unrecognized input parameter %s\n' % opt)
             usage_and_exit(3)
@@ -129,10 +151,20 @@ def main(argv):
         stomp_params = json.load(conf_file)
 
     stomp_params['general']['working_dir'] = os.getcwd() + '/' + sim_dir
+    if (event_trace is None):
+        # The simulations that write event trace files are never taken from
+        # the result cache or store, so they are off with one unless asked for
+        event_trace = (cache_dir is None and db_file is None)
+    if (not event_trace):
+        stomp_params['general']['event_trace'] = 'off'
+    if ((cache_dir or db_file) and stomp_params['general']['event_trace'] != 'off'):
+        stdout.write('WARNING: The simulations write event trace files, so they are not taken from the result cache or database (see --no-event-trace)\n')
 
 
     ###############################################################################################
-    # MAIN LOOP
+    # MAIN LOOP: set up one sweep point per configuration
+    trace_points = []  # Points that generate the traces used by other points
+    points       = []
     for arr_scale in ARRIVE_SCALE:
 
         sim_output[arr_scale] = {}
@@ -159,84 +191,70 @@ def main(argv):
                         stdev_service_time = (stdev_factor*mean_service_time)
                         stomp_params['simulation']['tasks'][task]['stdev_service_time'][server] = stdev_service_time
 
+                # The points run concurrently, so each one needs its own trace files
                 stomp_params['general']['basename'] = 'policy:' + policy \
+                                                + '__arr_scale:' + str(arr_scale) \
                                                 + '__stdev_factor:' + str(stdev_factor)
-                conf_str = json.dumps(stomp_params)
 
                 ###########################################################################################
-                # Create command and execute the simulation
-
-                command = ['./stomp_main.py'                       
-                           + ' -j \'' + conf_str + '\''
-                           ]
-
-                command_str = ' '.join(command)
+                # Set up the traces of the simulation
 
-                if (pre_gen_tasks):
-                    command_str = command_str + ' -p'
+                input_trace_file  = None
+                output_trace_file = None
 
                 if (use_arrival_trace):
+                    trace_name = 'generated_arrival_trace_arr_' + str(arr_scale) + '.trc'
                     if (policy == POLICY[0]) and (stdev_factor == STDEV_FACTOR[0]):
-                        command_str = command_str + ' -g generated_arrival_trace.trc'
+                        output_trace_file = trace_name
                     else:
-                        command_str = command_str + ' -a generated_arrival_trace.trc'
+                        input_trace_file = (True, trace_name)
 
                 if (use_input_trace):
+                    trace_name = 'generated_trace_arr_' + str(arr_scale) + '_stdf_' + str(stdev_factor) + '.trc'
                     if (policy == POLICY[0]):
-                        command_str = command_str + ' -g generated_trace_stdf_' + str(stdev_factor) + '.trc'
+                        output_trace_file = trace_name
                     else:
-                        command_str = command_str + ' -i generated_trace_stdf_' + str(stdev_factor) + '.trc'
+                        input_trace_file = (False, trace_name)
 
                 if (use_user_input_trace):
-                    command_str = command_str + ' -i ../user_traces/user_gen_trace_stdf_' + str(stdev_factor) + '.trc'
-
-                if (verbose):
-                    print('Running', command_str)
-
-                sys.stdout.flush()
-                output = subprocess.check_output(command_str, stderr=subprocess.STDOUT, shell=True)
+                    input_trace_file = (False, '../user_traces/user_gen_trace_stdf_' + str(stdev_factor) + '.trc')
 
+                log_file = None
                 if (save_stdout):
-                    fh = open(sim_dir + '/run_stdout_' + policy + "_arr_" + str(arr_scale) + '_stdvf_' + str(stdev_factor) + '.out', 'w')
+                    log_file = sim_dir + '/run_stdout_' + policy + "_arr_" + str(arr_scale) + '_stdvf_' + str(stdev_factor) + '.out'
 
-                ###########################################################################################
-                # Parse the output line by line
-                output_list = output.splitlines()
-                i = 0
-                for i in range(len(output_list)):
-                    if (save_stdout):
-                        fh.write('%s\n' % (output_list[i]))
-                    if output_list[i].strip() == "Response time (avg):":
-                        line = output_list[i+1].strip()
-                        (key, value) = line.split(':')
-                        sim_output[arr_scale][policy][stdev_factor]['avg_resp_time_global'][key.strip()] = value.strip().split(' ')[0]
-                        for j in range(i+1, len(output_list)):
-                            line = output_list[j]
-                            if not line.strip():
-                                break
-                            (key, value) = line.split(':')
-                            sim_output[arr_scale][policy][stdev_factor]['avg_resp_time'][key.strip()] = value.strip()
-                            #sys.stdout.write('Set sim_output[%s][%s][%s][%s][%s] = %s\n' % (arr_scale, policy, stdev_factor, 'avg_resp_time', key.strip(), value.strip()))
-                    elif output_list[i].strip() == "Waiting time (avg):":
-                        line = output_list[i+1].strip()
-                        (key, value) = line.split(':')
-                        sim_output[arr_scale][policy][stdev_factor]['avg_wait_time_global'][key.strip()] = value.strip().split(' ')[0]
-                    elif output_list[i].strip() == "Histograms:":
-                        line = output_list[i+1]
-                        histogram = line.split(':')[1]
-                        sim_output[arr_scale][policy][stdev_factor]['queue_size_hist'] = histogram.strip()
-
-                    elif "Total simulation time:" in output_list[i].strip():
-                        elems = output_list[i].split(":")
-                        #stdout.write('HERE: %s : %s : %s\n' % (str(policy), str(stdev_factor), elems[1]))
-                        #stdout.write('%s\n' % (output_list[i].strip()))
-                        #sys.stdout.flush()
-                        sim_output[arr_scale][policy][stdev_factor]['total_sim_time'] = elems[1]
+                point = SweepPoint((arr_scale, policy, stdev_factor), stomp_params, input_trace_file, output_trace_file,
+                                   pre_gen_tasks, log_file=log_file)
+                if (output_trace_file):
+                    trace_points.append(point)
+                else:
+                    points.append(point)
 
-                if (save_stdout):
-                    fh.close()
-                num_executions += 1
-                time.sleep(1)
+
+    ###############################################################################################
+    # Run the simulations (first those that generate traces)
+
+    cache = ResultCache(cache_dir, cache_size) if (cache_dir) else None
+    store = ResultStore(db_file) if (db_file) else None
+
+    def point_done(point, results):
+        (arr_scale, policy, stdev_factor) = point.key
+        write_results(results, sim_dir + '/results_' + policy + "_arr_" + str(arr_scale) + '_stdvf_' + str(stdev_factor) + '.json')
+        if (verbose):
+            print('Finished', policy, 'arrival scale', arr_scale, 'stdev factor', stdev_factor)
+            sys.stdout.flush()
+
+    for sweep_points in [trace_points, points]:
+        for ((arr_scale, policy, stdev_factor), results) in run_sweep(sweep_points, workers, point_done, cache, store).items():
+            sim_output[arr_scale][policy][stdev_factor]['avg_resp_time_global']['global'] = '%.4f' % (results['Avg Resp Time'])
+            sim_output[arr_scale][policy][stdev_factor]['avg_resp_time']['global'] = '%.4f over %8d tasks' % (results['Avg Resp Time'], results['Tasks Serviced'])
+            for task, task_results in results['Task Types'].items():
+                sim_output[arr_scale][policy][stdev_factor]['avg_resp_time'][task] = '%.4f over %8d tasks' % (task_results['Avg Resp Time'], task_results['Tasks Serviced'])
+            sim_output[arr_scale][policy][stdev_factor]['avg_wait_time_global']['global'] = '%.8f' % (results['Avg Waiting Time'])
+            histogram = results['Queue Size Histogram']
+            sim_output[arr_scale][policy][stdev_factor]['queue_size_hist'] = 'bin_size, %d , max_In_Queue, %d , %s' % (histogram['Bin Size'], histogram['Max Queue Size'], ', '.join(map(str, histogram['Time'])))
+            sim_output[arr_scale][policy][stdev_factor]['total_sim_time'] = str(results['Total Simulation Time'])
+            num_executions += 1
 
 
     ###############################################################################################
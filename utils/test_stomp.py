@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 IBM
+#
+# This is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+#
+
+# DESCRIPTION:
+#  This script checks some of the STOMP building blocks on synthetic data,
+#  without running whole simulations: the MSER warm-up detection (see
+#  'class WarmupDetector' in stomp.py), the conversion of task traces
+#  between the text and binary formats (see TRACES.md) and the accuracy of
+#  the quantile sketches (see 'class QuantileSketch'). It reports every
+#  check, and exits with a non-zero status if any of them fails.
+#
+
+
+from __future__ import print_function
+from __future__ import division
+import os
+import sys
+import json
+import struct
+import shutil
+import getopt
+import filecmp
+import tempfile
+import numpy
+from sys import stdout
+
+STOMP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, STOMP_DIR)
+from stomp import WarmupDetector, QuantileSketch, open_task_trace, create_task_trace, BINARY_TRACE_MAGIC
+
+SEEDS = range(5)
+
+
+def usage_and_exit(exit_code):
+    stdout.write('\nusage: %s [--help] [--verbose] [--test=<name>]\n\n' % (os.path.basename(__file__)))
+    stdout.write('tests: %s\n\n' % (', '.join([name for (name, test) in TESTS])))
+    sys.exit(exit_code)
+
+
+class Checker:
+
+    def __init__(self, verbose):
+
+        self.verbose  = verbose
+        self.checks   = 0
+        self.failures = 0
+
+
+    def check(self, ok, message):
+
+        self.checks += 1
+        if (not ok):
+            self.failures += 1
+        if (self.verbose or not ok):
+            stdout.write('  %s: %s\n' % ('PASS' if (ok) else 'FAIL', message))
+
+
+def detect_warmup(values, batch_size=5):
+
+    # Feeds the values to a WarmupDetector as a simulation would, with a last
+    # check at the end; returns the cutoff (None if not detected)
+    detector = WarmupDetector(batch_size)
+    for value in values:
+        if (detector.add(value)):
+            return detector.cutoff
+    return detector.cutoff if (detector.detect()) else None
+
+
+def test_warmup(checker):
+
+    for seed in SEEDS:
+        stream = numpy.random.RandomState(seed)
+
+        # A linear transient over the first 400 values, then a stationary
+        # stream: the cutoff must be close to the end of the transient
+        transient = numpy.concatenate([numpy.linspace(0, 100, 400), numpy.full(20000, 100.0)]) + stream.normal(0, 10, 20400)
+        cutoff    = detect_warmup(transient)
+        checker.check(cutoff is not None and 300 <= cutoff <= 500, 'seed %d: transient of 400 values, cutoff %s' % (seed, cutoff))
+
+        # A ramp (e.g. a queue that grows without bound) has no steady state
+        ramp   = numpy.arange(20000) * 0.05 + stream.normal(0, 10, 20000)
+        cutoff = detect_warmup(ramp)
+        checker.check(cutoff is None, 'seed %d: ramp, cutoff %s' % (seed, cutoff))
+
+        # A stationary stream has (almost) no warm-up
+        stationary = stream.exponential(100, 20000)
+        cutoff     = detect_warmup(stationary)
+        checker.check(cutoff is not None and cutoff <= 100, 'seed %d: stationary stream, cutoff %s' % (seed, cutoff))
+
+
+def convert_trace(in_trace_name, out_trace_name):
+
+    # As utils/convert_trace.py
+    in_trace  = open_task_trace(in_trace_name)
+    out_trace = create_task_trace(out_trace_name, in_trace.server_types)
+    while (in_trace):
+        (arrival_time, task_type, service_times) = in_trace.pop()
+        out_trace.write(arrival_time, task_type, service_times)
+    out_trace.close()
+    in_trace.close()
+
+
+def write_v1_trace(file_name, server_types, entries):
+
+    # Binary trace in the layout of earlier versions: no column types in the
+    # header, absolute int64 arrival times, int16 task codes and float64
+    # service times (NaN where a task cannot run)
+    task_types = []
+    for (arrival_time, task_type, service_times) in entries:
+        if not task_type in task_types:
+            task_types.append(task_type)
+    header = json.dumps({'server_types': server_types, 'task_types': task_types, 'num_tasks': len(entries)})
+    header += ' ' * ((8 - (len(BINARY_TRACE_MAGIC) + 8 + len(header)) % 8) % 8)
+    columns = [numpy.array([arrival_time for (arrival_time, task_type, service_times) in entries], dtype='<i8'),
+               numpy.array([task_types.index(task_type) for (arrival_time, task_type, service_times) in entries], dtype='<i2'),
+               numpy.array([[float("nan") if (st is None) else st for st in service_times] for (arrival_time, task_type, service_times) in entries], dtype='<f8')]
+    with open(file_name, 'wb') as trace_file:
+        trace_file.write(BINARY_TRACE_MAGIC)
+        trace_file.write(struct.pack('<Q', len(header)))
+        trace_file.write(header)
+        for column in columns:
+            data = column.tostring()
+            trace_file.write(data + '\0' * ((8 - len(data) % 8) % 8))
+
+
+def same_text(file_name_a, file_name_b):
+
+    # Same lines, whatever the line endings
+    with open(file_name_a) as file_a:
+        with open(file_name_b) as file_b:
+            return [line.rstrip('\r\n') for line in file_a] == [line.rstrip('\r\n') for line in file_b]
+
+
+def test_trace(checker):
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        # Synthetic traces, written by STOMP: with tasks that cannot run on
+        # some server types, simultaneous arrivals, arrival gaps and service
+        # times that need 64-bit values, and no tasks at all
+        server_types = ['cpu_core', 'gpu', 'fft_accel']
+        stream       = numpy.random.RandomState(0)
+        traces       = []
+        for (name, num_tasks, max_gap, max_service) in [('small', 1000, 100, 100), ('wide', 1000, 2**40, 2**40), ('empty', 0, 1, 1)]:
+            entries      = []
+            arrival_time = 0
+            for i in range(num_tasks):
+                arrival_time += int(stream.randint(0, 3) * stream.randint(0, max_gap))
+                task_type     = ['fft', 'decoder', 'cnn'][stream.randint(3)]
+                service_times = [None if (stream.rand() < 0.2) else int(stream.randint(1, max_service)) for server_type in server_types]
+                entries.append((arrival_time, task_type, service_times))
+            text_name  = os.path.join(work_dir, name + '.trc')
+            text_trace = create_task_trace(text_name, server_types)
+            for entry in entries:
+                text_trace.write(*entry)
+            text_trace.close()
+            traces.append((name, text_name, entries))
+
+        for (name, text_name, entries) in traces:
+            # .trc -> .btrc -> .trc gives back the same file
+            binary_name = os.path.join(work_dir, name + '.btrc')
+            back_name   = os.path.join(work_dir, name + '.back.trc')
+            convert_trace(text_name, binary_name)
+            convert_trace(binary_name, back_name)
+            checker.check(filecmp.cmp(text_name, back_name, shallow=False), '%s trace: .trc -> .btrc -> .trc is identical' % (name))
+            checker.check(os.path.getsize(binary_name) <= max(os.path.getsize(text_name), 256), '%s trace: .btrc (%d bytes) not larger than .trc (%d bytes)' % (name, os.path.getsize(binary_name), os.path.getsize(text_name)))
+
+            # Binary traces in the layout of earlier versions are still read
+            v1_name      = os.path.join(work_dir, name + '.v1.btrc')
+            v1_back_name = os.path.join(work_dir, name + '.v1.trc')
+            write_v1_trace(v1_name, server_types, entries)
+            convert_trace(v1_name, v1_back_name)
+            checker.check(filecmp.cmp(text_name, v1_back_name, shallow=False), '%s trace: earlier .btrc layout -> .trc is identical' % (name))
+
+        # The bundled user traces (with DOS line endings)
+        trace_dir = os.path.join(STOMP_DIR, 'user_traces')
+        for name in sorted(os.listdir(trace_dir)):
+            if (name.endswith('.trc')):
+                binary_name = os.path.join(work_dir, 'user.btrc')
+                back_name   = os.path.join(work_dir, 'user.trc')
+                convert_trace(os.path.join(trace_dir, name), binary_name)
+                convert_trace(binary_name, back_name)
+                checker.check(same_text(os.path.join(trace_dir, name), back_name), '%s: .trc -> .btrc -> .trc has the same lines' % (name))
+    finally:
+        shutil.rmtree(work_dir)
+
+
+def test_sketch(checker):
+
+    # Relative error, maximum number of bins and the quantiles whose error is
+    # bounded: with too few bins for the range of the values, the lowest bins
+    # are collapsed, so only the lowest quantiles lose their accuracy
+    for (relative_error, max_bins, quantiles) in [(0.01,  2048,  [0.01, 0.1, 0.5, 0.9, 0.95, 0.99, 0.999]),
+                                                  (0.001, 16384, [0.01, 0.1, 0.5, 0.9, 0.95, 0.99, 0.999]),
+                                                  (0.001, 4096,  [0.9, 0.95, 0.99, 0.999])]:
+        for seed in SEEDS:
+            # Integer times (e.g. response times) of a heavy-tailed distribution,
+            # with some zeros, split over 8 sketches (e.g. per server) that are
+            # merged as STOMP merges them (per server type, and global)
+            stream   = numpy.random.RandomState(seed)
+            values   = numpy.round(stream.lognormal(5, 2, 100000)).astype(int)
+            sketches = [QuantileSketch(relative_error, max_bins) for i in range(8)]
+            for (value, server) in zip(values, stream.randint(8, size=len(values))):
+                sketches[server].add(value)
+            merged = QuantileSketch.merged([QuantileSketch.merged(sketches[:3], relative_error, max_bins),
+                                            QuantileSketch.merged(sketches[3:], relative_error, max_bins)], relative_error, max_bins)
+            values.sort()
+            worst = 0.0
+            for q in quantiles:
+                # The sketch estimates the value of rank q * (count - 1)
+                exact = values[int(q * (len(values) - 1))]
+                error = abs(merged.quantile(q) - exact) / exact if (exact > 0) else abs(merged.quantile(q))
+                worst = max(worst, error)
+            checker.check(merged.count == len(values) and worst <= relative_error * (1 + 1e-9),
+                          'relative error %g, %d bins, seed %d: worst error %.5f of quantiles %s to %s after merging' % (relative_error, max_bins, seed, worst,
+                                                                                                                      quantiles[0], quantiles[-1]))
+
+
+TESTS = [('warmup', test_warmup),
+         ('trace',  test_trace),
+         ('sketch', test_sketch)]
+
+
+def main(argv):
+
+    try:
+        opts, args = getopt.getopt(argv, "hvt:", ["help", "verbose", "test="])
+    except getopt.GetoptError:
+        usage_and_exit(2)
+
+    verbose = False
+    tests   = [name for (name, test) in TESTS]  # All of them
+
+    for opt, arg in opts:
+        if opt in ("-h", "--help"):
+            usage_and_exit(0)
+        elif opt in ("-v", "--verbose"):
+            verbose = True
+        elif opt in ("-t", "--test"):
+            if not arg in dict(TESTS):
+                stdout.write('\nERROR: Unknown test %s\n' % arg)
+                usage_and_exit(3)
+            tests = [arg]
+
+    checker = Checker(verbose)
+    for (name, test) in TESTS:
+        if (name in tests):
+            stdout.write('%s:\n' % (name))
+            test(checker)
+
+    stdout.write('%d checks, %d failed\n' % (checker.checks, checker.failures))
+    sys.exit(1 if (checker.failures) else 0)
+
+
+if __name__ == "__main__":
+   main(sys.argv[1:])
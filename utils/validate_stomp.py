@@ -31,15 +31,18 @@ from __future__ import division
 from __builtin__ import str, True
 import math
 import os
-import subprocess
 import json
 import time
 import sys
 import getopt
+import shutil
 from sys import stdout
-from subprocess import check_output
 from collections import defaultdict
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from stomp import write_results
+from stomp_sweep import SweepPoint, ResultCache, ResultStore, run_sweep
+
 
 CONF_FILE      = 'utils/stomp_validation.json'
 POLICY         = [ 'simple_policy_ver2' ]
@@ -57,7 +60,7 @@ SERVER_COUNT   = [ 3 ]
 
 def usage_and_exit(exit_code):
     #stdout.write('\nusage: run_all.py [--help] [--verbose] [--csv-out] [--save-stdout] [--pre-gen-tasks] [--arrival-trace] [--input-trace] [--user-input-trace]\n\n')
-    stdout.write('\nusage: %s [--help] [--verbose]\n\n' % (os.path.basename(__file__)))
+    stdout.write('\nusage: %s [--help] [--verbose] [--workers=<n>] [--cache=<dir>] [--cache-size=<MB>] [--db=<sqlite_file>] [--event-trace] [--no-event-trace] [--ci-target=<rel_half_width>] [--max-tasks=<n>]\n\n' % (os.path.basename(__file__)))
     sys.exit(exit_code)
 
 
@@ -66,12 +69,19 @@ def main(argv):
 
     try:
         #opts, args = getopt.getopt(argv,"hvcspaiu",["help", "verbose", "csv-out", "save-stdout", "pre-gen-tasks", "arrival-trace", "input-trace", "user-input-trace"])
-        opts, args = getopt.getopt(argv, "hv", ["help", "verbose"])
+        opts, args = getopt.getopt(argv, "hvw:", ["help", "verbose", "workers=", "cache=", "cache-size=", "db=", "event-trace", "no-event-trace", "ci-target=", "max-tasks="])
     except getopt.GetoptError:
         usage_and_exit(2)
 
     verbose               = False
     save_stdout           = False
+    workers               = None  # One per core
+    cache_dir             = None  # No result cache
+    cache_size            = ResultCache.DEFAULT_SIZE
+    db_file               = None  # No result store
+    event_trace           = None  # As in CONF_FILE, but off with a result cache or store
+    ci_target             = None  # Simulate max_tasks_simulated tasks
+    max_tasks             = None  # As in CONF_FILE
     #pre_gen_tasks         = False
     #use_arrival_trace     = False
     #use_input_trace       = False
@@ -84,6 +94,22 @@ def main(argv):
             usage_and_exit(0)
         elif opt in ("-v", "--verbose"):
             verbose = True
+        elif opt in ("-w", "--workers"):
+            workers = int(arg)
+        elif opt == "--cache":
+            cache_dir = arg
+        elif opt == "--cache-size":
+            cache_size = int(float(arg) * 1024 * 1024)
+        elif opt == "--db":
+            db_file = arg
+        elif opt == "--event-trace":
+            event_trace = True
+        elif opt == "--no-event-trace":
+            event_trace = False
+        elif opt == "--ci-target":
+            ci_target = float(arg)
+        elif opt == "--max-tasks":
+            max_tasks = int(arg)
         #elif opt in ("-c", "--csv-out"):
         #    do_csv_output = True
         #    out_sep = ','
@@ -132,12 +158,25 @@ def main(argv):
         stomp_params = json.load(conf_file)
 
     stomp_params['general']['working_dir'] = os.getcwd() + '/' + sim_dir
+    if (event_trace is None):
+        # The simulations that write event trace files are never taken from
+        # the result cache or store, so they are off with one unless asked for
+        event_trace = (cache_dir is None and db_file is None)
+    if (not event_trace):
+        stomp_params['general']['event_trace'] = 'off'
+    if ((cache_dir or db_file) and stomp_params['general']['event_trace'] != 'off'):
+        stdout.write('WARNING: The simulations write event trace files, so they are not taken from the result cache or database (see --no-event-trace)\n')
+    if (ci_target is not None):
+        stomp_params['simulation']['ci_target'] = ci_target
+    if (max_tasks is not None):
+        stomp_params['simulation']['max_tasks_simulated'] = max_tasks
 
 
     ###############################################################################################
-    # MAIN LOOP
+    # MAIN LOOP: set up one sweep point per configuration
 
     first_time = True
+    points     = []
 
     for mean_arr_time in MEAN_ARR_TIME:
 
@@ -173,99 +212,71 @@ def main(argv):
                                                             + '__cv:'    + str(coeff_of_var) \
                                                             + '__serv:'  + str(server_count)
 
-                        conf_str = json.dumps(stomp_params)
-        
-                        ###########################################################################################
-                        # Create command and execute the simulation
-        
-                        command = ['./stomp_main.py'
-                                   + ' -c ' + CONF_FILE                      
-                                   + ' -j \'' + conf_str + '\''
-                                   ]
-        
-                        command_str = ' '.join(command)
-        
-                        #if (pre_gen_tasks):
-                        #    command_str = command_str + ' -p'
-                        #
-                        #if (use_arrival_trace):
-                        #    if (policy == POLICY[0]) and (stdev_factor == STDEV_FACTOR[0]):
-                        #        command_str = command_str + ' -g generated_arrival_trace.trc'
-                        #    else:
-                        #        command_str = command_str + ' -a generated_arrival_trace.trc'
-                        # 
-                        #if (use_input_trace):
-                        #    if (policy == POLICY[0]):
-                        #        command_str = command_str + ' -g generated_trace_stdf_' + str(stdev_factor) + '.trc'
-                        #    else:
-                        #        command_str = command_str + ' -i generated_trace_stdf_' + str(stdev_factor) + '.trc'
-                        # 
-                        #if (use_user_input_trace):
-                        #    command_str = command_str + ' -i ../user_traces/user_gen_trace_stdf_' + str(stdev_factor) + '.trc'
-
-                        if (verbose):
-                            print('Running', command_str)
-        
-                        sys.stdout.flush()
-                        output = subprocess.check_output(command_str, stderr=subprocess.STDOUT, shell=True)
-        
+                        log_file = None
                         if (save_stdout):
-                            fh = open(sim_dir + '/run_stdout_' + policy + '_arr_' + str(mean_arr_time) + '_mean_' + str(mean_ser_time)
-                                      + '_cv_' + str(coeff_of_var) + '_serv_' + str(server_count) + '.out', 'w')
-        
-                        ###########################################################################################
-                        # Parse the output line by line
-                        output_list = output.splitlines()
-                        i = 0
-                        for i in range(len(output_list)):
-                            
-                            if (save_stdout):
-                                fh.write('%s\n' % (output_list[i]))
-
-                            if output_list[i].strip() == "Busy time and Utilization:":
-                                avg_util = 0.0
-                                for j in range(server_count):
-                                    line = output_list[i+2+j].strip()
-                                    avg_util = avg_util + float(line.split()[-1]) / 100.0
-                                avg_util = avg_util / server_count
-                                stdout.write('%.4f\n' % (avg_util))
-                                
-                            if output_list[i].strip() == "Waiting time (avg):":
-                                line = output_list[i+1].strip()
-                                (key, value) = line.split(':')
-                                simulated_waiting_time = value.strip().split(' ')[0]
-                                
-                                # We model the waiting time using the
-                                # closed-formed expression of M/G/k queues
-                                lamb  = 1 / mean_arr_time
-                                mu    = 1 / mean_ser_time
-                                rho   = lamb / mu
-                                
-                                tmp   = rho / server_count
-                                scv   = coeff_of_var**2
-                                stdev = coeff_of_var * mean_ser_time
-                                var   = stdev**2
-                                
-                                if (tmp >= 1.0):
-                                    stdout.write('WARNING: rho/c = %.2f >= 1.0! Skipping...\n' % (tmp))
-                                
-                                else:
-                                    modeled_waiting_time_1 = compute_waiting_time_MGk(scv, server_count, lamb, mu)
-                                    error = 100.0 * abs(float(simulated_waiting_time)-modeled_waiting_time_1) / modeled_waiting_time_1
-                                    
-                                    modeled_waiting_time_2 = -1.0
-                                    if (server_count == 1):
-                                        modeled_waiting_time_2 = compute_waiting_time_MG1(lamb, mu, mean_ser_time, var)
-                                    
-                                    if (first_time):
-                                        first_time = False
-                                        stdout.write('Policy\tArr Time (mean)\tServ Time (mean)\tCV\tServers\tSimulated Wait Time\tError (%)\tModeled Wait Time 1\tModeled Wait Time 2\trho/c\tSCV\tSimulated Utilization\n')
-                                    stdout.write('%s\t%.4f\t%.4f\t%.4f\t%d\t%s\t%.4f\t%.4f\t%.4f\t%.4f\t%.4f\t' % (policy, mean_arr_time, mean_ser_time, coeff_of_var, server_count, simulated_waiting_time, error, modeled_waiting_time_1, modeled_waiting_time_2, tmp, scv))
-                                    
-                        if (save_stdout):
-                            fh.close()
-                        num_executions += 1
-                        time.sleep(1)
+                            log_file = sim_dir + '/run_stdout_' + policy + '_arr_' + str(mean_arr_time) + '_mean_' + str(mean_ser_time) \
+                                       + '_cv_' + str(coeff_of_var) + '_serv_' + str(server_count) + '.out'
+
+                        points.append(SweepPoint((mean_arr_time, policy, mean_ser_time, coeff_of_var, server_count), stomp_params, log_file=log_file))
+
+
+    ###############################################################################################
+    # Run the simulations
+
+    cache = ResultCache(cache_dir, cache_size) if (cache_dir) else None
+    store = ResultStore(db_file) if (db_file) else None
+
+    def point_done(point, results):
+        (mean_arr_time, policy, mean_ser_time, coeff_of_var, server_count) = point.key
+        write_results(results, sim_dir + '/results_' + policy + '_arr_' + str(mean_arr_time) + '_mean_' + str(mean_ser_time)
+                      + '_cv_' + str(coeff_of_var) + '_serv_' + str(server_count) + '.json')
+        if (verbose):
+            print('Finished', policy, 'mean arrival time', mean_arr_time, 'mean service time', mean_ser_time, 'CV', coeff_of_var, 'servers', server_count)
+            sys.stdout.flush()
+
+    sweep_results = run_sweep(points, workers, point_done, cache, store)
+
+    ###############################################################################################
+    # Compare the results of the simulations with the model
+
+    for ((mean_arr_time, policy, mean_ser_time, coeff_of_var, server_count), results) in sweep_results.items():
+
+        simulated_waiting_time = '%.8f' % (results['Avg Waiting Time'])
+
+        # We model the waiting time using the
+        # closed-formed expression of M/G/k queues
+        lamb  = 1 / mean_arr_time
+        mu    = 1 / mean_ser_time
+        rho   = lamb / mu
+
+        tmp   = rho / server_count
+        scv   = coeff_of_var**2
+        stdev = coeff_of_var * mean_ser_time
+        var   = stdev**2
+
+        if (tmp >= 1.0):
+            stdout.write('WARNING: rho/c = %.2f >= 1.0! Skipping...\n' % (tmp))
+
+        else:
+            modeled_waiting_time_1 = compute_waiting_time_MGk(scv, server_count, lamb, mu)
+            error = 100.0 * abs(float(simulated_waiting_time)-modeled_waiting_time_1) / modeled_waiting_time_1
+
+            modeled_waiting_time_2 = -1.0
+            if (server_count == 1):
+                modeled_waiting_time_2 = compute_waiting_time_MG1(lamb, mu, mean_ser_time, var)
+
+            if (first_time):
+                first_time = False
+                stdout.write('Policy\tArr Time (mean)\tServ Time (mean)\tCV\tServers\tSimulated Wait Time\tError (%)\tModeled Wait Time 1\tModeled Wait Time 2\trho/c\tSCV\tSimulated Utilization\n')
+            stdout.write('%s\t%.4f\t%.4f\t%.4f\t%d\t%s\t%.4f\t%.4f\t%.4f\t%.4f\t%.4f\t' % (policy, mean_arr_time, mean_ser_time, coeff_of_var, server_count, simulated_waiting_time, error, modeled_waiting_time_1, modeled_waiting_time_2, tmp, scv))
+
+        avg_util = 0.0
+        for server in results['Servers']:
+            avg_util = avg_util + server['Utilization'] / 100.0
+        avg_util = avg_util / server_count
+        stdout.write('%.4f\n' % (avg_util))
+
+        num_executions += 1
 
 
     ###############################################################################################